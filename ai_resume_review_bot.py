@@ -1,14 +1,30 @@
 import asyncio
+import functools
 import logging
 import random
+import time
 import discord
 from discord.ext import commands, tasks
 import os
 from utils.job_input_view import JobInputView
 from utils.feedback_view import FeedbackView
-from utils.resume_utils import review_resume
+from utils.feedback_renderer import FeedbackRenderer
+from utils.resume_utils import review_resume, review_resume_changes, NotAResumeError, PROMPT_VERSION
+from utils.anthropic_utils import open_http_session, close_http_session, anthropic_breaker
+from utils.retry import CircuitBreaker, CircuitOpenError
 from utils.analytics import analytics
+from utils.latency import stage_metrics
+from utils.metrics_server import MetricsServer
+from utils.review_queue import ReviewQueue, QueueFullError, UserQueueLimitError
+from utils.reference_cache import get_reference_artifacts
+from utils.pdf_utils import PDFRejectedError
+from utils.pdf_worker import pdf_worker_pool
+from utils.review_cache import ReviewCache
+from utils.review_context import ReviewContext, ReviewCancelledError
 from config import RESUME_REVIEW_CHANNEL_ID, GIFS, HIGH_SCORE_COLOR, GOOD_SCORE_COLOR, LOW_SCORE_COLOR, BAD_SCORE_COLOR
+from config import REVIEW_WORKER_COUNT, REVIEW_QUEUE_MAX_SIZE, REVIEW_MAX_PENDING_PER_USER
+from config import METRICS_HOST, METRICS_PORT
+from config import CACHE_DIR, REVIEW_CACHE_MAX_ENTRIES, REVIEW_CACHE_TTL_HOURS, REVIEW_HISTORY_MAX_ENTRIES, REVIEW_HISTORY_TTL_HOURS
 
 # Configure logging
 logging.basicConfig(
@@ -39,11 +55,45 @@ def get_gif(score):
     else:
         return random.choice(GIFS["bad_score_gifs"])
 
+BACKEND_DEGRADED_MESSAGE = "Our AI reviewer is having trouble right now, so we've paused new reviews. Please try again in a few minutes! 🛠️"
+# Stages shown in !resumestats, in the order they happen
+LATENCY_STAGES = [
+    "download", "queued", "parse", "layout", "triage", "prepare", "first_feedback", "model",
+    "parse_feedback", "total", "anthropic_request", "discord_send"
+]
+PDF_REJECTED_MESSAGE = "Sorry, I couldn't process that PDF. Please make sure it's a normal resume (a page or two, under {max_mb} MB) and try again! 📄"
+QUEUE_FULL_MESSAGE = "We're reviewing a lot of resumes right now and the queue is full. Please try again in a few minutes! 🙏"
+USER_QUEUE_LIMIT_MESSAGE = "You already have resume reviews waiting in the queue. Please wait for them to finish before submitting another one."
+NOT_A_RESUME_MESSAGE = "Hmm, that doesn't look like a resume to me ({reason}). Please upload your resume as a PDF and try again! 📄"
+
+def review_cache_key(resume_bytes, context):
+    # Quick reviews come from a different model, so they're cached separately
+    return ReviewCache.make_key(resume_bytes, context.job_details, f"{PROMPT_VERSION}:{context.model_tier}")
+
 class ResumeBot(commands.Bot):
     def __init__(self, command_prefix, intents):
         super().__init__(command_prefix=command_prefix, intents=intents)
-        self.job_details = None
         self._already_processing_commands = False
+        # Reviews in progress, keyed by the id of the message holding the resume
+        self.active_reviews = {}
+        # Serves metrics and health checks when METRICS_PORT is set
+        self.metrics_server = None
+        self.review_queue = ReviewQueue(
+            worker_count=REVIEW_WORKER_COUNT,
+            max_size=REVIEW_QUEUE_MAX_SIZE,
+            max_pending_per_user=REVIEW_MAX_PENDING_PER_USER
+        )
+        self.review_cache = ReviewCache(
+            os.path.join(CACHE_DIR, "review_cache.json"),
+            max_entries=REVIEW_CACHE_MAX_ENTRIES,
+            ttl_seconds=REVIEW_CACHE_TTL_HOURS * 3600
+        )
+        # The last review in each thread per user, so revised resumes only get what changed reviewed
+        self.review_history = ReviewCache(
+            os.path.join(CACHE_DIR, "review_history.json"),
+            max_entries=REVIEW_HISTORY_MAX_ENTRIES,
+            ttl_seconds=REVIEW_HISTORY_TTL_HOURS * 3600
+        )
         
         # Configure logging
         logging.basicConfig(
@@ -71,10 +121,35 @@ class ResumeBot(commands.Bot):
     async def setup_hook(self):
         # Start the heartbeat task
         self.heartbeat_task.start()
+        # Write tracked analytics in batches from the background
+        analytics.start()
+        
+        # Build (or load) Jake's resume artifacts once instead of on every review
+        await asyncio.get_running_loop().run_in_executor(None, get_reference_artifacts)
+        
+        # Open the pooled Anthropic HTTP session shared by all review workers
+        await open_http_session()
+        
+        # Start the review workers
+        self.review_queue.start()
+        
+        # Expose metrics and health checks for monitoring, if a port is configured
+        if METRICS_PORT:
+            self.metrics_server = MetricsServer(self, METRICS_PORT, METRICS_HOST, breaker=anthropic_breaker)
+            await self.metrics_server.start()
         
         # Register commands
         self.add_commands()
         
+    async def close(self):
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        await self.review_queue.stop()
+        await close_http_session()
+        pdf_worker_pool.shutdown()
+        await analytics.close()
+        await super().close()
+        
     def add_commands(self):
         @self.command(name="resumehelp", description="Shows help information about the resume review bot")
         async def help_command(ctx):
@@ -117,7 +192,7 @@ class ResumeBot(commands.Bot):
         @commands.has_permissions(administrator=True)
         async def stats_command(ctx):
             # Get usage report from analytics
-            report = analytics.get_usage_report()
+            report = await analytics.get_usage_report()
             
             embed = discord.Embed(
                 title="Resume Review Bot Statistics",
@@ -148,9 +223,65 @@ class ResumeBot(commands.Bot):
                 name="🤖 API Usage",
                 value=f"Total requests: {api_usage['total_requests']}\n"
                       f"Total tokens: {api_usage['total_tokens']}\n"
+                      f"Cached input tokens: {api_usage['cache_read_tokens']} read, {api_usage['cache_creation_tokens']} written\n"
                       f"Estimated cost: ${api_usage['estimated_cost']}",
                 inline=False
             )
+            if api_usage['by_model']:
+                embed.add_field(
+                    name="🧠 Usage by Model",
+                    value="\n".join(
+                        f"{model}: {usage['requests']} requests, {usage['tokens']} tokens, ${usage['estimated_cost']}"
+                        for model, usage in api_usage['by_model'].items()
+                    ),
+                    inline=False
+                )
+            
+            # Add review cache usage (since the last restart)
+            embed.add_field(
+                name="♻️ Review Cache",
+                value=f"Cached reviews: {len(self.review_cache)}\n"
+                      f"Hits: {self.review_cache.hits}, misses: {self.review_cache.misses}",
+                inline=False
+            )
+
+            # Add bullet cache usage
+            bullet_usage = report['bullet_cache']
+            embed.add_field(
+                name="🧩 Bullet Cache",
+                value=f"Hit rate: {bullet_usage['hit_rate']:.0%}\n"
+                      f"Exact hits: {bullet_usage['hits']}, near duplicates: {bullet_usage['near_hits']}, misses: {bullet_usage['misses']}",
+                inline=False
+            )
+
+            # Add latency percentiles (since the last restart)
+            latency = stage_metrics.report()
+            lines = [
+                f"{stage}: {latency[stage]['p50']:.2f}s / {latency[stage]['p95']:.2f}s / {latency[stage]['p99']:.2f}s (n={latency[stage]['count']})"
+                for stage in LATENCY_STAGES if stage in latency
+            ]
+            if "tokens_per_second" in latency:
+                throughput = latency["tokens_per_second"]
+                lines.append(f"Output tokens/s: {throughput['p50']:.0f} / {throughput['p95']:.0f} / {throughput['p99']:.0f}")
+            embed.add_field(
+                name="⏱️ Latency (p50 / p95 / p99)",
+                value="\n".join(lines) or "No reviews since the last restart",
+                inline=False
+            )
+            
+            # Add AI backend health
+            breaker = anthropic_breaker.status()
+            backend_status = {
+                CircuitBreaker.CLOSED: "🟢 Healthy",
+                CircuitBreaker.HALF_OPEN: "🟡 Recovering",
+                CircuitBreaker.OPEN: f"🔴 Degraded (retrying in {breaker['retry_in']}s)"
+            }[breaker['state']]
+            embed.add_field(
+                name="🩺 AI Backend",
+                value=f"Status: {backend_status}\n"
+                      f"Consecutive failures: {breaker['consecutive_failures']}",
+                inline=False
+            )
             
             # Add feedback ratings
             feedback = report['feedback']
@@ -173,6 +304,54 @@ class ResumeBot(commands.Bot):
                 logging.error(f"Error in stats command: {error}")
                 await ctx.send("An error occurred while processing this command.")
     
+    async def run_review(self, context, resume_bytes, renderer, intro_sent, previous=None):
+        # Wait for the intro embeds so streamed feedback is posted after them
+        await context.wait_for(intro_sent)
+        cache_key = review_cache_key(resume_bytes, context)
+        if previous is not None:
+            # A revision of a resume reviewed earlier in this thread: only review what changed
+            result = await review_resume_changes(resume_bytes, context, previous["feedback"])
+            if result is not None:
+                feedback, changes = result
+                await renderer.render_changes(changes, previous["feedback"], feedback)
+                self.review_cache.put(cache_key, feedback)
+                await self.review_cache.save()
+                return feedback
+            logging.info(f"Review {context.review_id} can't be compared with the previous one, reviewing it in full")
+        while True:
+            try:
+                feedback, from_cache = await self.review_cache.get_or_compute(
+                    cache_key,
+                    functools.partial(self.review_uncached, context, resume_bytes, renderer)
+                )
+                break
+            except ReviewCancelledError:
+                # The identical review this one was waiting on got cancelled, run our own
+                if context.cancelled:
+                    raise
+        if from_cache:
+            # An identical review finished while this one was waiting
+            await renderer.render(feedback)
+        return feedback
+    
+    async def review_uncached(self, context, resume_bytes, renderer):
+        return await review_resume(resume_user=resume_bytes, context=context, on_event=renderer.handle)
+    
+    def track_active_review(self, context):
+        self.active_reviews.setdefault(context.message_id, []).append(context)
+    
+    def untrack_active_review(self, context):
+        contexts = self.active_reviews.get(context.message_id, [])
+        if context in contexts:
+            contexts.remove(context)
+        if not contexts:
+            self.active_reviews.pop(context.message_id, None)
+    
+    async def on_raw_message_delete(self, payload):
+        # Stop reviewing resumes whose message was deleted
+        for context in self.active_reviews.get(payload.message_id, []):
+            context.cancel("resume message was deleted")
+    
     @tasks.loop(minutes=20)
     async def heartbeat_task(self):
         logging.info("Heartbeat: Bot is still running")
@@ -215,6 +394,26 @@ class ResumeBot(commands.Bot):
                 if attachment.filename.lower().endswith('.pdf'):
                     logging.info(f"Processing attachment: {attachment.filename}")
                     
+                    # Reject oversized PDFs before asking for job details or downloading them
+                    try:
+                        pdf_worker_pool.check_size(attachment.size)
+                    except PDFRejectedError as e:
+                        logging.warning(f"Rejected {attachment.filename}: {e}")
+                        await message.channel.send(PDF_REJECTED_MESSAGE.format(max_mb=pdf_worker_pool.max_bytes // (1024 * 1024)))
+                        continue
+                    
+                    # Don't make users fill in job details if the AI backend is known to be down
+                    if anthropic_breaker.state == CircuitBreaker.OPEN:
+                        await message.channel.send(BACKEND_DEGRADED_MESSAGE)
+                        continue
+                    
+                    # Nor if the review would be turned away by the queue anyway
+                    try:
+                        self.review_queue.check(message.author.id)
+                    except QueueFullError as e:
+                        await message.channel.send(USER_QUEUE_LIMIT_MESSAGE if isinstance(e, UserQueueLimitError) else QUEUE_FULL_MESSAGE)
+                        continue
+                    
                     # Sending the initial feedback embed
                     main_embed = discord.Embed(
                         title="Do you have job posting to review for?",
@@ -225,169 +424,88 @@ class ResumeBot(commands.Bot):
                     
                     await view.wait()
                     
-                    if view.job_details:
-                        self.job_details = view.job_details
-                    else:
+                    if not view.job_details and not view.quick:
                         await message.channel.send("No job details provided. Providing general resume formatting feedback.")
-                        self.job_details = None
                     
                     await message_with_view.delete()
                     
-                    # Use a specific processing GIF for the loading state
-                    processing_gif_url = "https://i.giphy.com/media/v1.Y2lkPTc5MGI3NjExcnlrNXdsdWRnbTA2ZTNjbHIxOG1jOGc4ZndpM3o2aWY2YW04d2cwdiZlcD12MV9pbnRlcm5hbF9naWZfYnlfaWQmY3Q9Zw/paKhPtCfM7RDQyRyGf/giphy.gif"
-                    loading_embed = discord.Embed(
-                        title="This could take a minute or two -- our reviewer is hard at work! 😜",
-                        color=0x0699ab
-                    )
-                    loading_embed.set_image(url=processing_gif_url)
-                    loading_embed.add_field(name="\u200b", value="• Inspired by [Oyster](https://github.com/colorstackorg/oyster) 🦪 •", inline=False)
-                    loading_embed.set_footer(text="• Powered by ColorStack UF ResumeAI •")
-                    loading_message = await message.channel.send(embed=loading_embed)
-
-                    main_embed = discord.Embed(
-                        title="AI Resume Feedback",
-                        description="Currently, the resume review tool will only give feedback on your bullet points for experiences and projects, as well as, resume formatting. This does not serve as a complete resume review, so you should still seek feedback from peers. Additionally, this tool relies on AI and may not always provide the best feedback, so take it with a grain of salt.\n\n**Disclaimer:** Any suggestions provided are purely examples and should not be added as-is without verification of accuracy.\n\n**Note:** We are comparing your resume to Jake's resume for formatting feedback. You can view Jake's resume [here](https://www.overleaf.com/latex/templates/jakes-resume/syzfjbzwjncs).",
-                        color=0x0699ab
-                    )
-                    await message.channel.send(embed=main_embed)
-                    user_resume_bytes = await attachment.read()
-                    jake_resume_bytes = open("resumes/jakes-resume.pdf", "rb").read()
-
+                    # Each review carries its own job details, so concurrent reviews can't mix them up
+                    context = ReviewContext.from_message(message, attachment, view.job_details, model_tier="fast" if view.quick else "detailed")
+                    logging.info(f"Created {context}")
+                    self.track_active_review(context)
+                    with context.timed("download"):
+                        user_resume_bytes = await attachment.read()
+                    renderer = FeedbackRenderer(message.channel)
+                    intro_sent = asyncio.Event()
+                    
+                    # Reposted resumes are answered straight from the cache without queueing
+                    job = None
+                    cached_feedback = self.review_cache.get(review_cache_key(user_resume_bytes, context))
+                    # Revisions posted in the same thread for the same job are reviewed incrementally
+                    previous = self.review_history.get(context.history_key)
+                    if previous and (previous["job_details"] != context.job_details or previous["prompt_version"] != PROMPT_VERSION
+                                     or previous.get("model_tier", "detailed") != context.model_tier):
+                        previous = None
                     try:
-                        if self.job_details:
-                            feedback = review_resume(resume_user=user_resume_bytes, resume_jake=jake_resume_bytes, job_title=self.job_details["job_title"], company=self.job_details["company"], min_qual=self.job_details["min_qual"], pref_qual=self.job_details["pref_qual"])
+                        if cached_feedback is not None:
+                            logging.info("Serving resume review from the review cache")
                         else:
-                            feedback = review_resume(resume_user=user_resume_bytes, resume_jake=jake_resume_bytes)
-
-                        # Log the feedback structure
-                        logging.info(f"Feedback structure: {feedback}")
-
-                        # Check if feedback is a dictionary
-                        if not isinstance(feedback, dict):
-                            logging.error("Feedback is not a dictionary.")
-                            return
-
-                        # Access experiences safely
-                        experiences = feedback.get("experiences", [])
-                        if not isinstance(experiences, list):
-                            logging.error("Expected 'experiences' to be a list.")
-                            return
-
-                        logging.info(f"Experiences: {experiences}")  # Log the experiences
-
-                        total_experiences_score = 0
-                        total_projects_score = 0
-                        total_formatting_score = 0
-                        total_experiences_bullets = 0
-                        total_projects_bullets = 0
-
-                        for experience in experiences:
-                            if isinstance(experience, dict):
-                                experience_embed = discord.Embed(title=f"**Experience at {experience.get('company', 'Unknown')} - {experience.get('role', 'Unknown')}**\n", color=0xe5e7eb)
-                                await message.channel.send(embed=experience_embed)
-                                bullets = experience.get('bullets', [])
-                                if not isinstance(bullets, list):
-                                    logging.error("Expected 'bullets' to be a list.")
-                                    continue
-
-                                for idx, bullet in enumerate(bullets):
-                                    if isinstance(bullet, dict):
-                                        total_experiences_score += bullet.get('score', 0)
-                                        total_experiences_bullets += 1
-                                        rewrites = "\n\n> ".join(bullet.get('rewrites', [])) if bullet.get('rewrites') else None
-                                        bullet_embed = discord.Embed(title=f"{bullet.get('score', 0)}/10.0", color=get_score_color(bullet.get('score', 0)))
-                                        bullet_embed.add_field(name="", value=f"> *{bullet.get('content', 'No content')}*\n", inline=False)
-                                        bullet_embed.add_field(name="Feedback", value=f"> {bullet.get('feedback', 'No feedback')}\n", inline=False)
-                                        if rewrites:
-                                            bullet_embed.add_field(name="Suggestions ", value=f"> {rewrites}", inline=False)
-                                        await message.channel.send(embed=bullet_embed)
-                                    else:
-                                        logging.error("Bullet item is not a dictionary.")
-                            else:
-                                logging.error("Experience item is not a dictionary.")
-
-                        avg_expereinces_final_score = 0 if total_experiences_bullets == 0 else total_experiences_score / total_experiences_bullets
-                        expereinces_final_embed = discord.Embed(
-                            title="Experience Section Score",
-                            color=get_score_color(avg_expereinces_final_score)
+                            run_review = functools.partial(self.run_review, context, user_resume_bytes, renderer, intro_sent, previous)
+                            job = self.review_queue.submit(context.user_id, run_review)
+                    except QueueFullError as e:
+                        # The queue filled up while the job details were being filled in
+                        self.untrack_active_review(context)
+                        await message.channel.send(USER_QUEUE_LIMIT_MESSAGE if isinstance(e, UserQueueLimitError) else QUEUE_FULL_MESSAGE)
+                        continue
+                    
+                    try:
+                        # Use a specific processing GIF for the loading state
+                        processing_gif_url = "https://i.giphy.com/media/v1.Y2lkPTc5MGI3NjExcnlrNXdsdWRnbTA2ZTNjbHIxOG1jOGc4ZndpM3o2aWY2YW04d2cwdiZlcD12MV9pbnRlcm5hbF9naWZfYnlfaWQmY3Q9Zw/paKhPtCfM7RDQyRyGf/giphy.gif"
+                        loading_embed = discord.Embed(
+                            title="This could take a minute or two -- our reviewer is hard at work! 😜",
+                            color=0x0699ab
                         )
-                        expereinces_final_embed.add_field(name=f"{round(avg_expereinces_final_score, 1)}/10.0", value="", inline=False)
-                        await message.channel.send(embed=expereinces_final_embed)
-
-                        # Access projects safely
-                        projects = feedback.get("projects", [])
-                        if not isinstance(projects, list):
-                            logging.error("Expected 'projects' to be a list.")
-                            return
+                        loading_embed.set_image(url=processing_gif_url)
+                        queue_position = self.review_queue.position(job) if job else 0
+                        if queue_position > 0:
+                            loading_embed.add_field(name="📋 Queue Position", value=f"You are #{queue_position} in line for a review.", inline=False)
+                        loading_embed.add_field(name="\u200b", value="• Inspired by [Oyster](https://github.com/colorstackorg/oyster) 🦪 •", inline=False)
+                        loading_embed.set_footer(text="• Powered by ColorStack UF ResumeAI •")
+                        loading_message = await message.channel.send(embed=loading_embed)
 
-                        for project in projects:
-                            if isinstance(project, dict):
-                                # Check if the project has a 'title' field, otherwise try 'name'
-                                project_title = project.get('title', project.get('name', 'Unknown'))
-                                project_embed = discord.Embed(title=f"**Project: {project_title}**\n", color=0xe5e7eb)
-                                await message.channel.send(embed=project_embed)
-                                bullets = project.get('bullets', [])
-                                if not isinstance(bullets, list):
-                                    logging.error("Expected 'bullets' to be a list.")
-                                    continue
-
-                                for idx, bullet in enumerate(bullets):
-                                    if isinstance(bullet, dict):
-                                        total_projects_score += bullet.get('score', 0)
-                                        total_projects_bullets += 1
-                                        rewrites = "\n\n> ".join(bullet.get('rewrites', [])) if bullet.get('rewrites') else None
-                                        bullet_embed = discord.Embed(title=f"{bullet.get('score', 0)}/10.0", color=get_score_color(bullet.get('score', 0)))
-                                        bullet_embed.add_field(name="", value=f"> *{bullet.get('content', 'No content')}*\n", inline=False)
-                                        bullet_embed.add_field(name="Feedback", value=f"> {bullet.get('feedback', 'No feedback')}\n", inline=False)
-                                        if rewrites:
-                                            bullet_embed.add_field(name="Suggestions ", value=f"> {rewrites}", inline=False)
-                                        await message.channel.send(embed=bullet_embed)
-                                    else:
-                                        logging.error("Bullet item is not a dictionary.")
-                            else:
-                                logging.error("Project item is not a dictionary.")
-
-                        avg_projects_final_score = 0 if total_projects_bullets == 0 else total_projects_score / total_projects_bullets
-                        projects_final_embed = discord.Embed(
-                            title="Projects Section Score",
-                            color=get_score_color(avg_projects_final_score)
+                        main_embed = discord.Embed(
+                            title="AI Resume Feedback",
+                            description="Currently, the resume review tool will only give feedback on your bullet points for experiences and projects, as well as, resume formatting. This does not serve as a complete resume review, so you should still seek feedback from peers. Additionally, this tool relies on AI and may not always provide the best feedback, so take it with a grain of salt.\n\n**Disclaimer:** Any suggestions provided are purely examples and should not be added as-is without verification of accuracy.\n\n**Note:** We are comparing your resume to Jake's resume for formatting feedback. You can view Jake's resume [here](https://www.overleaf.com/latex/templates/jakes-resume/syzfjbzwjncs).",
+                            color=0x0699ab
                         )
-                        projects_final_embed.add_field(name=f"{round(avg_projects_final_score, 1)}/10.0", value="", inline=False)
-                        await message.channel.send(embed=projects_final_embed)
-
-                        # Access formatting safely
-                        formatting = feedback.get("formatting", {})
-                        if not isinstance(formatting, dict):
-                            logging.error("Expected 'formatting' to be a dictionary.")
-                            return
-
-                        formatting_embed = discord.Embed(title="**Formatting Feedback**\n", color=0xe5e7eb)
-                        await message.channel.send(embed=formatting_embed)
-
-                        aspects = formatting.get('aspects', [])
-                        if not isinstance(aspects, list):
-                            logging.error("Expected 'aspects' to be a list.")
-                            return
+                        if previous and job:
+                            main_embed.add_field(name="🔁 Revised resume", value="You already got a review in this thread, so this time we'll only go over what changed.", inline=False)
+                        await message.channel.send(embed=main_embed)
+                    except Exception as e:
+                        # The job is already queued; stop it rather than review for a channel we can't post in
+                        logging.error(f"Couldn't post the intro of review {context.review_id}: {e}")
+                        context.cancel("review intro couldn't be posted")
+                        if job:
+                            job.future.cancel()
+                        self.untrack_active_review(context)
+                        continue
+                    finally:
+                        # Feedback streams in as soon as the intro is posted
+                        intro_sent.set()
 
-                        for aspect in aspects:
-                            if isinstance(aspect, dict):
-                                total_formatting_score += aspect.get('score', 0)
-                                aspect_embed = discord.Embed(title=f"{aspect.get('score', 0)}/10.0", color=get_score_color(aspect.get('score', 0)))
-                                aspect_embed.add_field(name=f"{aspect.get('name', 'Unknown')}", value=f"> {aspect.get('feedback', 'No feedback')}\n", inline=False)
-                                if aspect.get('suggestions'):
-                                    aspect_embed.add_field(name="Suggestions", value=f"> {aspect.get('suggestions')}", inline=False)
-                                await message.channel.send(embed=aspect_embed)
-                            else:
-                                logging.error("Aspect item is not a dictionary.")
+                    try:
+                        if job:
+                            feedback = await job.future
+                        else:
+                            feedback = cached_feedback
+                            await renderer.render(feedback)
 
-                        if len(aspects) > 0:
-                            total_formatting_score = total_formatting_score / len(aspects)
-                            overall_score = formatting['overall_score']
-                            overall_score_embed = discord.Embed(title="Formatting Score", color=get_score_color(overall_score))
-                            overall_score_embed.add_field(name=f"{round(overall_score,1)}/10.0", value="", inline=False)
-                            await message.channel.send(embed=overall_score_embed)
+                        # Log the feedback structure
+                        logging.info(f"Feedback structure: {feedback}")
 
-                        final_score = (avg_projects_final_score + avg_expereinces_final_score + total_formatting_score) / 3.0  # Ensure float division
+                        context.raise_if_cancelled()
+                        scores = await renderer.finish(feedback)
+                        final_score = scores["overall"]
                         gif_url = get_gif(final_score)
                         # Completion message
                         final_embed = discord.Embed(
@@ -408,13 +526,18 @@ class ResumeBot(commands.Bot):
                         await message.channel.send(embed=final_score_embed)
                         
                         # Track the resume review in analytics
-                        scores = {
-                            "overall": final_score,
-                            "experiences": avg_expereinces_final_score,
-                            "projects": avg_projects_final_score,
-                            "formatting": total_formatting_score
-                        }
-                        analytics.track_resume_review(message.author.id, message.guild.id, scores)
+                        analytics.track_resume_review(context.user_id, context.guild_id, scores)
+                        stage_metrics.count("reviews_completed")
+                        
+                        # Remember this review so the next revision in this thread can be compared with it
+                        if feedback.get("outline"):
+                            self.review_history.put(context.history_key, {
+                                "job_details": context.job_details,
+                                "prompt_version": PROMPT_VERSION,
+                                "model_tier": context.model_tier,
+                                "feedback": feedback
+                            })
+                            await self.review_history.save()
                         
                         # Ask for feedback
                         feedback_embed = discord.Embed(
@@ -422,15 +545,34 @@ class ResumeBot(commands.Bot):
                             description="Please rate this resume review to help us improve!",
                             color=0x0699ab
                         )
-                        feedback_view = FeedbackView(message.author.id, message.guild.id)
+                        feedback_view = FeedbackView(context.user_id, context.guild_id)
                         await message.channel.send(embed=feedback_embed, view=feedback_view)
                         
+                    except ReviewCancelledError as e:
+                        logging.info(f"Review {context.review_id} stopped: {e}")
+                    except PDFRejectedError as e:
+                        logging.warning(f"Rejected {attachment.filename}: {e}")
+                        await message.channel.send(PDF_REJECTED_MESSAGE.format(max_mb=pdf_worker_pool.max_bytes // (1024 * 1024)))
+                    except NotAResumeError as e:
+                        logging.info(f"Triage rejected {attachment.filename}: {e}")
+                        await message.channel.send(NOT_A_RESUME_MESSAGE.format(reason=e))
+                    except CircuitOpenError as e:
+                        logging.warning(f"Review skipped, AI backend degraded: {e}")
+                        await message.channel.send(BACKEND_DEGRADED_MESSAGE)
                     except Exception as e:
+                        stage_metrics.count("reviews_failed")
                         logging.error(f"Failed to process PDF attachment: {e}")
                         await message.channel.send(f"Sorry, I encountered an error while processing your resume. Error details: {str(e)}")
                         # Log the full traceback for debugging
                         import traceback
                         logging.error(f"Full error traceback: {traceback.format_exc()}")
+                    finally:
+                        self.untrack_active_review(context)
+                        if job and job.wait_seconds is not None:
+                            context.timings["queued"] = job.wait_seconds
+                        context.timings["total"] = time.monotonic() - context.created_at
+                        stage_metrics.record_review(context.timings)
+                        logging.info(f"Review {context.review_id} timings: " + ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in context.timings.items()))
 
 def start_bot(token):
     # Discord Bot Setup
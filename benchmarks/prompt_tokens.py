@@ -0,0 +1,34 @@
+"""Compare prompt tokens for the JSON span dump and the compact span encoding.
+
+Usage: python -m benchmarks.prompt_tokens [resume.pdf ...]
+Defaults to every PDF in resumes/.
+"""
+import glob
+import json
+import sys
+import tiktoken
+from utils.pdf_utils import ResumeDocument
+from utils.span_encoding import FORMAT_DESCRIPTION, encode_spans
+
+def measure(path, encoding):
+    with open(path, "rb") as f:
+        document = ResumeDocument.from_bytes(f.read())
+    before = json.dumps(document.extracted_data, indent=2)
+    after = FORMAT_DESCRIPTION + "\n" + encode_spans(document.spans)
+    return len(encoding.encode(before)), len(encoding.encode(after))
+
+def main(paths):
+    # Same tokenizer the bot uses for its estimates
+    encoding = tiktoken.encoding_for_model("gpt-4o")
+    print(f"{'resume':<40} {'json tokens':>12} {'compact tokens':>15} {'saved':>7}")
+    total_before = total_after = 0
+    for path in paths:
+        before, after = measure(path, encoding)
+        total_before += before
+        total_after += after
+        print(f"{path:<40} {before:>12} {after:>15} {1 - after / before:>7.0%}")
+    if len(paths) > 1:
+        print(f"{'total':<40} {total_before:>12} {total_after:>15} {1 - total_after / total_before:>7.0%}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob.glob("resumes/*.pdf")))
@@ -8,6 +8,71 @@ load_dotenv()
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
 ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
 RESUME_REVIEW_CHANNEL_ID = int(os.getenv('RESUME_REVIEW_CHANNEL_ID'))  # Set this to your resume review channel ID
+
+ANTHROPIC_MAX_CONNECTIONS = int(os.getenv('ANTHROPIC_MAX_CONNECTIONS', '10'))  # Pooled connections to the Anthropic API
+ANTHROPIC_MAX_ATTEMPTS = int(os.getenv('ANTHROPIC_MAX_ATTEMPTS', '3'))  # Attempts per request, including the first
+ANTHROPIC_BREAKER_THRESHOLD = int(os.getenv('ANTHROPIC_BREAKER_THRESHOLD', '5'))  # Consecutive failures before failing fast
+ANTHROPIC_BREAKER_RESET_SECONDS = float(os.getenv('ANTHROPIC_BREAKER_RESET_SECONDS', '60'))  # Cool-down before probing again
+CACHE_DIR = os.getenv('CACHE_DIR', '.cache')  # Where precomputed artifacts are stored
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # Serve Prometheus metrics and health checks on this port, 0 to disable
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+
+# Models requests can be routed to. Prices are dollars per million tokens.
+MODELS = {
+    "fast": {
+        "name": os.getenv('FAST_MODEL', 'claude-3-haiku-20240307'),
+        "input_price": 0.25,
+        "output_price": 1.25,
+        "cache_write_price": 0.30,
+        "cache_read_price": 0.03,
+        "max_output_tokens": 4096,
+    },
+    "detailed": {
+        "name": os.getenv('DETAILED_MODEL', 'claude-3-5-sonnet-20240620'),
+        "input_price": 3.0,
+        "output_price": 15.0,
+        "cache_write_price": 3.75,
+        "cache_read_price": 0.30,
+        "max_output_tokens": 8192,
+    },
+}
+TRIAGE_MODEL_TIER = os.getenv('TRIAGE_MODEL_TIER', 'fast')  # Checks the PDF is a resume and gives a quick score
+# Model tier per review section; quick reviews use the fast model for everything
+SECTION_MODEL_TIERS = {
+    "experience": os.getenv('EXPERIENCE_MODEL_TIER', 'detailed'),
+    "project": os.getenv('PROJECT_MODEL_TIER', 'detailed'),
+    "formatting": os.getenv('FORMATTING_MODEL_TIER', 'detailed'),
+}
+
+# Review queue settings
+REVIEW_WORKER_COUNT = int(os.getenv('REVIEW_WORKER_COUNT', '3'))  # Reviews processed at the same time
+REVIEW_QUEUE_MAX_SIZE = int(os.getenv('REVIEW_QUEUE_MAX_SIZE', '25'))  # Reviews allowed to wait for a worker
+REVIEW_MAX_PENDING_PER_USER = int(os.getenv('REVIEW_MAX_PENDING_PER_USER', '2'))  # Queued or running reviews per user
+REVIEW_FAN_OUT = os.getenv('REVIEW_FAN_OUT', 'true').lower() == 'true'  # Review each entry and the formatting in parallel requests
+REVIEW_SECTION_ATTEMPTS = int(os.getenv('REVIEW_SECTION_ATTEMPTS', '2'))  # Attempts per fan-out request whose answer doesn't validate
+STRUCTURED_OUTPUT = os.getenv('STRUCTURED_OUTPUT', 'true').lower() == 'true'  # Have the model answer through a forced tool call with the feedback schema
+
+# PDF worker pool settings
+PDF_WORKER_COUNT = int(os.getenv('PDF_WORKER_COUNT', str(os.cpu_count() or 2)))  # Processes parsing and rendering PDFs
+PDF_WORKER_MEMORY_MB = int(os.getenv('PDF_WORKER_MEMORY_MB', '1024'))  # Address space limit for each PDF worker
+PDF_TIMEOUT_SECONDS = float(os.getenv('PDF_TIMEOUT_SECONDS', '20'))  # Longest a single PDF may take to process
+PDF_MAX_BYTES = int(os.getenv('PDF_MAX_BYTES', str(10 * 1024 * 1024)))  # Larger attachments are rejected before download
+PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', '10'))  # Longer PDFs are rejected before rendering
+
+# Resume image settings
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'webp')  # png, jpeg or webp
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', '100'))  # jpeg/webp quality, 100 makes webp lossless
+IMAGE_GRAYSCALE = os.getenv('IMAGE_GRAYSCALE', 'true').lower() == 'true'  # Resumes rarely need colour
+IMAGE_TRIM_MARGINS = os.getenv('IMAGE_TRIM_MARGINS', 'true').lower() == 'true'  # Crop whitespace, margins are described in text
+
+# Review result cache settings
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv('REVIEW_CACHE_MAX_ENTRIES', '500'))  # Least recently used reviews are evicted past this
+REVIEW_CACHE_TTL_HOURS = float(os.getenv('REVIEW_CACHE_TTL_HOURS', '168'))  # How long a cached review can be reused
+REVIEW_HISTORY_MAX_ENTRIES = int(os.getenv('REVIEW_HISTORY_MAX_ENTRIES', '1000'))  # Threads whose last review is kept for incremental re-reviews
+REVIEW_HISTORY_TTL_HOURS = float(os.getenv('REVIEW_HISTORY_TTL_HOURS', '168'))  # How long a revision can be reviewed incrementally
+BULLET_CACHE_MAX_ENTRIES = int(os.getenv('BULLET_CACHE_MAX_ENTRIES', '5000'))  # Least recently used bullets are evicted past this
+BULLET_CACHE_TTL_HOURS = float(os.getenv('BULLET_CACHE_TTL_HOURS', '720'))  # How long feedback on a bullet can be reused
+
 HIGH_SCORE_COLOR = 0x00ff00
 GOOD_SCORE_COLOR = 0x4BFFFF
 LOW_SCORE_COLOR = 0xFFCF40
@@ -0,0 +1,105 @@
+import asyncio
+import functools
+import json
+import os
+import re
+import pytest
+import tiktoken
+
+# The bot's settings need a review channel to import
+os.environ.setdefault("RESUME_REVIEW_CHANNEL_ID", "0")
+
+from models import FormattingFeedback
+from utils import reference_cache, resume_utils
+from utils.analytics import Analytics
+from utils.bullet_cache import BulletCache
+from utils.pdf_utils import ResumeDocument
+
+class WordEncoding:
+    """Stands in for tiktoken's encodings, which are downloaded on first use. Token counts
+    are only logged, so tests count words instead and run without network access."""
+    def encode(self, text):
+        return text.split()
+
+@pytest.fixture(autouse=True, scope="session")
+def offline_tokenizer(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(tiktoken, "encoding_for_model", lambda model: WordEncoding())
+        # Reference artifacts built with these counts are kept out of the bot's own cache
+        cache_dir = str(tmp_path_factory.mktemp("cache"))
+        patch.setattr(resume_utils, "get_reference_artifacts", functools.cache(lambda: reference_cache.load_reference_artifacts(cache_dir=cache_dir)))
+        yield
+
+class FakeClock:
+    """A clock for caches and breakers that only moves when a test sets `now`"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+class FakeModel:
+    """Stands in for get_chat_completion, answering each request from its prompt"""
+    def __init__(self):
+        # (kind, model tier, entry title, bullets or formatting aspects asked for) of every request
+        self.calls = []
+        # Entry title prefix -> invalid answers to give before a valid one
+        self.invalid = {}
+        # Entry title prefix -> seconds to wait before answering
+        self.delays = {}
+        self.is_resume = True
+        # Answer triage with something that isn't JSON
+        self.malformed_triage = False
+
+    def _for_title(self, settings, title):
+        return next((value for prefix, value in settings.items() if title.startswith(prefix)), 0)
+
+    async def __call__(self, max_tokens, messages, system=None, temperature=0.5, model="detailed", tool=None):
+        content = messages[0]["content"]
+        if system == resume_utils.TRIAGE_SYSTEM_PROMPT:
+            self.calls.append(("triage", model, None, []))
+            if self.malformed_triage:
+                return "I'm not sure"
+            return json.dumps({"is_resume": self.is_resume, "reason": "a recipe for banana bread", "overall_score": 7, "summary": "Solid"})
+        if isinstance(content, list):
+            # Only the formatting request carries images
+            asked = sorted(name for name in tool["input_schema"]["properties"] if name != "overall_score") if tool else []
+            self.calls.append(("formatting", model, None, asked))
+            aspect = {"issue": False, "feedback": "Looks good", "suggestions": [], "score": 7}
+            return json.dumps({**{name: aspect for name in FormattingFeedback.__fields__ if name != "overall_score"}, "overall_score": 7})
+
+        kind = re.search(r"(experience|project) from a resume", content).group(1)
+        title = next(line[2:] for line in content.splitlines() if line.startswith("- "))
+        bullets = [line[4:] for line in content.splitlines() if line.startswith("  * ")]
+        self.calls.append((kind, model, title, bullets))
+        await asyncio.sleep(self._for_title(self.delays, title))
+        if self._for_title(self.invalid, title):
+            self.invalid = {prefix: count - title.startswith(prefix) for prefix, count in self.invalid.items()}
+            return json.dumps({"bullets": "not a list"})
+        answer = {"bullets": [{"content": bullet, "feedback": f"Feedback on {bullet}", "rewrites": [f"Better {bullet}"], "score": 6} for bullet in bullets]}
+        answer.update({"company": title, "role": "Role"} if kind == "experience" else {"title": title})
+        return json.dumps(answer)
+
+    def entry_calls(self):
+        return [call for call in self.calls if call[0] in ("experience", "project")]
+
+class InlineParser:
+    """Parses PDFs in this process instead of the worker pool"""
+    async def parse(self, pdf_bytes):
+        return ResumeDocument.from_bytes(pdf_bytes)
+
+@pytest.fixture
+def fake_model(monkeypatch, tmp_path):
+    model = FakeModel()
+    analytics = Analytics(str(tmp_path / "analytics.json"), backend="json")
+    monkeypatch.setattr(resume_utils, "get_chat_completion", model)
+    monkeypatch.setattr(resume_utils, "pdf_worker_pool", InlineParser())
+    monkeypatch.setattr(resume_utils, "bullet_cache", BulletCache(str(tmp_path / "bullets.json")))
+    monkeypatch.setattr(resume_utils, "analytics", analytics)
+    monkeypatch.setattr(resume_utils, "REVIEW_FAN_OUT", True)
+    yield model
+    asyncio.run(analytics.close())
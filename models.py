@@ -42,4 +42,10 @@ class FormattingFeedback(BaseModel):
 class ResumeFeedback(BaseModel):
     experiences: list[ResumeExperience] = Field(..., description="List of experiences in the resume")
     projects: list[ResumeProject] = Field(..., description="List of projects in the resume")
-    formatting: FormattingFeedback = Field(..., description="Feedback on the resume's formatting")
\ No newline at end of file
+    formatting: FormattingFeedback = Field(..., description="Feedback on the resume's formatting")
+
+class ResumeTriage(BaseModel):
+    is_resume: bool = Field(..., description="Whether the document is a resume")
+    reason: str = Field(..., description="Why the document is or isn't a resume")
+    overall_score: float = Field(..., ge=0, le=10, description="Quick overall score for the resume")
+    summary: str = Field(..., description="One or two sentence first impression of the resume")
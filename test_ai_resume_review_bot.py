@@ -0,0 +1,143 @@
+import asyncio
+import discord
+import pytest
+import ai_resume_review_bot
+from config import RESUME_REVIEW_CHANNEL_ID
+from utils.analytics import Analytics
+from utils.embed_dispatcher import OutboundScheduler
+from utils.feedback_renderer import FeedbackRenderer
+from utils.review_cache import ReviewCache
+
+with open("resumes/jakes-resume.pdf", "rb") as f:
+    JAKES_RESUME = f.read()
+
+class FakeSentMessage:
+    async def delete(self):
+        pass
+
+    async def edit(self, **kwargs):
+        pass
+
+class FakeResponse:
+    status = 403
+    reason = "Forbidden"
+
+class FakeChannel:
+    def __init__(self):
+        self.id = RESUME_REVIEW_CHANNEL_ID
+        # Plain text messages sent to the channel
+        self.texts = []
+        # Title prefixes of embeds the bot isn't allowed to post
+        self.forbidden = ()
+
+    async def send(self, content=None, **kwargs):
+        embed = kwargs.get("embed")
+        if embed is not None and embed.title.startswith(self.forbidden):
+            raise discord.Forbidden(FakeResponse(), "Missing Permissions")
+        if content is not None:
+            self.texts.append(content)
+        return FakeSentMessage()
+
+class FakeAttachment:
+    filename = "resume.pdf"
+    url = "https://cdn.example.com/resume.pdf"
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+        self.reads = 0
+
+    async def read(self):
+        self.reads += 1
+        return self.data
+
+class FakeAuthor:
+    id = 1
+
+class FakeGuild:
+    id = 10
+
+class FakeMessage:
+    id = 1000
+    content = ""
+    author = FakeAuthor()
+    guild = FakeGuild()
+
+    def __init__(self, attachment):
+        self.channel = FakeChannel()
+        self.attachments = [attachment]
+
+def job_input_view(quick):
+    """Stands in for JobInputView, with the user having pressed Quick review or No"""
+    class AnsweredView:
+        shown = 0
+
+        def __init__(self, bot, message):
+            AnsweredView.shown += 1
+            self.job_details = None
+            self.quick = quick
+
+        async def wait(self):
+            pass
+    return AnsweredView
+
+@pytest.fixture
+def bot_message(fake_model, monkeypatch, tmp_path):
+    """Posts Jake's resume to the review channel and returns the message once the bot has answered it"""
+    analytics = Analytics(str(tmp_path / "analytics.json"), backend="json")
+    monkeypatch.setattr(ai_resume_review_bot, "analytics", analytics)
+    # Don't wait out Discord's rate limits
+    scheduler = OutboundScheduler(messages_per_window=1000)
+    monkeypatch.setattr(ai_resume_review_bot, "FeedbackRenderer", lambda channel: FeedbackRenderer(channel, scheduler))
+
+    async def post(quick=False, forbidden=(), queue_limit=None):
+        view = job_input_view(quick)
+        monkeypatch.setattr(ai_resume_review_bot, "JobInputView", view)
+        bot = ai_resume_review_bot.ResumeBot(command_prefix="!", intents=discord.Intents.default())
+        bot.review_cache = ReviewCache(str(tmp_path / "review_cache.json"))
+        bot.review_history = ReviewCache(str(tmp_path / "review_history.json"))
+        if queue_limit is not None:
+            bot.review_queue.max_pending_per_user = queue_limit
+
+        async def process_commands(message):
+            pass
+        bot.process_commands = process_commands
+        message = FakeMessage(FakeAttachment(JAKES_RESUME))
+        message.channel.forbidden = forbidden
+        bot.review_queue.start()
+        try:
+            await bot.on_message(message)
+            # Every queued job has let go of its worker
+            await asyncio.wait_for(bot.review_queue._queue.join(), 5)
+        finally:
+            await bot.review_queue.stop()
+        message.views_shown = view.shown
+        return message
+
+    yield lambda quick=False, forbidden=(), queue_limit=None: asyncio.run(post(quick, forbidden, queue_limit))
+    asyncio.run(analytics.close())
+
+def test_documents_that_arent_resumes_are_rejected(fake_model, bot_message):
+    """Triage rejections reach the user as a rejection, not as a failed review"""
+    fake_model.is_resume = False
+    message = bot_message()
+    assert ai_resume_review_bot.NOT_A_RESUME_MESSAGE.format(reason="a recipe for banana bread") in message.channel.texts
+    assert not any(text.startswith("Sorry, I encountered an error") for text in message.channel.texts)
+    assert [kind for kind, _, _, _ in fake_model.calls] == ["triage"]
+
+def test_quick_review_button_uses_the_fast_model(fake_model, bot_message):
+    message = bot_message(quick=True)
+    assert not any(text.startswith("Sorry") for text in message.channel.texts)
+    assert len(fake_model.calls) == 7
+    assert {tier for _, tier, _, _ in fake_model.calls} == {"fast"}
+
+def test_review_is_dropped_when_its_intro_cant_be_posted(fake_model, bot_message):
+    """A queued review whose loading message can't be sent stops instead of holding a worker forever"""
+    message = bot_message(forbidden=("This could take",))
+    assert not any(text.startswith("Sorry") for text in message.channel.texts)
+    assert fake_model.calls == []
+
+def test_full_queue_turns_reviews_away_before_asking_for_job_details(fake_model, bot_message):
+    message = bot_message(queue_limit=0)
+    assert message.channel.texts == [ai_resume_review_bot.USER_QUEUE_LIMIT_MESSAGE]
+    assert message.views_shown == 0 and message.attachments[0].reads == 0
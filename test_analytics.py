@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 import json
@@ -43,7 +44,7 @@ def test_analytics():
     logger.info("Tracked test feedback rating")
     
     # Get and display the usage report
-    report = analytics.get_usage_report()
+    report = asyncio.run(analytics.get_usage_report())
     logger.info(f"Usage report: {json.dumps(report, indent=2)}")
     
     # Check if the analytics file was created
@@ -0,0 +1,80 @@
+import json
+import os
+from utils.analytics import Analytics
+from utils.analytics_store import JSONAnalyticsStore, SQLiteAnalyticsStore
+
+EVENTS = [
+    {"type": "review", "ts": 1.0, "user_id": "1", "server_id": "9", "date": "2024-01-01",
+     "scores": {"overall": 7.0, "experiences": 8.0, "projects": 6.0, "formatting": 7.0}},
+    {"type": "review", "ts": 2.0, "user_id": "2", "server_id": "9", "date": "2024-01-02",
+     "scores": {"overall": 5.0, "experiences": 4.0, "projects": 6.0, "formatting": 5.0}},
+    {"type": "api_usage", "ts": 3.0, "tokens": 1000, "estimated_cost": 0.5, "cache_creation_tokens": 10, "cache_read_tokens": 20, "model": "fast"},
+    {"type": "api_usage", "ts": 4.0, "tokens": 3000, "estimated_cost": 1.25, "cache_creation_tokens": 0, "cache_read_tokens": 5, "model": "detailed"},
+    {"type": "bullet_cache", "ts": 5.0, "hits": 3, "near_hits": 1, "misses": 4},
+    {"type": "rating", "ts": 6.0, "rating": 4},
+    {"type": "rating", "ts": 7.0, "rating": 5},
+]
+
+def test_sqlite_store_reports_like_json_store(tmp_path):
+    json_store = JSONAnalyticsStore(str(tmp_path / "analytics.json"))
+    sqlite_store = SQLiteAnalyticsStore(str(tmp_path / "analytics.db"), legacy_json_file=None)
+    json_store.append(EVENTS)
+    sqlite_store.append(EVENTS[:3])
+    sqlite_store.append(EVENTS[3:])
+    assert sqlite_store.report() == json_store.report()
+    assert sqlite_store.report()["api_usage"]["by_model"]["detailed"] == {"requests": 1, "tokens": 3000, "estimated_cost": 1.25}
+
+def test_sqlite_store_migrates_json_once(tmp_path):
+    json_file = str(tmp_path / "analytics_data.json")
+    json_store = JSONAnalyticsStore(json_file)
+    json_store.append(EVENTS)
+    before = json_store.report()
+
+    db_file = str(tmp_path / "analytics.db")
+    sqlite_store = SQLiteAnalyticsStore(db_file, legacy_json_file=json_file)
+    assert sqlite_store.report() == before
+    sqlite_store.close()
+
+    # Reopening doesn't import the file again
+    sqlite_store = SQLiteAnalyticsStore(db_file, legacy_json_file=json_file)
+    sqlite_store.append(EVENTS[-1:])
+    assert sqlite_store.report()["feedback"]["total_ratings"] == 3
+    assert sqlite_store.report()["total_reviews"] == 2
+    with open(json_file) as f:
+        assert json.load(f)["feedback_ratings"]["total"] == 2
+
+def test_analytics_replays_unstored_journal_batches(tmp_path):
+    """Batches journaled before a crash are stored on the next start, unless they already were"""
+    storage_file = str(tmp_path / "analytics_data.json")
+    analytics = Analytics(storage_file, flush_size=100)
+    analytics.track_feedback_rating(4)
+    assert analytics.store.report()["feedback"]["total_ratings"] == 0  # Still buffered
+    analytics._flush_now()
+    stored = analytics.store.last_batch()
+    assert analytics.store.report()["feedback"]["total_ratings"] == 1
+    assert os.path.getsize(analytics.journal_file) == 0
+
+    with open(analytics.journal_file, "w") as f:
+        f.write(json.dumps({"batch": stored, "events": [EVENTS[-1]]}) + "\n")
+        f.write(json.dumps({"batch": stored + 1, "events": [EVENTS[-1]]}) + "\n")
+        f.write('{"batch": ')
+    analytics.store.close()
+
+    reopened = Analytics(storage_file)
+    assert reopened.store.report()["feedback"]["total_ratings"] == 2
+    assert os.path.getsize(reopened.journal_file) == 0
+
+def test_analytics_opens_its_store_on_first_use(tmp_path):
+    """Creating Analytics doesn't touch the disk; the first flushed events open the store"""
+    storage_file = str(tmp_path / "analytics_data.json")
+    with open(storage_file + ".journal", "w") as f:
+        f.write(json.dumps({"batch": 1, "events": [EVENTS[-1]]}) + "\n")
+    analytics = Analytics(storage_file)
+    analytics._flush_now()
+    assert sorted(os.listdir(tmp_path)) == ["analytics_data.json.journal"]
+
+    analytics.track_feedback_rating(4)
+    analytics._flush_now()
+    # The journaled batch of the earlier run is stored too
+    assert analytics.store.report()["feedback"]["total_ratings"] == 2
+    assert os.path.getsize(analytics.journal_file) == 0
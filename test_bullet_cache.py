@@ -0,0 +1,47 @@
+import asyncio
+from utils.bullet_cache import BulletCache
+
+BULLET = "Developed a REST API using FastAPI and PostgreSQL to store data from learning management systems"
+
+def test_bullet_cache_exact_and_near_duplicate_hits(tmp_path):
+    """Reworded bullets reuse feedback, different bullets and other job titles don't"""
+    cache = BulletCache(str(tmp_path / "bullets.json"))
+    scope = BulletCache.make_scope("experience", "SWE Intern", 1)
+    cache.put(scope, BULLET, {"score": 6})
+
+    assert cache.get(scope, BULLET.upper() + ".") == ({"score": 6}, True)
+    assert cache.get(scope, BULLET.replace("Developed", "Built")) == ({"score": 6}, False)
+    assert cache.get(scope, "Implemented GitHub OAuth to get data from user's repositories") is None
+    assert cache.get(BulletCache.make_scope("experience", "Data Analyst", 1), BULLET) is None
+    assert cache.get(scope, BULLET.replace("Developed", "Built"), near_duplicates=False) is None
+    assert (cache.hits, cache.near_hits, cache.misses) == (1, 1, 3)
+    assert cache.hit_rate == 0.4
+
+def test_bullet_cache_near_duplicates_stay_with_their_owner(tmp_path):
+    """Someone else's reworded bullet is a miss, but exact hits are shared"""
+    cache = BulletCache(str(tmp_path / "bullets.json"))
+    cache.put("s", BULLET, {"score": 6}, owner="1")
+
+    assert cache.get("s", BULLET.replace("Developed", "Built"), owner="1") == ({"score": 6}, False)
+    assert cache.get("s", BULLET.replace("Developed", "Built"), owner="2") is None
+    assert cache.get("s", BULLET, owner="2") == ({"score": 6}, True)
+    assert (cache.hits, cache.near_hits, cache.misses) == (1, 1, 1)
+
+def test_bullet_cache_eviction_expiry_and_persistence(tmp_path, clock):
+    storage_file = str(tmp_path / "bullets.json")
+    cache = BulletCache(storage_file, max_entries=2, ttl_seconds=100, clock=clock)
+    cache.put("s", "first bullet about kubernetes", {"score": 1})
+    cache.put("s", "second bullet about react", {"score": 2})
+    assert cache.get("s", "first bullet about kubernetes")  # the second bullet is now the least recently used
+    cache.put("s", "third bullet about postgres", {"score": 3})
+    assert cache.get("s", "second bullet about react") is None
+    assert len(cache) == 2
+
+    asyncio.run(cache.save())
+    restored = BulletCache(storage_file, clock=clock)
+    assert restored.get("s", "third bullet about postgres") == ({"score": 3}, True)
+    # Near duplicate lookups work on the restored index too
+    assert restored.get("s", "third bullet about postgresql") == ({"score": 3}, False)
+
+    clock.now = 101
+    assert cache.get("s", "third bullet about postgres") is None
@@ -0,0 +1,54 @@
+import asyncio
+import discord
+from utils.embed_dispatcher import EmbedBatcher, OutboundScheduler, MAX_EMBED_CHARACTERS
+
+class FakeChannel:
+    id = 1
+
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, embeds=None, **kwargs):
+        self.messages.append(embeds)
+
+def test_embed_batcher_respects_discord_limits():
+    """Embeds are packed up to 10 per message and 6000 characters per message"""
+    async def scenario():
+        channel = FakeChannel()
+        batcher = EmbedBatcher(channel, OutboundScheduler(messages_per_window=100), linger=10)
+        for i in range(23):
+            await batcher.add(discord.Embed(title=f"Bullet {i}"))
+        large = "x" * 2500
+        for _ in range(3):
+            await batcher.add(discord.Embed(title="Big", description=large))
+        await batcher.flush()
+        return channel.messages
+
+    messages = asyncio.run(scenario())
+    assert [len(embeds) for embeds in messages] == [10, 10, 5, 1]
+    assert all(sum(len(embed) for embed in embeds) <= MAX_EMBED_CHARACTERS for embeds in messages)
+
+def test_embed_batcher_flushes_after_linger():
+    async def scenario():
+        channel = FakeChannel()
+        batcher = EmbedBatcher(channel, OutboundScheduler(), linger=0.01)
+        await batcher.add(discord.Embed(title="First"))
+        await asyncio.sleep(0.05)
+        return channel.messages
+
+    assert [len(embeds) for embeds in asyncio.run(scenario())] == [1]
+
+def test_outbound_scheduler_paces_sends():
+    """Sends beyond the per-channel budget wait for the bucket to refill"""
+    async def scenario():
+        channel = FakeChannel()
+        scheduler = OutboundScheduler(messages_per_window=2, window_seconds=0.2)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(3):
+            await scheduler.send(channel, embeds=[])
+        return loop.time() - start, len(channel.messages)
+
+    elapsed, sent = asyncio.run(scenario())
+    assert sent == 3
+    assert elapsed >= 0.09
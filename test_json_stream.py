@@ -0,0 +1,34 @@
+import json
+from utils.json_stream import IncrementalJSONParser
+
+FEEDBACK = {
+    "experiences": [
+        {"company": "Acme {Corp}", "role": "Intern", "bullets": [{"content": "Built \"things\", fast", "score": 7}]},
+        {"company": "Initech", "role": "SWE", "bullets": []}
+    ],
+    "projects": [{"title": "Bot [v2]", "bullets": [{"content": "Wrote a bot", "score": 5}]}],
+    "formatting": {"margins": {"issue": False, "score": 9}, "overall_score": 8}
+}
+
+def test_incremental_parser_emits_completed_values():
+    """Watched values are emitted once complete, regardless of how the text is chunked"""
+    text = "```json\n" + json.dumps(FEEDBACK, indent=2) + "\n```"
+    parser = IncrementalJSONParser([("experiences", "*"), ("projects", "*"), ("formatting", "*")])
+
+    completed = []
+    for i in range(0, len(text), 7):
+        completed.extend(parser.feed(text[i:i + 7]))
+
+    assert completed == [
+        (("experiences", 0), FEEDBACK["experiences"][0]),
+        (("experiences", 1), FEEDBACK["experiences"][1]),
+        (("projects", 0), FEEDBACK["projects"][0]),
+        (("formatting", "margins"), FEEDBACK["formatting"]["margins"]),
+    ]
+    assert parser.done
+
+def test_incremental_parser_waits_for_closing_brace():
+    """Nothing is emitted for a value that is still being streamed"""
+    parser = IncrementalJSONParser([("experiences", "*")])
+    assert parser.feed('{"experiences": [{"company": "Acme", "bullets": [') == []
+    assert parser.feed('{"content": "x"}]}') == [(("experiences", 0), {"company": "Acme", "bullets": [{"content": "x"}]})]
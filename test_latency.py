@@ -0,0 +1,25 @@
+import random
+from utils.latency import LatencyHistogram, StageMetrics
+
+def test_histogram_percentiles_within_precision():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(0, 1.5) for _ in range(20000)]
+    histogram = LatencyHistogram(precision=0.01)
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    for q in [50, 95, 99]:
+        exact = values[int(len(values) * q / 100) - 1]
+        assert abs(histogram.percentile(q) - exact) / exact < 0.02
+    assert histogram.count == 20000
+    assert histogram.percentile(100) == histogram.max
+
+def test_stage_metrics_report():
+    metrics = StageMetrics()
+    assert metrics.report() == {}
+    metrics.record_review({"parse": 0.5, "model": 2.0})
+    metrics.record("parse", 1.5)
+    report = metrics.report()
+    assert report["parse"]["count"] == 2
+    assert report["model"]["p50"] == 2.0
+    assert report["parse"]["p99"] == 1.5
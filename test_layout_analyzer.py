@@ -0,0 +1,28 @@
+import fitz
+from utils.layout_analyzer import LOCAL_ASPECTS, score_layout
+from utils.pdf_utils import ResumeDocument
+
+def _document(pdf_bytes):
+    return ResumeDocument.from_bytes(pdf_bytes)
+
+def test_reference_resume_scores_full_marks_against_itself():
+    with open("resumes/jakes-resume.pdf", "rb") as f:
+        metrics = _document(f.read()).layout_metrics
+
+    aspects = score_layout(metrics, metrics)
+    assert list(aspects) == LOCAL_ASPECTS
+    assert all(not aspect["issue"] and aspect["score"] == 10 for aspect in aspects.values())
+
+def test_cramped_half_empty_page_is_flagged():
+    """Text jammed into the top left corner has margin and page fill issues"""
+    with open("resumes/jakes-resume.pdf", "rb") as f:
+        reference = _document(f.read()).layout_metrics
+    doc = fitz.open()
+    page = doc.new_page(width=612, height=792)
+    for i in range(10):
+        page.insert_text((8, 20 + i * 14), f"Built a thing that did something useful number {i}", fontsize=10)
+
+    aspects = score_layout(_document(doc.tobytes()).layout_metrics, reference)
+    assert aspects["margins"]["issue"]
+    assert aspects["page_utilization"]["issue"]
+    assert not aspects["font_size"]["issue"]
@@ -0,0 +1,29 @@
+from utils.metrics_server import MetricsServer
+from utils.retry import CircuitBreaker
+from utils.review_queue import ReviewQueue
+
+class FakeBot:
+    def __init__(self):
+        self.latency = float("inf")
+        self.ready = False
+        self.review_queue = ReviewQueue(max_size=2)
+
+    def is_ready(self):
+        return self.ready
+
+def test_readiness_and_metrics():
+    bot = FakeBot()
+    breaker = CircuitBreaker("Anthropic API", failure_threshold=1, reset_timeout=60)
+    server = MetricsServer(bot, 0, breaker=breaker)
+    assert server.readiness()[0] == "starting"
+    bot.ready = True
+    assert server.readiness()[0] == "ok"
+    breaker.record_failure()
+    status, checks = server.readiness()
+    assert status == "degraded" and checks["anthropic"] == CircuitBreaker.OPEN
+
+    metrics = server.render_metrics()
+    assert "# TYPE resume_bot_queue_depth gauge\nresume_bot_queue_depth 0.0" in metrics
+    assert "resume_bot_anthropic_degraded 1.0" in metrics
+    # No heartbeat yet
+    assert "resume_bot_gateway_latency_seconds NaN" in metrics
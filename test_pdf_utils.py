@@ -0,0 +1,127 @@
+import asyncio
+import pickle
+import fitz
+import pytest
+from utils.image_utils import MAX_PIXELS, ImageSettings
+from utils.pdf_utils import PDFRejectedError, ResumeDocument, describe_sections
+from config import PDF_WORKER_MEMORY_MB
+from utils.pdf_worker import PDFWorkerPool
+
+def test_resume_document_single_pass():
+    """One pass over the PDF gives the page count, text, spans and first page image"""
+    with open("resumes/jakes-resume.pdf", "rb") as f:
+        document = ResumeDocument.from_bytes(f.read())
+
+    assert document.is_single_page
+    assert "Jake Ryan" in document.text
+    assert document.spans and set(document.spans[0]) == {"text", "font", "size", "bbox", "flags", "line", "page"}
+    assert document.extracted_data == {"text": document.text, "formatting": document.spans}
+    assert document.image.media_type == "image/webp"
+    assert document.image.width * document.image.height <= MAX_PIXELS
+    # Documents are plain data so they can be handed between processes
+    assert pickle.loads(pickle.dumps(document)).spans == document.spans
+
+def test_resume_document_rejects_long_pdfs():
+    """PDFs over the page limit are rejected before any page is parsed or rendered"""
+    doc = fitz.open()
+    for _ in range(3):
+        doc.new_page()
+    with pytest.raises(PDFRejectedError):
+        ResumeDocument.from_bytes(doc.tobytes(), max_pages=2)
+
+def test_render_trims_margins_within_pixel_budget():
+    """Trimmed renders keep the page margins and stay inside the model's pixel budget"""
+    doc = fitz.open()
+    page = doc.new_page(width=612, height=792)
+    page.insert_text((72, 100), "Jane Doe")
+    page.insert_text((72, 700), "References available on request")
+    settings = ImageSettings(image_format="png", max_pixels=500_000)
+
+    image = ResumeDocument.from_bytes(doc.tobytes(), image_settings=settings).image
+    assert image.media_type == "image/png"
+    assert image.width * image.height <= 500_000
+    # Measured to the text, not to the padding kept around it
+    assert 0.98 < image.margins["left"] < 1.05 and 1.25 < image.margins["top"] < 1.3
+    assert image.estimated_tokens == -(-image.width * image.height // 750)
+
+def test_sections_split_entries_and_bullets():
+    """Headings split the resume into sections, and bullets are grouped under their entries"""
+    with open("resumes/jakes-resume.pdf", "rb") as f:
+        document = ResumeDocument.from_bytes(f.read())
+
+    sections = document.sections
+    assert [section.kind for section in sections] == ["header", "education", "experience", "projects", "skills"]
+    assert "Jake Ryan" in sections[0].text
+    experience, projects = sections[2], sections[3]
+    assert [entry.title for entry in experience.entries] == [
+        "Undergraduate Research Assistant | June 2020 – Present",
+        "Information Technology Support Specialist | Sep. 2018 – Present",
+        "Artificial Intelligence Research Assistant | May 2019 – July 2019",
+    ]
+    assert [len(entry.bullets) for entry in projects.entries] == [4, 4]
+    # The bullet glyphs are stripped from the bullet text
+    assert all(not bullet.startswith("•") for entry in experience.entries for bullet in entry.bullets)
+    described = describe_sections(sections, ["projects"])
+    assert described.startswith("## Projects\n- Gitlytics")
+    assert "Technical Skills" not in described
+
+def test_sections_join_wrapped_and_split_bullets():
+    """Wrapped bullet lines and bullet glyphs drawn apart from their text are joined into one bullet"""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 60), "EXPERIENCE", fontsize=12, fontname="hebo")
+    page.insert_text((72, 80), "Acme Corp", fontsize=10, fontname="hebo")
+    page.insert_text((80, 95), "• Built a billing service that was long enough that it", fontsize=10)
+    page.insert_text((87, 108), "wrapped onto the next line", fontsize=10)
+    page.insert_text((80, 121), "•", fontsize=10)
+    page.insert_text((87, 122), "Cut deploy times by 40%", fontsize=10, fontname="tiro")
+    page.insert_text((72, 150), "VOLUNTEERING", fontsize=12, fontname="hebo")
+    page.insert_text((80, 165), "• Tutored 30 students", fontsize=10)
+
+    sections = ResumeDocument.from_bytes(doc.tobytes()).sections
+    assert [section.kind for section in sections] == ["experience", "leadership"]
+    assert sections[0].entries[0].header == ["Acme Corp"]
+    assert sections[0].entries[0].bullets == [
+        "Built a billing service that was long enough that it wrapped onto the next line",
+        "Cut deploy times by 40%",
+    ]
+    assert sections[1].entries[0].bullets == ["Tutored 30 students"]
+
+def test_worker_pool_only_replaces_the_worker_that_timed_out():
+    """A PDF that runs out of time takes down its own worker, not the others"""
+    with open("resumes/jakes-resume.pdf", "rb") as f:
+        resume = f.read()
+    pool = PDFWorkerPool(worker_count=2, memory_limit_mb=0, timeout_seconds=60, max_bytes=len(resume), max_pages=2, image_settings=ImageSettings())
+
+    def worker_pids():
+        return set(pool._workers.values())
+
+    async def run():
+        await asyncio.gather(pool.parse(resume), pool.parse(resume))
+        started = worker_pids()
+        pool.timeout_seconds = 0.0001
+        with pytest.raises(PDFRejectedError, match="longer than"):
+            await pool.parse(resume)
+        pool.timeout_seconds = 60
+        documents = await asyncio.gather(pool.parse(resume), pool.parse(resume))
+        return started, documents
+
+    try:
+        started, documents = asyncio.run(run())
+        assert len(started) == 2 and len(started & worker_pids()) == 1
+        assert pool.restarts == 1
+        assert all(document.is_single_page for document in documents)
+    finally:
+        pool.shutdown()
+
+def test_worker_pool_parses_under_the_default_memory_limit():
+    """The address space limit workers run under by default leaves room for a real resume"""
+    with open("resumes/jakes-resume.pdf", "rb") as f:
+        resume = f.read()
+    pool = PDFWorkerPool(worker_count=1, memory_limit_mb=PDF_WORKER_MEMORY_MB, timeout_seconds=60, max_bytes=len(resume), max_pages=2, image_settings=ImageSettings())
+    try:
+        document = asyncio.run(pool.parse(resume))
+        assert document.is_single_page and "Jake Ryan" in document.text
+        assert pool.restarts == 0
+    finally:
+        pool.shutdown()
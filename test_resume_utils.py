@@ -0,0 +1,307 @@
+import asyncio
+import json
+import fitz
+import pytest
+from utils import resume_utils
+from utils.embed_dispatcher import OutboundScheduler
+from utils.feedback_renderer import FeedbackRenderer
+from models import FormattingFeedback
+from utils.pdf_utils import ResumeDocument, ResumeEntry, ResumeSection
+from utils.review_context import ReviewContext
+
+with open("resumes/jakes-resume.pdf", "rb") as f:
+    JAKES_RESUME = f.read()
+
+def make_context(**kwargs):
+    return ReviewContext(user_id=1, guild_id=10, channel_id=100, message_id=1000, **kwargs)
+
+def review(context=None, resume=JAKES_RESUME):
+    return asyncio.run(resume_utils.review_resume(resume, context or make_context()))
+
+EXPERIENCE = [("Acme Corp", ["Built a billing service in Go", "Cut deploy times by 40%"]), ("Initech", ["Wrote TPS reports"])]
+PROJECTS = [("Gitlytics", ["Visualized GitHub data"])]
+
+def make_resume(experience=EXPERIENCE, projects=PROJECTS, contact="jane@example.com | 555-0100", leadership=()):
+    """A one page resume; experience, projects and leadership are lists of (header, bullets)"""
+    doc = fitz.open()
+    page = doc.new_page()
+    y = 60
+    def write(x, text, size=10, font="helv", gap=14):
+        nonlocal y
+        page.insert_text((x, y), text, fontsize=size, fontname=font)
+        y += gap
+    write(250, "Jane Doe", size=16, font="hebo", gap=16)
+    write(220, contact, gap=24)
+    sections = [("EXPERIENCE", experience)] + ([("LEADERSHIP", leadership)] if leadership else []) + [("PROJECTS", projects)]
+    for heading, entries in sections:
+        write(72, heading, size=12, font="hebo", gap=18)
+        for header, bullets in entries:
+            write(72, header, font="hebo")
+            for bullet in bullets:
+                write(80, "• " + bullet)
+        y += 10
+    return doc.tobytes()
+
+def review_revision(fake_model, revised, previous=None):
+    """Review the original resume, then the revised one against it. Returns what
+    review_resume_changes returned and the model calls made for the revision."""
+    previous = previous or review(resume=make_resume())
+    fake_model.calls = []
+    result = asyncio.run(resume_utils.review_resume_changes(revised, make_context(), previous))
+    return result, fake_model.calls
+
+def test_near_duplicate_bullets_are_only_reused_from_the_same_user(fake_model):
+    """A near duplicate from the user's own earlier review is reused in full. One from someone
+    else's resume is a miss, so the model's feedback and score are kept, not the cached ones."""
+    context = make_context()
+    scope = resume_utils._bullet_scope("experience", context)
+    own = "Developed a REST API using FastAPI and PostgreSQL to store data from learning management systems"
+    other = "Developed a full-stack web application using Flask, React, PostgreSQL and Docker to analyze GitHub data"
+    resume_utils.bullet_cache.put(scope, own.replace("Developed", "Built"), {
+        "content": "earlier version", "feedback": "Cached feedback", "rewrites": ["Cached rewrite"], "score": 9
+    }, owner="1")
+    resume_utils.bullet_cache.put(scope, other.replace("Developed", "Built"), {
+        "content": "someone else's bullet", "feedback": "Mention Initech", "rewrites": ["Built Initech's billing app"], "score": 3
+    }, owner="2")
+
+    feedback = review(context)
+    sent = fake_model.entry_calls()[0][3]
+    assert own not in sent and other in sent
+    first, second = feedback["experiences"][0]["bullets"][:2]
+    assert first == {"content": own, "feedback": "Cached feedback", "rewrites": ["Cached rewrite"], "score": 9}
+    assert second == {"content": other, "feedback": f"Feedback on {other}", "rewrites": [f"Better {other}"], "score": 6}
+    assert (resume_utils.bullet_cache.near_hits, resume_utils.bullet_cache.hits) == (1, 0)
+
+def test_fan_out_retries_only_the_invalid_section(fake_model):
+    """An entry whose answer doesn't validate is asked again on its own"""
+    fake_model.invalid = {"Undergraduate Research Assistant": 1}
+    feedback = review()
+
+    titles = [call[2] for call in fake_model.entry_calls()]
+    assert sum(title.startswith("Undergraduate Research Assistant") for title in titles) == 2
+    assert len(titles) == len(set(titles)) + 1
+    assert [call[0] for call in fake_model.calls].count("formatting") == 1
+    assert len(feedback["experiences"][0]["bullets"]) == 3
+
+def test_fan_out_keeps_section_order_whatever_finishes_first(fake_model):
+    """Sections are yielded experiences first, then projects, then formatting, in resume order"""
+    fake_model.delays = {"Undergraduate Research Assistant": 0.05, "Information Technology Support Specialist": 0.02}
+    events = []
+
+    async def on_event(kind, payload):
+        events.append((kind, payload))
+
+    feedback = asyncio.run(resume_utils.review_resume(JAKES_RESUME, make_context(), on_event=on_event))
+    kinds = [kind for kind, _ in events]
+    assert kinds[:6] == ["triage", "experience", "experience", "experience", "project", "project"]
+    assert set(kinds[6:]) == {"formatting_aspect"}
+    assert [experience["company"] for experience in feedback["experiences"]] == [
+        payload["company"] for kind, payload in events if kind == "experience"
+    ]
+    assert feedback["experiences"][0]["company"].startswith("Undergraduate Research Assistant")
+    assert feedback["experiences"][1]["company"].startswith("Information Technology Support Specialist")
+    assert [project["title"].split(" |")[0] for project in feedback["projects"]] == ["Gitlytics", "Simple Paintball"]
+
+def test_fan_out_raises_once_a_section_runs_out_of_attempts(fake_model):
+    """A section that never validates fails the review after REVIEW_SECTION_ATTEMPTS tries"""
+    fake_model.invalid = {"Simple Paintball": 100}
+    with pytest.raises(ValueError, match="Expected feedback on 4 bullets"):
+        review()
+    titles = [call[2] for call in fake_model.entry_calls()]
+    assert sum(title.startswith("Simple Paintball") for title in titles) == resume_utils.REVIEW_SECTION_ATTEMPTS
+
+def test_identical_revision_sends_no_requests(fake_model):
+    previous = review(resume=make_resume())
+    (feedback, changes), calls = review_revision(fake_model, make_resume(), previous)
+    assert calls == []
+    assert changes == {"bullets": [], "removed": [], "formatting": []}
+    assert feedback["experiences"] == previous["experiences"] and feedback["projects"] == previous["projects"]
+
+def test_rewritten_bullet_is_reviewed_alone_with_its_earlier_version(fake_model):
+    rewrite = "Built a billing service in Go handling 2M payments a day"
+    experience = [("Acme Corp", [rewrite, "Cut deploy times by 40%"]), EXPERIENCE[1]]
+    (feedback, changes), calls = review_revision(fake_model, make_resume(experience))
+
+    assert calls == [("experience", "detailed", "Acme Corp", [rewrite])]
+    assert changes["bullets"] == [{
+        "kind": "experience", "entry": "Acme Corp - Role", "before": "Built a billing service in Go", "before_score": 6,
+        "bullet": {"content": rewrite, "feedback": f"Feedback on {rewrite}", "rewrites": [f"Better {rewrite}"], "score": 6}
+    }]
+    assert changes["removed"] == []
+    # The unchanged bullet keeps its earlier feedback
+    assert feedback["experiences"][0]["bullets"][1]["feedback"] == "Feedback on Cut deploy times by 40%"
+
+def test_unrelated_bullets_are_new_and_their_predecessors_removed(fake_model):
+    experience = [("Acme Corp", ["Built a billing service in Go", "Mentored three interns"]), EXPERIENCE[1]]
+    (feedback, changes), calls = review_revision(fake_model, make_resume(experience))
+
+    assert calls == [("experience", "detailed", "Acme Corp", ["Mentored three interns"])]
+    assert [(change["before"], change["bullet"]["content"]) for change in changes["bullets"]] == [(None, "Mentored three interns")]
+    assert changes["removed"] == [{"kind": "experience", "entry": "Acme Corp - Role", "content": "Cut deploy times by 40%", "score": 6}]
+
+def test_match_bullets_pairs_rewrites_from_half_similarity():
+    """Unchanged bullets are matched first, then rewrites at a difflib ratio of at least 0.5"""
+    old = ["Wrote TPS reports", "Cut deploy times by 40%", "Organized the office party"]
+    previous_entries = [(
+        "experience", {"kind": "experience", "header": ["Initech"], "bullets": old},
+        {"company": "Initech", "role": "Analyst", "bullets": [{"content": text, "score": score} for score, text in enumerate(old)]}
+    )]
+    section = ResumeSection("experience")
+    # The first bullet looks like a rewrite of "Wrote TPS reports", but that bullet is still there
+    new = ["Wrote weekly TPS reports", "Wrote TPS reports.", "Cut deploy times by 60% with canary releases"]
+    section.entries = [ResumeEntry(["Initech"], new)]
+
+    matches, removed = resume_utils._match_bullets([section], previous_entries)
+    assert {bullet: before for (_, bullet), (before, _) in matches.items()} == {
+        "Wrote weekly TPS reports": None,
+        "Wrote TPS reports.": "Wrote TPS reports",
+        "Cut deploy times by 60% with canary releases": "Cut deploy times by 40%",
+    }
+    assert removed == [("experience", "Initech - Analyst", "Organized the office party", {"content": "Organized the office party", "score": 2})]
+
+def test_revisions_that_cant_be_matched_need_a_full_review(fake_model):
+    previous = review(resume=make_resume())
+    without_outline = {key: value for key, value in previous.items() if key != "outline"}
+    missing_entry = {**previous, "experiences": previous["experiences"][:1]}
+    missing_bullet = {**previous, "projects": [{**previous["projects"][0], "bullets": []}]}
+    for earlier in [without_outline, missing_entry, missing_bullet]:
+        result, calls = review_revision(fake_model, make_resume(), earlier)
+        assert result is None and calls == []
+    # A revision the section parser finds no entries in can't be compared either
+    result, _ = review_revision(fake_model, make_resume([], []), previous)
+    assert result is None
+
+def test_changed_contact_block_only_re_reviews_its_formatting_aspects(fake_model):
+    (feedback, changes), calls = review_revision(fake_model, make_resume(contact="jane.doe@example.com | 555-0199"))
+    assert calls == [("formatting", "detailed", None, ["contact_information"])]
+    assert [change["name"] for change in changes["formatting"]] == ["contact_information"]
+
+def test_affected_formatting_follows_the_fingerprint_and_measured_scores():
+    document = ResumeDocument.from_bytes(make_resume())
+    outline = resume_utils.resume_outline(document)
+    measured = {"issue": True, "feedback": "Measured", "suggestions": [], "score": 5}
+    previous = {
+        "outline": {**outline, "fingerprint": {**outline["fingerprint"], "fonts": ["Times-Roman 11"]}},
+        "formatting": {"font_size": {**measured}, "margins": {**measured, "score": 8}},
+    }
+    layout_aspects = {"font_size": measured, "margins": measured, "alignment": {**measured, "issue": False}}
+
+    # Fonts changed, but the measured font size scored the same, and margins are measured with a new score
+    assert resume_utils._affected_formatting(previous, document, layout_aspects) == {"font_consistency", "font_choice", "consistency", "margins"}
+
+def test_formatting_tool_only_asks_for_explanations_of_measured_aspects():
+    """Measured aspects keep their local score, so the model only explains the ones with issues"""
+    measured = {"issue": True, "feedback": "Measured", "suggestions": [], "score": 5}
+    schema = resume_utils._formatting_tool_schema({"margins": measured, "alignment": {**measured, "issue": False}})
+    properties = schema["properties"]
+    assert "alignment" not in properties
+    assert set(properties["margins"]["properties"]) == {"feedback", "suggestions"}
+    assert properties["margins"]["required"] == ["feedback"]
+    assert set(properties["font_choice"]["required"]) == {"issue", "feedback", "score"}
+
+def test_triage_runs_on_the_fast_model_and_sections_on_the_detailed_one(fake_model):
+    feedback = review()
+    assert fake_model.calls[0][:2] == ("triage", "fast")
+    assert {(kind, tier) for kind, tier, _, _ in fake_model.calls[1:]} == {("experience", "detailed"), ("project", "detailed"), ("formatting", "detailed")}
+    assert feedback["triage"]["overall_score"] == 7
+
+def test_quick_reviews_run_every_section_on_the_fast_model(fake_model):
+    review(make_context(model_tier="fast"))
+    assert len(fake_model.calls) == 7
+    assert {tier for _, tier, _, _ in fake_model.calls} == {"fast"}
+
+def test_failed_triage_falls_back_to_a_detailed_review(fake_model):
+    """Triage only routes the review, so a quick review whose triage fails goes ahead on the detailed model"""
+    fake_model.malformed_triage = True
+    events = []
+
+    async def on_event(kind, payload):
+        events.append(kind)
+
+    feedback = asyncio.run(resume_utils.review_resume(JAKES_RESUME, make_context(model_tier="fast"), on_event=on_event))
+    assert "triage" not in events and feedback["triage"] is None
+    assert {tier for _, tier, _, _ in fake_model.calls[1:]} == {"detailed"}
+    assert len(feedback["experiences"]) == 3
+
+def test_triage_rejects_documents_that_arent_resumes(fake_model):
+    fake_model.is_resume = False
+    with pytest.raises(resume_utils.NotAResumeError, match="banana bread"):
+        review()
+    assert [kind for kind, _, _, _ in fake_model.calls] == ["triage"]
+
+def stream_single_review(monkeypatch, response):
+    """Review in one streamed request, which answers with response in small chunks"""
+    async def stream_chat_completion(**kwargs):
+        for start in range(0, len(response), 50):
+            yield response[start:start + 50]
+    monkeypatch.setattr(resume_utils, "stream_chat_completion", stream_chat_completion)
+    # The streamed response is made up, so the prompt for it doesn't matter
+    monkeypatch.setattr(resume_utils, "build_review_request", lambda *args, **kwargs: ("", []))
+    monkeypatch.setattr(resume_utils, "REVIEW_FAN_OUT", False)
+
+def answer_extracted_entries(description):
+    """The experiences and projects a model would answer the extracted entries in a prompt with"""
+    answer = {"experiences": [], "projects": []}
+    entries = None
+    for line in description.splitlines():
+        line = line.strip()
+        if line in ("Experiences:", "Projects:"):
+            entries = answer[line[:-1].lower()]
+        elif line.startswith("- ") and entries is not None:
+            name = {"company": line[2:], "role": "Role"} if entries is answer["experiences"] else {"title": line[2:]}
+            entries.append({**name, "bullets": []})
+        elif line.startswith("* "):
+            bullet = line[2:]
+            entries[-1]["bullets"].append({"content": bullet, "feedback": f"Feedback on {bullet}", "rewrites": [f"Better {bullet}"], "score": 6})
+    return answer
+
+class RecordingChannel:
+    id = 100
+
+    def __init__(self):
+        self.titles = []
+
+    async def send(self, embeds=(), **kwargs):
+        self.titles.extend(embed.title for embed in embeds)
+
+@pytest.mark.parametrize("cut", ["400", "projects", "formatting"])
+def test_cut_off_review_is_rendered_in_section_order(fake_model, monkeypatch, cut):
+    """Sections salvaged from a single review cut off at max_tokens are still posted experiences
+    first, then projects, then formatting, each of them once"""
+    complete = review()
+    response = json.dumps({key: complete[key] for key in ["experiences", "projects", "formatting"]})
+    end = {"400": 400, "projects": response.index('"projects"'), "formatting": response.index('"formatting"') + 600}[cut]
+    stream_single_review(monkeypatch, response[:end])
+
+    async def render():
+        channel = RecordingChannel()
+        renderer = FeedbackRenderer(channel, OutboundScheduler(messages_per_window=1000))
+        feedback = await resume_utils.review_resume(JAKES_RESUME, make_context(), on_event=renderer.handle)
+        await renderer.finish(feedback)
+        return channel.titles
+    titles = asyncio.run(render())
+
+    headers = [title for title in titles if title.startswith("**") or title.endswith("Score") and not title.startswith("Quick")]
+    experiences = [f"**Experience at {entry['company']} - {entry['role']}**\n" for entry in complete["experiences"]]
+    projects = [f"**Project: {entry['title']}**\n" for entry in complete["projects"]]
+    assert headers == [
+        *experiences, "Experience Section Score", *projects, "Projects Section Score", "**Formatting Feedback**\n", "Formatting Score"
+    ]
+    aspects = titles[titles.index("**Formatting Feedback**\n") + 1:titles.index("Formatting Score")]
+    assert len(aspects) == len(FormattingFeedback.__fields__) - 1
+
+def test_salvaged_entries_line_up_past_entries_without_bullets(fake_model, monkeypatch):
+    """An entry without bullets isn't asked for, so salvaged entries after it keep their own bullets"""
+    experience = [*EXPERIENCE, ("Teaching Assistant | Texas A&M", [])]
+    resume = make_resume(experience, leadership=[("ColorStack UF", ["Ran weekly interview prep", "Grew membership to 200"])])
+    sections = ResumeDocument.from_bytes(resume).sections
+    answer = answer_extracted_entries(resume_utils._describe_extracted_entries(sections))
+    response = json.dumps(answer)
+    # Cut off once the experiences are complete
+    stream_single_review(monkeypatch, response[:response.index('"projects"')])
+
+    feedback = review(resume=resume)
+    reviewed = [[bullet["content"] for bullet in entry["bullets"]] for entry in feedback["experiences"] + feedback["projects"]]
+    assert reviewed == [entry.bullets for _, entry in resume_utils._resume_entries(sections)]
+    # Only the project was cut off
+    assert [call[2] for call in fake_model.entry_calls()] == ["Gitlytics"]
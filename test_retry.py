@@ -0,0 +1,42 @@
+from utils.retry import CircuitBreaker, RetryPolicy, parse_retry_after
+
+def test_retry_policy_backoff_and_retry_after():
+    """Backoff grows exponentially, stays capped and honours Retry-After"""
+    policy = RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=8.0, max_retry_after=20.0)
+    for attempt in range(6):
+        assert 0 <= policy.delay(attempt) <= min(8.0, 2 ** attempt)
+    assert policy.delay(0, retry_after=12) >= 12
+    assert policy.delay(0, retry_after=500) <= 20.0
+    assert policy.is_retryable_status(529)
+    assert policy.is_retryable_status(429)
+    assert not policy.is_retryable_status(400)
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+
+def test_circuit_breaker_opens_and_recovers(clock):
+    """The breaker opens after repeated failures and lets one trial through after the cool-down"""
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30, clock=clock)
+
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    clock.now = 31
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # Only one trial at a time
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 62
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.consecutive_failures == 0
@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from utils.review_cache import ReviewCache
+
+def test_review_cache_eviction_and_expiry(tmp_path, clock):
+    """Least recently used entries are evicted and old entries expire"""
+    cache = ReviewCache(str(tmp_path / "cache.json"), max_entries=2, ttl_seconds=100, clock=clock)
+    cache.put("a", {"score": 1})
+    cache.put("b", {"score": 2})
+    assert cache.get("a") == {"score": 1}  # "b" is now the least recently used
+    cache.put("c", {"score": 3})
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+    clock.now = 101
+    assert cache.get("a") is None
+    # Plain lookups only count hits, misses are counted once a review has to run
+    assert (cache.hits, cache.misses) == (1, 0)
+
+def test_review_cache_key_depends_on_inputs():
+    key = ReviewCache.make_key(b"%PDF", {"job_title": "SWE"}, 1)
+    assert key == ReviewCache.make_key(b"%PDF", {"job_title": "SWE"}, 1)
+    assert key != ReviewCache.make_key(b"%PDF", None, 1)
+    assert key != ReviewCache.make_key(b"%PDF", {"job_title": "SWE"}, 2)
+
+def test_review_cache_single_flight_and_persistence(tmp_path):
+    """Concurrent identical reviews share one computation, which is saved to disk"""
+    storage_file = str(tmp_path / "cache.json")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"score": 9}
+
+    async def scenario():
+        cache = ReviewCache(storage_file)
+        results = await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(3)))
+        await cache.get_or_compute("key", compute)
+        return results, (cache.hits, cache.misses)
+
+    results, counts = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert counts == (3, 1)
+    assert sorted(from_cache for _, from_cache in results) == [False, True, True]
+    assert ReviewCache(storage_file).get("key") == {"score": 9}
+
+def test_review_cache_does_not_store_failures(tmp_path):
+    async def compute():
+        raise RuntimeError("backend down")
+
+    async def scenario():
+        cache = ReviewCache(str(tmp_path / "cache.json"))
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute("key", compute)
+        return cache.get("key")
+
+    assert asyncio.run(scenario()) is None
+
+def test_review_cache_concurrent_saves(tmp_path, caplog):
+    """Saves from concurrent reviews don't trip over each other's temporary files"""
+    storage_file = tmp_path / "cache.json"
+
+    async def scenario():
+        cache = ReviewCache(str(storage_file))
+        for trial in range(20):
+            cache.put(f"key{trial}", {"score": trial})
+            await asyncio.gather(*(cache.save() for _ in range(4)))
+
+    asyncio.run(scenario())
+    assert "Error saving" not in caplog.text
+    assert ReviewCache(str(storage_file)).get("key19") == {"score": 19}
+    assert [path.name for path in tmp_path.iterdir()] == ["cache.json"]
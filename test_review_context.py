@@ -0,0 +1,49 @@
+import asyncio
+import pytest
+from utils.review_context import ReviewContext, ReviewCancelledError
+
+def test_review_contexts_keep_their_own_job_details():
+    """Concurrent reviews never see each other's job details"""
+    first = ReviewContext(user_id=1, guild_id=10, channel_id=100, message_id=1000, job_details={
+        "job_title": "SWE Intern", "company": "Acme", "min_qual": "Python", "pref_qual": "Go"
+    })
+    second = ReviewContext(user_id=2, guild_id=10, channel_id=100, message_id=1001)
+
+    assert first.job_kwargs == {"job_title": "SWE Intern", "company": "Acme", "min_qual": "Python", "pref_qual": "Go"}
+    assert second.job_kwargs == {}
+    assert first.review_id != second.review_id
+
+def test_review_context_cancellation():
+    """A cancelled review stops at its next checkpoint and keeps the first reason"""
+    context = ReviewContext(user_id=1, guild_id=10, channel_id=100, message_id=1000)
+    context.raise_if_cancelled()
+
+    context.cancel("resume message was deleted")
+    context.cancel("bot is shutting down")
+    assert context.cancelled
+    with pytest.raises(ReviewCancelledError, match="resume message was deleted"):
+        context.raise_if_cancelled()
+
+def test_review_context_timings_accumulate():
+    context = ReviewContext(user_id=1, guild_id=10, channel_id=100, message_id=1000)
+    with context.timed("prepare"):
+        pass
+    with context.timed("prepare"):
+        pass
+    assert set(context.timings) == {"prepare"}
+    assert context.timings["prepare"] >= 0
+
+def test_review_context_wait_stops_on_cancel():
+    """Waiting on an event gives up as soon as the review is cancelled"""
+    async def scenario():
+        context = ReviewContext(user_id=1, guild_id=10, channel_id=100, message_id=1000)
+        ready = asyncio.Event()
+        ready.set()
+        await context.wait_for(ready)
+
+        never = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.01, context.cancel, "resume message was deleted")
+        with pytest.raises(ReviewCancelledError, match="resume message was deleted"):
+            await asyncio.wait_for(context.wait_for(never), 1)
+
+    asyncio.run(scenario())
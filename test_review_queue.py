@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import pytest
+from utils.review_queue import ReviewQueue, QueueFullError, UserQueueLimitError
+
+logger = logging.getLogger(__name__)
+
+def test_review_queue_runs_jobs():
+    """Jobs submitted to the queue are run by the workers"""
+    async def scenario():
+        queue = ReviewQueue(worker_count=2, max_size=5, max_pending_per_user=5)
+        queue.start()
+
+        async def review(value):
+            await asyncio.sleep(0.01)
+            return value * 2
+
+        jobs = [queue.submit("user", lambda v=v: review(v)) for v in range(3)]
+        results = await asyncio.gather(*(job.future for job in jobs))
+        await queue.stop()
+        return results
+
+    assert asyncio.run(scenario()) == [0, 2, 4]
+
+def test_review_queue_backpressure():
+    """The queue rejects jobs past its size and per-user limits"""
+    async def scenario():
+        queue = ReviewQueue(worker_count=1, max_size=2, max_pending_per_user=2)
+        queue.start()
+        release = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+
+        first = queue.submit("a", blocked)
+        await asyncio.sleep(0)  # Let the worker pick up the first job
+        second = queue.submit("a", blocked)
+        with pytest.raises(UserQueueLimitError):
+            queue.submit("a", blocked)
+        with pytest.raises(UserQueueLimitError):
+            queue.check("a")
+        queue.check("b")
+
+        third = queue.submit("b", blocked)
+        with pytest.raises(QueueFullError):
+            queue.submit("c", blocked)
+        # The same checks can be made before there is a job to submit
+        with pytest.raises(QueueFullError):
+            queue.check("c")
+
+        positions = (queue.position(first), queue.position(second), queue.position(third))
+        release.set()
+        await asyncio.gather(first.future, second.future, third.future)
+        await queue.stop()
+        return positions
+
+    assert asyncio.run(scenario()) == (0, 1, 2)
+
+def test_review_queue_times_the_wait_for_a_worker():
+    """A job's wait runs from submit until a worker picks it up, not until it finishes"""
+    async def scenario():
+        queue = ReviewQueue(worker_count=1)
+        queue.start()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+
+        first = queue.submit("a", slow)
+        second = queue.submit("b", slow)
+        await asyncio.gather(first.future, second.future)
+        await queue.stop()
+        return first.wait_seconds, second.wait_seconds
+
+    first_wait, second_wait = asyncio.run(scenario())
+    assert first_wait < 0.04 <= second_wait < 0.1
+
+def test_review_queue_propagates_errors():
+    """A failing review surfaces its exception to the submitter"""
+    async def scenario():
+        queue = ReviewQueue(worker_count=1)
+        queue.start()
+
+        async def broken():
+            raise ValueError("bad pdf")
+
+        job = queue.submit("user", broken)
+        with pytest.raises(ValueError):
+            await job.future
+        await queue.stop()
+
+    asyncio.run(scenario())
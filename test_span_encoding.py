@@ -0,0 +1,15 @@
+from utils.span_encoding import encode_spans
+
+def test_encode_spans_merges_runs_and_shares_fonts():
+    spans = [
+        {"text": "Jane", "font": "Arial-Bold", "size": 14.02, "bbox": (72.4, 50.2, 101.0, 64.0), "line": 0},
+        {"text": " Doe", "font": "Arial-Bold", "size": 14.0, "bbox": (101.0, 50.2, 130.6, 64.0), "line": 0},
+        {"text": "Python", "font": "Arial", "size": 10.0, "bbox": (72.4, 80.0, 110.0, 90.0), "line": 1},
+        {"text": " | ", "font": "Arial-Bold", "size": 14.0, "bbox": (110.0, 80.0, 115.0, 90.0), "line": 1},
+        {"text": "Go", "font": "Arial", "size": 10.0, "bbox": (115.0, 80.0, 128.7, 90.0), "line": 1},
+    ]
+    assert encode_spans(spans).splitlines() == [
+        "Fonts: f0=Arial-Bold 14pt, f1=Arial 10pt",
+        "50 72-131 [f0]Jane Doe",
+        "80 72-129 [f1]Python[f0] | [f1]Go",
+    ]
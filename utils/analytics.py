@@ -1,154 +1,201 @@
+import asyncio
+import atexit
 import json
-import os
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from collections import defaultdict
+from utils.analytics_store import create_store
 
 logger = logging.getLogger(__name__)
 
+# Read here rather than from config, which needs the bot's settings to import
+ANALYTICS_BACKEND = os.getenv('ANALYTICS_BACKEND', 'sqlite')  # sqlite, or json for the old single file
+ANALYTICS_FLUSH_SECONDS = float(os.getenv('ANALYTICS_FLUSH_SECONDS', '5'))  # Longest tracked events wait in memory
+ANALYTICS_FLUSH_SIZE = int(os.getenv('ANALYTICS_FLUSH_SIZE', '200'))  # Buffered events that trigger an early flush
+
 class Analytics:
-    def __init__(self, storage_file="analytics_data.json"):
+    """Tracks reviews, API usage and ratings as events in a pluggable store.
+
+    Tracking only appends the event to an in-memory buffer. A background task started with
+    start() flushes the buffer every flush_interval seconds, or sooner once flush_size events
+    are waiting. Each flushed batch is appended to a journal before it is stored, and the
+    journal is cleared once everything in it is stored, so batches that didn't make it into
+    the store (a crash or a failing write) are stored on the next start, exactly once.
+
+    The store is opened, and the journal replayed, by start() or on first use rather than on
+    construction, so importing the module doesn't touch the disk.
+    """
+    def __init__(self, storage_file="analytics_data.json", backend=ANALYTICS_BACKEND,
+                 flush_interval=ANALYTICS_FLUSH_SECONDS, flush_size=ANALYTICS_FLUSH_SIZE, journal_file=None):
         self.storage_file = storage_file
-        self.data = self._load_data()
-        
-    def _load_data(self):
-        """Load analytics data from file or create default structure if file doesn't exist"""
-        if os.path.exists(self.storage_file):
+        self.backend = backend
+        self._store = None
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.journal_file = journal_file or storage_file + ".journal"
+        self._buffer = []
+        # (batch id, events) that are journaled but not stored yet, oldest first
+        self._unsent = []
+        self._lock = threading.Lock()
+        # Reentrant, since the first flush opens the store, which stores the journal
+        self._flush_lock = threading.RLock()
+        # One writer thread keeps batches in order and the disk off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analytics")
+        self._flush_task = None
+        self._wake = None
+        # Scripts never start the flusher, so write what's left when they exit
+        atexit.register(self._flush_now)
+
+    @property
+    def store(self):
+        """The event store, opened on first use"""
+        if self._store is None:
+            self._open_store()
+        return self._store
+
+    def _open_store(self):
+        with self._flush_lock:
+            if self._store is None:
+                self._store = create_store(self.backend, self.storage_file)
+                self._replay_journal()
+
+    def _record(self, event_type, **fields):
+        event = {"type": event_type, "ts": time.time(), **fields}
+        with self._lock:
+            self._buffer.append(event)
+            full = len(self._buffer) >= self.flush_size
+        if full and self._wake is not None:
+            self._wake.set()
+
+    def start(self):
+        """Start flushing in the background. Called from ResumeBot.setup_hook."""
+        if self._flush_task is None:
+            # Open the store on the writer thread instead of the event loop
+            self._executor.submit(self._open_store)
+            self._wake = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
             try:
-                with open(self.storage_file, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                logger.error(f"Error decoding analytics file {self.storage_file}. Creating new data structure.")
-                return self._create_default_data()
-        else:
-            return self._create_default_data()
-    
-    def _create_default_data(self):
-        """Create default data structure for analytics"""
-        return {
-            "resume_reviews": {
-                "total": 0,
-                "by_server": {},
-                "by_user": {},
-                "by_date": {},
-                "average_scores": {
-                    "overall": 0,
-                    "experiences": 0,
-                    "projects": 0,
-                    "formatting": 0
-                }
-            },
-            "api_usage": {
-                "total_tokens": 0,
-                "total_requests": 0,
-                "estimated_cost": 0
-            },
-            "feedback_ratings": {
-                "total": 0,
-                "average": 0,
-                "ratings": {
-                    "1": 0,
-                    "2": 0,
-                    "3": 0,
-                    "4": 0,
-                    "5": 0
-                }
-            }
-        }
-    
-    def _save_data(self):
-        """Save analytics data to file"""
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write every tracked event without blocking the event loop"""
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._flush_now)
+
+    async def close(self):
+        """Stop the flusher, write the remaining events and close the store, on shutdown"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        if self._store is not None:
+            self._store.close()
+
+    def _flush_now(self):
+        with self._flush_lock:
+            with self._lock:
+                events, self._buffer = self._buffer, []
+            if events:
+                # Batches an earlier run journaled are replayed on opening, ahead of this one
+                self._open_store()
+                batch = (time.time_ns(), events)
+                self._journal(batch)
+                self._unsent.append(batch)
+            # Until the store is opened the journal is an earlier run's, waiting to be replayed
+            if self._store is not None:
+                self._store_unsent()
+
+    def _journal(self, batch):
+        batch_id, events = batch
         try:
-            with open(self.storage_file, 'w') as f:
-                json.dump(self.data, f, indent=2)
-        except Exception as e:
-            logger.error(f"Error saving analytics data: {e}")
-    
+            with open(self.journal_file, 'a') as f:
+                f.write(json.dumps({"batch": batch_id, "events": events}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            logger.error(f"Error journaling {len(events)} analytics events: {e}")
+
+    def _store_unsent(self):
+        while self._unsent:
+            batch_id, events = self._unsent[0]
+            try:
+                self.store.append(events, batch_id=batch_id)
+            except Exception as e:
+                logger.error(f"Error saving {len(events)} analytics events, retrying on the next flush: {e}")
+                return
+            self._unsent.pop(0)
+        # Everything journaled is stored now
+        if os.path.exists(self.journal_file) and os.path.getsize(self.journal_file):
+            try:
+                os.truncate(self.journal_file, 0)
+            except OSError as e:
+                logger.error(f"Error clearing analytics journal: {e}")
+
+    def _replay_journal(self):
+        """Store the journaled batches a previous run didn't get to store"""
+        if not os.path.exists(self.journal_file):
+            return
+        last_batch = self.store.last_batch()
+        with open(self.journal_file, 'r') as f:
+            for line in f:
+                try:
+                    batch = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash; its batch was never handed to the store
+                    logger.warning("Skipping incomplete analytics journal line")
+                    continue
+                if batch["batch"] > last_batch:
+                    self._unsent.append((batch["batch"], batch["events"]))
+        if self._unsent:
+            logger.info(f"Replaying {sum(len(events) for _, events in self._unsent)} journaled analytics events")
+        self._store_unsent()
+
     def track_resume_review(self, user_id, server_id, scores):
         """Track a resume review"""
         today = datetime.now().strftime("%Y-%m-%d")
-        
-        # Update total count
-        self.data["resume_reviews"]["total"] += 1
-        
-        # Update by server
-        server_id_str = str(server_id)
-        if server_id_str not in self.data["resume_reviews"]["by_server"]:
-            self.data["resume_reviews"]["by_server"][server_id_str] = 0
-        self.data["resume_reviews"]["by_server"][server_id_str] += 1
-        
-        # Update by user
-        user_id_str = str(user_id)
-        if user_id_str not in self.data["resume_reviews"]["by_user"]:
-            self.data["resume_reviews"]["by_user"][user_id_str] = 0
-        self.data["resume_reviews"]["by_user"][user_id_str] += 1
-        
-        # Update by date
-        if today not in self.data["resume_reviews"]["by_date"]:
-            self.data["resume_reviews"]["by_date"][today] = 0
-        self.data["resume_reviews"]["by_date"][today] += 1
-        
-        # Update average scores
-        total = self.data["resume_reviews"]["total"]
-        prev_total = total - 1
-        
-        # Calculate new averages using weighted average formula
-        for score_type, score in scores.items():
-            if score_type in self.data["resume_reviews"]["average_scores"]:
-                prev_avg = self.data["resume_reviews"]["average_scores"][score_type]
-                new_avg = (prev_avg * prev_total + score) / total if total > 0 else score
-                self.data["resume_reviews"]["average_scores"][score_type] = round(new_avg, 2)
-        
-        self._save_data()
+        self._record("review", user_id=str(user_id), server_id=str(server_id), date=today, scores=scores)
         logger.info(f"Tracked resume review for user {user_id} on server {server_id}")
     
-    def track_api_usage(self, tokens_used, estimated_cost=None):
-        """Track API usage"""
+    def track_api_usage(self, tokens_used, estimated_cost=None, cache_creation_tokens=0, cache_read_tokens=0, model=None):
+        """Track API usage, including tokens written to and read from the prompt cache, per model"""
         if estimated_cost is None:
             # Estimate cost based on Claude 3.5 Sonnet pricing ($3 per 1M input tokens, $15 per 1M output tokens)
             # Assuming a 50/50 split between input and output tokens for simplicity
             estimated_cost = (tokens_used / 2 * 3 / 1000000) + (tokens_used / 2 * 15 / 1000000)
         
-        self.data["api_usage"]["total_tokens"] += tokens_used
-        self.data["api_usage"]["total_requests"] += 1
-        self.data["api_usage"]["estimated_cost"] += estimated_cost
-        
-        self._save_data()
-        logger.info(f"Tracked API usage: {tokens_used} tokens, ${estimated_cost:.6f} estimated cost")
+        self._record(
+            "api_usage", tokens=tokens_used, estimated_cost=estimated_cost,
+            cache_creation_tokens=cache_creation_tokens, cache_read_tokens=cache_read_tokens, model=model
+        )
+        logger.info(f"Tracked API usage: {tokens_used} tokens ({cache_read_tokens} cached), ${estimated_cost:.6f} estimated cost")
     
+    def track_bullet_cache(self, hits, near_hits, misses):
+        """Track how many of a review's bullets were served from the bullet cache"""
+        self._record("bullet_cache", hits=hits, near_hits=near_hits, misses=misses)
+        logger.info(f"Tracked bullet cache: {hits} hits, {near_hits} near hits, {misses} misses")
+
     def track_feedback_rating(self, rating):
         """Track user feedback rating (1-5)"""
         if rating < 1 or rating > 5:
             logger.warning(f"Invalid feedback rating: {rating}. Must be between 1-5.")
             return
         
-        # Update total and specific rating count
-        self.data["feedback_ratings"]["total"] += 1
-        self.data["feedback_ratings"]["ratings"][str(rating)] += 1
-        
-        # Update average rating
-        total_ratings = self.data["feedback_ratings"]["total"]
-        rating_sum = sum(int(r) * count for r, count in self.data["feedback_ratings"]["ratings"].items())
-        self.data["feedback_ratings"]["average"] = round(rating_sum / total_ratings, 2) if total_ratings > 0 else 0
-        
-        self._save_data()
+        self._record("rating", rating=rating)
         logger.info(f"Tracked feedback rating: {rating}/5")
     
-    def get_usage_report(self):
-        """Generate a usage report"""
-        return {
-            "total_reviews": self.data["resume_reviews"]["total"],
-            "average_scores": self.data["resume_reviews"]["average_scores"],
-            "api_usage": {
-                "total_tokens": self.data["api_usage"]["total_tokens"],
-                "total_requests": self.data["api_usage"]["total_requests"],
-                "estimated_cost": round(self.data["api_usage"]["estimated_cost"], 2)
-            },
-            "feedback": {
-                "total_ratings": self.data["feedback_ratings"]["total"],
-                "average_rating": self.data["feedback_ratings"]["average"]
-            }
-        }
+    async def get_usage_report(self):
+        """Generate a usage report, including events still waiting in the buffer"""
+        await self.flush()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, lambda: self.store.report())
 
 # Create a singleton instance
-analytics = Analytics() 
\ No newline at end of file
+analytics = Analytics()
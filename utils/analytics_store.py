@@ -0,0 +1,337 @@
+import json
+from abc import ABC, abstractmethod
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCORE_TYPES = ["overall", "experiences", "projects", "formatting"]
+RATINGS = ["1", "2", "3", "4", "5"]
+
+def _bullet_cache_report(hits, near_hits, misses):
+    lookups = hits + near_hits + misses
+    return {
+        "hits": hits,
+        "near_hits": near_hits,
+        "misses": misses,
+        "hit_rate": round((hits + near_hits) / lookups, 3) if lookups else 0
+    }
+
+class AnalyticsStore(ABC):
+    """Where analytics events are kept. Events are dicts with a "type" ("review", "api_usage",
+    "bullet_cache" or "rating"), a "ts" timestamp and the fields of the tracking call."""
+    @abstractmethod
+    def append(self, events, batch_id=None):
+        """Store a batch of events, remembering batch_id as the last batch stored"""
+
+    @abstractmethod
+    def last_batch(self):
+        """Id of the last batch stored, so journaled batches aren't stored twice"""
+
+    @abstractmethod
+    def report(self):
+        """Totals in the format of Analytics.get_usage_report"""
+
+    def close(self):
+        pass
+
+class JSONAnalyticsStore(AnalyticsStore):
+    """Keeps running totals in a single JSON file, rewritten after every batch"""
+    def __init__(self, storage_file="analytics_data.json"):
+        self.storage_file = storage_file
+        self.data = self._load_data()
+
+    def _load_data(self):
+        """Load analytics data from file or create default structure if file doesn't exist"""
+        if os.path.exists(self.storage_file):
+            try:
+                with open(self.storage_file, 'r') as f:
+                    return json.load(f)
+            except json.JSONDecodeError:
+                logger.error(f"Error decoding analytics file {self.storage_file}. Creating new data structure.")
+        return self._create_default_data()
+
+    @staticmethod
+    def _create_default_data():
+        """Create default data structure for analytics"""
+        return {
+            "resume_reviews": {
+                "total": 0,
+                "by_server": {},
+                "by_user": {},
+                "by_date": {},
+                "average_scores": {score_type: 0 for score_type in SCORE_TYPES}
+            },
+            "api_usage": {
+                "total_tokens": 0,
+                "total_requests": 0,
+                "estimated_cost": 0,
+                "cache_creation_tokens": 0,
+                "cache_read_tokens": 0,
+                "by_model": {}
+            },
+            "bullet_cache": {"hits": 0, "near_hits": 0, "misses": 0},
+            "feedback_ratings": {
+                "total": 0,
+                "average": 0,
+                "ratings": {rating: 0 for rating in RATINGS}
+            },
+            "last_batch": 0
+        }
+
+    def _save_data(self):
+        """Save analytics data to file, replacing it in one step so a crash can't leave half a file"""
+        try:
+            tmp_file = self.storage_file + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(self.data, f, indent=2)
+            os.replace(tmp_file, self.storage_file)
+        except Exception as e:
+            logger.error(f"Error saving analytics data: {e}")
+
+    def _apply(self, event):
+        if event["type"] == "review":
+            reviews = self.data["resume_reviews"]
+            reviews["total"] += 1
+            for dimension, key in [("by_server", event["server_id"]), ("by_user", event["user_id"]), ("by_date", event["date"])]:
+                reviews[dimension][key] = reviews[dimension].get(key, 0) + 1
+            # Calculate new averages using weighted average formula
+            total = reviews["total"]
+            for score_type, score in event["scores"].items():
+                if score_type in reviews["average_scores"]:
+                    prev_avg = reviews["average_scores"][score_type]
+                    reviews["average_scores"][score_type] = round((prev_avg * (total - 1) + score) / total, 2)
+        elif event["type"] == "api_usage":
+            usage = self.data["api_usage"]
+            usage["total_tokens"] += event["tokens"]
+            usage["total_requests"] += 1
+            usage["estimated_cost"] += event["estimated_cost"]
+            # Older analytics files predate prompt caching
+            usage["cache_creation_tokens"] = usage.get("cache_creation_tokens", 0) + event["cache_creation_tokens"]
+            usage["cache_read_tokens"] = usage.get("cache_read_tokens", 0) + event["cache_read_tokens"]
+            if event.get("model"):
+                model_usage = usage.setdefault("by_model", {}).setdefault(event["model"], {"requests": 0, "tokens": 0, "estimated_cost": 0})
+                model_usage["requests"] += 1
+                model_usage["tokens"] += event["tokens"]
+                model_usage["estimated_cost"] += event["estimated_cost"]
+        elif event["type"] == "bullet_cache":
+            # Older analytics files predate the bullet cache
+            bullet_cache = self.data.setdefault("bullet_cache", {"hits": 0, "near_hits": 0, "misses": 0})
+            for name in ["hits", "near_hits", "misses"]:
+                bullet_cache[name] += event[name]
+        elif event["type"] == "rating":
+            ratings = self.data["feedback_ratings"]
+            ratings["total"] += 1
+            ratings["ratings"][str(event["rating"])] += 1
+            rating_sum = sum(int(r) * count for r, count in ratings["ratings"].items())
+            ratings["average"] = round(rating_sum / ratings["total"], 2)
+
+    def append(self, events, batch_id=None):
+        for event in events:
+            self._apply(event)
+        if batch_id is not None:
+            self.data["last_batch"] = batch_id
+        self._save_data()
+
+    def last_batch(self):
+        return self.data.get("last_batch", 0)
+
+    def report(self):
+        bullet_cache = self.data.get("bullet_cache", {"hits": 0, "near_hits": 0, "misses": 0})
+        return {
+            "total_reviews": self.data["resume_reviews"]["total"],
+            "average_scores": self.data["resume_reviews"]["average_scores"],
+            "api_usage": {
+                "total_tokens": self.data["api_usage"]["total_tokens"],
+                "total_requests": self.data["api_usage"]["total_requests"],
+                "estimated_cost": round(self.data["api_usage"]["estimated_cost"], 2),
+                "cache_creation_tokens": self.data["api_usage"].get("cache_creation_tokens", 0),
+                "cache_read_tokens": self.data["api_usage"].get("cache_read_tokens", 0),
+                "by_model": {
+                    model: {**usage, "estimated_cost": round(usage["estimated_cost"], 2)}
+                    for model, usage in self.data["api_usage"].get("by_model", {}).items()
+                }
+            },
+            "bullet_cache": _bullet_cache_report(bullet_cache["hits"], bullet_cache["near_hits"], bullet_cache["misses"]),
+            "feedback": {
+                "total_ratings": self.data["feedback_ratings"]["total"],
+                "average_rating": self.data["feedback_ratings"]["average"]
+            }
+        }
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY, ts REAL NOT NULL, type TEXT NOT NULL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS events_type_ts ON events (type, ts);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS review_counts (dimension TEXT NOT NULL, key TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (dimension, key));
+CREATE TABLE IF NOT EXISTS model_usage (model TEXT PRIMARY KEY, requests INTEGER NOT NULL, tokens INTEGER NOT NULL, estimated_cost REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+class SQLiteAnalyticsStore(AnalyticsStore):
+    """Appends every event to an SQLite database in write-ahead logging mode.
+
+    The aggregates the usage report needs are kept in small indexed tables that are updated in
+    the same transaction as the events, so reporting doesn't depend on how many events, users
+    or days have accumulated. An existing JSON analytics file is imported on first start.
+    """
+    def __init__(self, db_file="analytics.db", legacy_json_file="analytics_data.json"):
+        self.db_file = db_file
+        # Writes happen off the event loop, so the connection is shared between threads
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only risks the last transactions on power loss, never corruption
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        if legacy_json_file:
+            self._migrate_json(legacy_json_file)
+
+    def _add_counters(self, counters):
+        self._conn.executemany(
+            "INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            list(counters.items())
+        )
+
+    def _add_review_counts(self, rows):
+        self._conn.executemany(
+            "INSERT INTO review_counts (dimension, key, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(dimension, key) DO UPDATE SET count = count + excluded.count",
+            rows
+        )
+
+    def _add_model_usage(self, model, requests, tokens, estimated_cost):
+        self._conn.execute(
+            "INSERT INTO model_usage (model, requests, tokens, estimated_cost) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(model) DO UPDATE SET requests = requests + excluded.requests, "
+            "tokens = tokens + excluded.tokens, estimated_cost = estimated_cost + excluded.estimated_cost",
+            (model, requests, tokens, estimated_cost)
+        )
+
+    def _migrate_json(self, json_file):
+        """Import the totals of a JSON analytics file once, the first time the database is opened"""
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                return
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (json_file,))
+            if not os.path.exists(json_file):
+                return
+            data = JSONAnalyticsStore(json_file).data
+            reviews = data["resume_reviews"]
+            usage = data["api_usage"]
+            bullet_cache = data.get("bullet_cache", {})
+            ratings = data["feedback_ratings"]
+            counters = {
+                "reviews": reviews["total"],
+                "tokens": usage["total_tokens"],
+                "requests": usage["total_requests"],
+                "estimated_cost": usage["estimated_cost"],
+                "cache_creation_tokens": usage.get("cache_creation_tokens", 0),
+                "cache_read_tokens": usage.get("cache_read_tokens", 0),
+                "ratings": ratings["total"],
+                **{f"score_sum:{score_type}": reviews["average_scores"].get(score_type, 0) * reviews["total"] for score_type in SCORE_TYPES},
+                **{f"bullet_{name}": bullet_cache.get(name, 0) for name in ["hits", "near_hits", "misses"]},
+                **{f"rating:{rating}": ratings["ratings"].get(rating, 0) for rating in RATINGS}
+            }
+            self._add_counters(counters)
+            self._add_review_counts([
+                (dimension, key, count)
+                for dimension in ["by_server", "by_user", "by_date"]
+                for key, count in reviews[dimension].items()
+            ])
+            for model, model_usage in usage.get("by_model", {}).items():
+                self._add_model_usage(model, model_usage["requests"], model_usage["tokens"], model_usage["estimated_cost"])
+            self._conn.execute("INSERT INTO events (ts, type, data) VALUES (?, 'migration', ?)", (os.path.getmtime(json_file), json.dumps(data)))
+        logger.info(f"Imported analytics from {json_file} into {self.db_file}")
+
+    def append(self, events, batch_id=None):
+        # Totals are summed over the batch first so each aggregate row is written once per batch
+        counters = {}
+        review_counts = {}
+        model_usage = {}
+        for event in events:
+            if event["type"] == "review":
+                counters["reviews"] = counters.get("reviews", 0) + 1
+                for score_type, score in event["scores"].items():
+                    if score_type in SCORE_TYPES:
+                        counters[f"score_sum:{score_type}"] = counters.get(f"score_sum:{score_type}", 0) + score
+                for dimension, key in [("by_server", event["server_id"]), ("by_user", event["user_id"]), ("by_date", event["date"])]:
+                    review_counts[(dimension, key)] = review_counts.get((dimension, key), 0) + 1
+            elif event["type"] == "api_usage":
+                for name, value in [("tokens", event["tokens"]), ("requests", 1), ("estimated_cost", event["estimated_cost"]),
+                                    ("cache_creation_tokens", event["cache_creation_tokens"]), ("cache_read_tokens", event["cache_read_tokens"])]:
+                    counters[name] = counters.get(name, 0) + value
+                if event.get("model"):
+                    requests, tokens, cost = model_usage.get(event["model"], (0, 0, 0))
+                    model_usage[event["model"]] = (requests + 1, tokens + event["tokens"], cost + event["estimated_cost"])
+            elif event["type"] == "bullet_cache":
+                for name in ["hits", "near_hits", "misses"]:
+                    counters[f"bullet_{name}"] = counters.get(f"bullet_{name}", 0) + event[name]
+            elif event["type"] == "rating":
+                counters["ratings"] = counters.get("ratings", 0) + 1
+                counters[f"rating:{event['rating']}"] = counters.get(f"rating:{event['rating']}", 0) + 1
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO events (ts, type, data) VALUES (?, ?, ?)",
+                [(event["ts"], event["type"], json.dumps(event)) for event in events]
+            )
+            self._add_counters(counters)
+            self._add_review_counts([(dimension, key, count) for (dimension, key), count in review_counts.items()])
+            for model, usage in model_usage.items():
+                self._add_model_usage(model, *usage)
+            if batch_id is not None:
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('last_batch', ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    (str(batch_id),)
+                )
+
+    def last_batch(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'last_batch'").fetchone()
+        return int(row[0]) if row else 0
+
+    def report(self):
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            models = self._conn.execute("SELECT model, requests, tokens, estimated_cost FROM model_usage ORDER BY model").fetchall()
+
+        def counter(name):
+            return int(counters.get(name, 0))
+
+        reviews = counter("reviews")
+        ratings = counter("ratings")
+        rating_sum = sum(int(rating) * counter(f"rating:{rating}") for rating in RATINGS)
+        return {
+            "total_reviews": reviews,
+            "average_scores": {
+                score_type: round(counters.get(f"score_sum:{score_type}", 0) / reviews, 2) if reviews else 0
+                for score_type in SCORE_TYPES
+            },
+            "api_usage": {
+                "total_tokens": counter("tokens"),
+                "total_requests": counter("requests"),
+                "estimated_cost": round(counters.get("estimated_cost", 0), 2),
+                "cache_creation_tokens": counter("cache_creation_tokens"),
+                "cache_read_tokens": counter("cache_read_tokens"),
+                "by_model": {
+                    model: {"requests": requests, "tokens": tokens, "estimated_cost": round(estimated_cost, 2)}
+                    for model, requests, tokens, estimated_cost in models
+                }
+            },
+            "bullet_cache": _bullet_cache_report(counter("bullet_hits"), counter("bullet_near_hits"), counter("bullet_misses")),
+            "feedback": {"total_ratings": ratings, "average_rating": round(rating_sum / ratings, 2) if ratings else 0}
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_store(backend, storage_file):
+    """The analytics store for a backend name: "sqlite" (default) or "json" """
+    if backend == "json":
+        return JSONAnalyticsStore(storage_file)
+    db_file = os.path.splitext(storage_file)[0] + ".db"
+    return SQLiteAnalyticsStore(db_file, legacy_json_file=storage_file)
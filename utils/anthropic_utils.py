@@ -1,61 +1,219 @@
 import json
-import time
-from config import ANTHROPIC_API_KEY
-import requests
+from config import ANTHROPIC_API_KEY, ANTHROPIC_MAX_CONNECTIONS, ANTHROPIC_MAX_ATTEMPTS, ANTHROPIC_BREAKER_THRESHOLD, ANTHROPIC_BREAKER_RESET_SECONDS
+from config import MODELS
+import aiohttp
 import logging
 import asyncio
+import time
 from utils.analytics import analytics  # Import the analytics module
+from utils.latency import stage_metrics
+from utils.retry import CircuitBreaker, RetryPolicy, parse_retry_after
 
-# Function to Get Chat Completion from Anthropic
-def get_chat_completion(max_tokens: int, messages: list, system: str = None, temperature: float = 0.5) -> str:
-    url = "https://api.anthropic.com/v1/messages"
-    headers = {
-        'Content-Type': 'application/json',
-        'anthropic-version': '2023-06-01',
-        'x-api-key': ANTHROPIC_API_KEY,
-    }
+ANTHROPIC_API_URL = "https://api.anthropic.com/v1/messages"
+
+retry_policy = RetryPolicy(max_attempts=ANTHROPIC_MAX_ATTEMPTS)
+# Shared by every review so an outage is detected once instead of per request
+anthropic_breaker = CircuitBreaker("Anthropic API", failure_threshold=ANTHROPIC_BREAKER_THRESHOLD, reset_timeout=ANTHROPIC_BREAKER_RESET_SECONDS)
+
+class AnthropicAPIError(Exception):
+    """An error response from the Anthropic API"""
+    def __init__(self, status, body, retry_after=None):
+        super().__init__(f"Anthropic API returned {status}: {body}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+        self.retryable = retry_policy.is_retryable_status(status)
+
+# Shared HTTP session so every review reuses pooled keep-alive connections
+# instead of paying a new TCP + TLS handshake per request
+_session = None
+
+async def open_http_session() -> aiohttp.ClientSession:
+    """Create the shared Anthropic HTTP session. Called from ResumeBot.setup_hook."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=ANTHROPIC_MAX_CONNECTIONS,
+            keepalive_timeout=60,
+            ttl_dns_cache=300,
+            enable_cleanup_closed=True
+        )
+        # Reviews can generate for minutes, but connecting or a stalled read should fail fast
+        timeout = aiohttp.ClientTimeout(total=300, connect=10, sock_connect=10, sock_read=90)
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={
+                'Content-Type': 'application/json',
+                'anthropic-version': '2023-06-01',
+                'x-api-key': ANTHROPIC_API_KEY,
+            }
+        )
+        logging.info("Opened Anthropic HTTP session")
+    return _session
+
+async def close_http_session():
+    """Close the shared Anthropic HTTP session on shutdown"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logging.info("Closed Anthropic HTTP session")
+    _session = None
+
+# Mark a content block as a prompt cache breakpoint. Everything up to and including
+# the block is cached by Anthropic and billed at the cache read rate on later requests.
+def cache_breakpoint(block: dict) -> dict:
+    return {**block, 'cache_control': {'type': 'ephemeral'}}
+
+# Serialize the request body once; it is reused for every retry and the debug log
+def _build_request(max_tokens: int, messages: list, system: str | list = None, temperature: float = 0.5, stream: bool = False, model: str = "detailed", tool: dict = None) -> bytes:
     data = {
         'messages': messages,
-        'model': 'claude-3-5-sonnet-20240620',
-        'max_tokens': max_tokens,
+        'model': MODELS[model]["name"],
+        'max_tokens': min(max_tokens, MODELS[model]["max_output_tokens"]),
         'temperature': temperature,
     }
+    if tool:
+        # Forcing the tool call makes the model answer with JSON matching the tool's input schema
+        data['tools'] = [tool]
+        data['tool_choice'] = {'type': 'tool', 'name': tool['name']}
     if system:
         data['system'] = system
+    if stream:
+        data['stream'] = True
+    body = json.dumps(data).encode('utf-8')
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Sending to Anthropic: %s", body[:1000].decode('utf-8', 'replace'))  # Only show first 1000 chars
+    return body
+
+def _track_usage(usage: dict, model: str = "detailed", duration: float = None):
+    input_tokens = usage.get('input_tokens', 0) or 0
+    output_tokens = usage.get('output_tokens', 0) or 0
+    cache_creation_tokens = usage.get('cache_creation_input_tokens', 0) or 0
+    cache_read_tokens = usage.get('cache_read_input_tokens', 0) or 0
+    total_tokens = input_tokens + cache_creation_tokens + cache_read_tokens + output_tokens
+
+    # Prices in the model table are per 1M tokens
+    prices = MODELS[model]
+    estimated_cost = (input_tokens * prices["input_price"] + output_tokens * prices["output_price"]
+        + cache_creation_tokens * prices["cache_write_price"] + cache_read_tokens * prices["cache_read_price"]) / 1000000
+
+    if duration:
+        stage_metrics.record("anthropic_request", duration)
+        if output_tokens:
+            stage_metrics.record("tokens_per_second", output_tokens / duration)
+
+    # Track the usage
+    analytics.track_api_usage(total_tokens, estimated_cost, cache_creation_tokens=cache_creation_tokens, cache_read_tokens=cache_read_tokens, model=prices["name"])
+
+async def _raise_for_status(response):
+    if not response.ok:
+        error_body = await response.text()
+        logging.error(f"Anthropic request failed. Status: {response.status}, Response: {error_body}")
+        raise AnthropicAPIError(response.status, error_body, parse_retry_after(response.headers.get('retry-after')))
+
+async def _retry_after_failure(err, attempt: int, can_retry: bool = True) -> bool:
+    """Record a failed attempt with the circuit breaker, then wait and return True if
+    the request should be tried again"""
+    retryable = not isinstance(err, AnthropicAPIError) or err.retryable
+    stage_metrics.count("anthropic_errors")
+    if retryable:
+        anthropic_breaker.record_failure()
+    else:
+        # The API answered, the request itself was bad and will never succeed
+        anthropic_breaker.record_success()
+    logging.error("Error during API request attempt %d: %s", attempt + 1, err)
+
+    if not retryable or not can_retry or attempt >= retry_policy.max_attempts - 1 or anthropic_breaker.is_degraded:
+        logging.error("Giving up after %d attempts", attempt + 1)
+        return False
+    delay = retry_policy.delay(attempt, getattr(err, 'retry_after', None))
+    logging.info(f"Retrying in {delay:.1f}s...")
+    await asyncio.sleep(delay)
+    return True
+
+# Function to Get Chat Completion from Anthropic. With a tool, the model is made to call it
+# and the JSON input of the call is returned instead of text.
+async def get_chat_completion(max_tokens: int, messages: list, system: str | list = None, temperature: float = 0.5, model: str = "detailed", tool: dict = None) -> str:
+    body = _build_request(max_tokens, messages, system, temperature, model=model, tool=tool)
+    session = await open_http_session()
 
-    retries = 3
-    for attempt in range(retries):
+    for attempt in range(retry_policy.max_attempts):
+        anthropic_breaker.check()
+        started_at = time.perf_counter()
         try:
-            response = requests.post(url, headers=headers, data=json.dumps(data))
-            logging.debug("Sending to Anthropic: %s", json.dumps(data)[:1000])  # Only show first 1000 chars
-            response.raise_for_status()
-            
-            # Parse the response
-            json_response = response.json()
-            
+            async with session.post(ANTHROPIC_API_URL, data=body) as response:
+                await _raise_for_status(response)
+
+                # Parse the response
+                json_response = await response.json()
+            anthropic_breaker.record_success()
+
             # Track API usage
-            input_tokens = json_response.get('usage', {}).get('input_tokens', 0)
-            output_tokens = json_response.get('usage', {}).get('output_tokens', 0)
-            total_tokens = input_tokens + output_tokens
-            
-            # Calculate estimated cost based on Claude 3.5 Sonnet pricing
-            # $3 per 1M input tokens, $15 per 1M output tokens
-            estimated_cost = (input_tokens * 3 / 1000000) + (output_tokens * 15 / 1000000)
-            
-            # Track the usage
-            analytics.track_api_usage(total_tokens, estimated_cost)
-            
-            logging.info("Received chat completion from Anthropic successfully")
+            _track_usage(json_response.get('usage', {}), model, time.perf_counter() - started_at)
+
+            logging.info(f"Received chat completion from {MODELS[model]['name']} successfully")
+            if json_response.get('stop_reason') == 'max_tokens':
+                logging.warning("Anthropic completion stopped at max_tokens")
+            if tool:
+                tool_use = next((block for block in json_response.get('content', []) if block.get('type') == 'tool_use'), None)
+                return json.dumps(tool_use['input']) if tool_use else ''
             return json_response.get('content', [{}])[0].get('text', '').strip()
-        except (requests.HTTPError, ConnectionError, requests.RequestException, ValueError) as err:
-            logging.error("Error during API request attempt %d: %s", attempt + 1, err)
-            if attempt < retries - 1:
-                logging.info("Retrying...")
-                time.sleep(2)
-            else:
-                logging.error("Failed after %d attempts", retries)
+        except (AnthropicAPIError, aiohttp.ClientError, asyncio.TimeoutError, ValueError) as err:
+            if not await _retry_after_failure(err, attempt):
+                raise
+
+# Stream a chat completion from Anthropic, yielding text as it is generated.
+# Requests are only retried if they fail before the first piece of text arrives,
+# since the caller may already have acted on the partial output. With a tool, the JSON
+# input of the forced tool call is streamed instead of text.
+async def stream_chat_completion(max_tokens: int, messages: list, system: str | list = None, temperature: float = 0.5, model: str = "detailed", tool: dict = None):
+    body = _build_request(max_tokens, messages, system, temperature, stream=True, model=model, tool=tool)
+    session = await open_http_session()
+
+    for attempt in range(retry_policy.max_attempts):
+        anthropic_breaker.check()
+        started = False
+        started_at = time.perf_counter()
+        try:
+            async with session.post(ANTHROPIC_API_URL, data=body) as response:
+                await _raise_for_status(response)
+
+                usage = {}
+                async for raw_line in response.content:
+                    line = raw_line.decode('utf-8').strip()
+                    # Server-sent events: only the data lines carry the payload
+                    if not line.startswith('data:'):
+                        continue
+                    event = json.loads(line[len('data:'):].strip())
+                    event_type = event.get('type')
+
+                    if event_type == 'message_start':
+                        usage.update(event.get('message', {}).get('usage', {}))
+                    elif event_type == 'content_block_delta':
+                        delta = event.get('delta', {})
+                        if delta.get('type') == 'text_delta':
+                            started = True
+                            yield delta.get('text', '')
+                        elif delta.get('type') == 'input_json_delta':
+                            started = True
+                            yield delta.get('partial_json', '')
+                    elif event_type == 'message_delta':
+                        usage.update(event.get('usage', {}))
+                        if event.get('delta', {}).get('stop_reason') == 'max_tokens':
+                            logging.warning("Anthropic stream stopped at max_tokens")
+                    elif event_type == 'error':
+                        # Errors after the stream has started (e.g. overloaded_error) arrive as events
+                        error = event.get('error', {})
+                        status = 529 if error.get('type') == 'overloaded_error' else 500
+                        raise AnthropicAPIError(status, error)
+                    elif event_type == 'message_stop':
+                        break
+
+            anthropic_breaker.record_success()
+            _track_usage(usage, model, time.perf_counter() - started_at)
+            logging.info("Streamed chat completion from Anthropic successfully")
+            return
+        except (AnthropicAPIError, aiohttp.ClientError, asyncio.TimeoutError, ValueError) as err:
+            if not await _retry_after_failure(err, attempt, can_retry=not started):
                 raise
-    
-    if not response.ok:
-        logging.error(f"Failed to fetch chat completion from Anthropic. Status: {response.status_code}, Response: {response.text}")
-        raise Exception(f"Failed to fetch chat completion from Anthropic. Status: {response.status_code}, Response: {response.text}")
\ No newline at end of file
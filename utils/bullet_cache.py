@@ -0,0 +1,158 @@
+import hashlib
+import re
+import time
+import numpy as np
+from utils.json_store import JSONFileStore
+
+# Signatures have NUM_PERM MinHash values, split into LSH_BANDS bands of equal width. With 8 bands
+# of 8 rows, bullets with a Jaccard similarity of about 0.77 or more are likely to share a band.
+NUM_PERM = 64
+LSH_BANDS = 8
+# Bullets are compared as sets of overlapping character shingles of this length
+SHINGLE_SIZE = 5
+# Near duplicates must have at least this estimated Jaccard similarity to reuse feedback
+SIMILARITY_THRESHOLD = 0.85
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Fixed seed so signatures stay comparable across restarts and with the saved cache
+_PERMUTATIONS = np.random.RandomState(1).randint(1, (1 << 61) - 1, size=(2, NUM_PERM), dtype=np.uint64)
+
+def normalize_bullet(text):
+    """Lowercase, drop punctuation and collapse whitespace so trivial edits don't miss the cache"""
+    return " ".join(re.sub(r"[^a-z0-9%$+#]+", " ", text.lower()).split())
+
+def minhash(text):
+    """MinHash signature of a normalized bullet's character shingles"""
+    padded = f" {text} "
+    shingles = {padded[i:i + SHINGLE_SIZE] for i in range(max(1, len(padded) - SHINGLE_SIZE + 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), "little") for shingle in shingles],
+        dtype=np.uint64
+    )
+    a, b = _PERMUTATIONS
+    # uint64 overflow is part of the hash, as in the usual universal hashing implementation
+    with np.errstate(over="ignore"):
+        permuted = ((np.outer(hashes, a) + b) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=0)
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.mean(np.asarray(first) == np.asarray(second)))
+
+class BulletCache:
+    """Persistent cache of feedback on single resume bullets.
+
+    Entries are keyed by a scope (what kind of text it is, the job title and the prompt
+    version) and the normalized bullet. Bullets that aren't cached exactly are matched to
+    near duplicates in the same scope with MinHash and locality sensitive hashing, among the
+    entries of the same owner only, since feedback on someone's bullet can name their employer,
+    tools or numbers. Entries
+    expire after ttl_seconds and the least recently used ones are evicted past max_entries.
+    """
+    def __init__(self, storage_file, max_entries=5000, ttl_seconds=30 * 24 * 3600, threshold=SIMILARITY_THRESHOLD, clock=time.time):
+        self.storage_file = storage_file
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.clock = clock
+        self._store = JSONFileStore(storage_file, name="bullet cache")
+        self._entries = self._store.load()
+        self._buckets = {}
+        for key, entry in self._entries.items():
+            self._index(key, entry)
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_scope(kind, job_title, prompt_version):
+        return f"{kind}:{normalize_bullet(job_title or '')}:{prompt_version}"
+
+    @staticmethod
+    def make_key(scope, text):
+        return hashlib.sha256(f"{scope}\n{normalize_bullet(text)}".encode('utf-8')).hexdigest()
+
+    async def save(self):
+        """Write the cache to disk without blocking the event loop"""
+        await self._store.save(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.near_hits + self.misses
+        return (self.hits + self.near_hits) / lookups if lookups else 0.0
+
+    def _band_keys(self, scope, signature):
+        rows = NUM_PERM // LSH_BANDS
+        return [f"{scope}:{band}:" + ",".join(map(str, signature[band * rows:(band + 1) * rows])) for band in range(LSH_BANDS)]
+
+    def _index(self, key, entry):
+        for band_key in self._band_keys(entry["scope"], entry["signature"]):
+            self._buckets.setdefault(band_key, set()).add(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for band_key in self._band_keys(entry["scope"], entry["signature"]):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and self.clock() - entry["created_at"] > self.ttl_seconds:
+            self._remove(key)
+            return None
+        return entry
+
+    def get(self, scope, text, near_duplicates=True, owner=None):
+        """Return (feedback, exact) for a bullet, or None if neither it nor a near duplicate of the
+        owner's is cached"""
+        key = self.make_key(scope, text)
+        entry = self._live_entry(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["feedback"], True
+        if not near_duplicates:
+            self.misses += 1
+            return None
+
+        signature = minhash(normalize_bullet(text))
+        best_key, best_similarity = None, self.threshold
+        candidates = set()
+        for band_key in self._band_keys(scope, signature.tolist()):
+            candidates |= self._buckets.get(band_key, set())
+        for candidate in candidates:
+            entry = self._live_entry(candidate)
+            if entry is None or entry.get("owner") != owner:
+                continue
+            candidate_similarity = similarity(signature, entry["signature"])
+            if candidate_similarity >= best_similarity:
+                best_key, best_similarity = candidate, candidate_similarity
+        if best_key is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(best_key)
+        self.near_hits += 1
+        return self._entries[best_key]["feedback"], False
+
+    def put(self, scope, text, feedback, owner=None):
+        key = self.make_key(scope, text)
+        if key in self._entries:
+            self._remove(key)
+        entry = {
+            "scope": scope,
+            "signature": minhash(normalize_bullet(text)).tolist(),
+            "created_at": self.clock(),
+            "owner": owner,
+            "feedback": feedback
+        }
+        self._entries[key] = entry
+        self._index(key, entry)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from utils.latency import stage_metrics
+
+logger = logging.getLogger(__name__)
+
+# Discord limits for a single message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARACTERS = 6000
+
+class TokenBucket:
+    """Allows `capacity` sends per `window_seconds`, refilling continuously"""
+    def __init__(self, capacity, window_seconds, clock=time.monotonic):
+        self.capacity = capacity
+        self.refill_rate = capacity / window_seconds
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated_at = clock()
+        self._lock = asyncio.Lock()  # FIFO, so sends leave in the order they were queued
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    @property
+    def idle(self):
+        self._refill()
+        return self.tokens >= self.capacity and not self._lock.locked()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.refill_rate)
+
+class OutboundScheduler:
+    """Paces outgoing messages per channel so a review never runs into Discord's
+    per-channel rate limit (5 messages per 5 seconds)"""
+    def __init__(self, messages_per_window=5, window_seconds=5.0, max_idle_buckets=500):
+        self.messages_per_window = messages_per_window
+        self.window_seconds = window_seconds
+        self.max_idle_buckets = max_idle_buckets
+        self._buckets = {}
+
+    def bucket(self, channel_id):
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_idle_buckets:
+                self._buckets = {key: b for key, b in self._buckets.items() if not b.idle}
+            bucket = TokenBucket(self.messages_per_window, self.window_seconds)
+            self._buckets[channel_id] = bucket
+        return bucket
+
+    async def send(self, channel, **kwargs):
+        await self.bucket(channel.id).acquire()
+        with stage_metrics.timed("discord_send"):
+            return await channel.send(**kwargs)
+
+class EmbedBatcher:
+    """Packs embeds into as few messages as possible.
+
+    Embeds are held until a message is full (10 embeds or 6000 characters), `linger`
+    seconds pass, or flush() is called, so streamed feedback still shows up quickly.
+    """
+    def __init__(self, channel, scheduler, linger=1.5):
+        self.channel = channel
+        self.scheduler = scheduler
+        self.linger = linger
+        self._pending = []
+        self._pending_chars = 0
+        self._timer = None
+        self._lock = asyncio.Lock()
+
+    async def add(self, embed):
+        async with self._lock:
+            size = len(embed)
+            if self._pending and (len(self._pending) >= MAX_EMBEDS_PER_MESSAGE or self._pending_chars + size > MAX_EMBED_CHARACTERS):
+                await self._flush_locked()
+            self._pending.append(embed)
+            self._pending_chars += size
+            if len(self._pending) >= MAX_EMBEDS_PER_MESSAGE:
+                await self._flush_locked()
+            elif self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        """Send everything that is still pending"""
+        async with self._lock:
+            await self._flush_locked()
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.linger)
+        async with self._lock:
+            self._timer = None
+            try:
+                await self._flush_locked()
+            except Exception as e:
+                logger.error(f"Failed to send batched embeds: {e}")
+
+    async def _flush_locked(self):
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        embeds = self._pending
+        self._pending = []
+        self._pending_chars = 0
+        await self.scheduler.send(self.channel, embeds=embeds)
+
+# Create a singleton instance
+outbound_scheduler = OutboundScheduler()
@@ -0,0 +1,193 @@
+import logging
+import discord
+from utils.score_color import get_score_color
+from utils.embed_dispatcher import EmbedBatcher, outbound_scheduler
+
+# Sections are rendered in this order, each followed by its section score
+SECTION_ORDER = ["experiences", "projects", "formatting"]
+SECTION_SCORE_TITLES = {
+    "experiences": "Experience Section Score",
+    "projects": "Projects Section Score",
+}
+EVENT_SECTIONS = {
+    "experience": "experiences",
+    "project": "projects",
+    "formatting_aspect": "formatting",
+}
+
+def build_bullet_embed(bullet):
+    rewrites = "\n\n> ".join(bullet.get('rewrites', [])) if bullet.get('rewrites') else None
+    bullet_embed = discord.Embed(title=f"{bullet.get('score', 0)}/10.0", color=get_score_color(bullet.get('score', 0)))
+    bullet_embed.add_field(name="", value=f"> *{bullet.get('content', 'No content')}*\n", inline=False)
+    bullet_embed.add_field(name="Feedback", value=f"> {bullet.get('feedback', 'No feedback')}\n", inline=False)
+    if rewrites:
+        bullet_embed.add_field(name="Suggestions ", value=f"> {rewrites}", inline=False)
+    return bullet_embed
+
+def build_formatting_aspect_embed(name, aspect):
+    aspect_embed = discord.Embed(title=f"{aspect.get('score', 0)}/10.0", color=get_score_color(aspect.get('score', 0)))
+    aspect_embed.add_field(name=name.replace('_', ' ').title(), value=f"> {aspect.get('feedback', 'No feedback')}\n", inline=False)
+    if aspect.get('suggestions'):
+        suggestions = "\n\n> ".join(aspect['suggestions'])
+        aspect_embed.add_field(name="Suggestions", value=f"> {suggestions}", inline=False)
+    return aspect_embed
+
+def build_triage_embed(triage):
+    triage_embed = discord.Embed(title=f"Quick Score: {round(triage.get('overall_score', 0), 1)}/10.0", color=get_score_color(triage.get('overall_score', 0)))
+    triage_embed.add_field(name="First Impression", value=f"> {triage.get('summary', 'No summary')}\n", inline=False)
+    triage_embed.set_footer(text="Detailed feedback on each section follows.")
+    return triage_embed
+
+def build_score_embed(title, score):
+    score_embed = discord.Embed(title=title, color=get_score_color(score))
+    score_embed.add_field(name=f"{round(score, 1)}/10.0", value="", inline=False)
+    return score_embed
+
+def feedback_scores(feedback):
+    """Section and overall scores of a complete review, computed the same way as while rendering it"""
+    def average(scores):
+        return sum(scores) / len(scores) if scores else 0
+
+    experiences_score = average([bullet.get('score', 0) for entry in feedback.get("experiences", []) for bullet in entry.get('bullets', [])])
+    projects_score = average([bullet.get('score', 0) for entry in feedback.get("projects", []) for bullet in entry.get('bullets', [])])
+    formatting_score = average([aspect.get('score', 0) for aspect in feedback.get("formatting", {}).values() if isinstance(aspect, dict)])
+    return {
+        "overall": (projects_score + experiences_score + formatting_score) / 3.0,
+        "experiences": experiences_score,
+        "projects": projects_score,
+        "formatting": formatting_score
+    }
+
+def _score_change(before, after):
+    if before is None:
+        return f"{round(after, 1)}/10.0"
+    return f"{round(before, 1)} → {round(after, 1)}/10.0 ({after - before:+.1f})"
+
+def build_changes_summary_embed(changes, previous_scores, scores):
+    summary_embed = discord.Embed(
+        title="**What changed since your last review**",
+        description=f"{len(changes['bullets'])} new or rewritten bullets, {len(changes['removed'])} removed, "
+                    f"{len(changes['formatting'])} formatting changes. Everything else kept its earlier feedback.",
+        color=get_score_color(scores["overall"])
+    )
+    for section in ["overall", "experiences", "projects", "formatting"]:
+        summary_embed.add_field(name=section.title(), value=_score_change(previous_scores[section], scores[section]), inline=True)
+    return summary_embed
+
+class FeedbackRenderer:
+    """Posts review feedback to a channel piece by piece as it arrives, packing the
+    embeds into as few messages as possible"""
+    def __init__(self, channel, scheduler=outbound_scheduler):
+        self.channel = channel
+        self.batcher = EmbedBatcher(channel, scheduler)
+        self.section_index = -1
+        self.totals = {section: 0 for section in SECTION_ORDER}
+        self.counts = {section: 0 for section in SECTION_ORDER}
+        # Set once a "what changed" review has been posted instead of the full feedback
+        self.change_scores = None
+
+    def average(self, section):
+        return 0 if self.counts[section] == 0 else self.totals[section] / self.counts[section]
+
+    async def handle(self, kind, payload):
+        """Render a single ("triage" | "experience" | "project" | "formatting_aspect", payload) review event"""
+        if kind == "triage":
+            # Post the quick score straight away, the detailed feedback takes a while longer
+            await self.batcher.add(build_triage_embed(payload))
+            await self.batcher.flush()
+            return
+        section = EVENT_SECTIONS.get(kind)
+        if section is None:
+            logging.error(f"Unknown review event: {kind}")
+            return
+        await self._advance_to(SECTION_ORDER.index(section))
+
+        if kind == "experience":
+            await self.batcher.add(discord.Embed(title=f"**Experience at {payload.get('company', 'Unknown')} - {payload.get('role', 'Unknown')}**\n", color=0xe5e7eb))
+            await self._send_bullets(section, payload.get('bullets', []))
+        elif kind == "project":
+            # Check if the project has a 'title' field, otherwise try 'name'
+            project_title = payload.get('title', payload.get('name', 'Unknown'))
+            await self.batcher.add(discord.Embed(title=f"**Project: {project_title}**\n", color=0xe5e7eb))
+            await self._send_bullets(section, payload.get('bullets', []))
+        else:
+            name, aspect = payload
+            self.totals[section] += aspect.get('score', 0)
+            self.counts[section] += 1
+            await self.batcher.add(build_formatting_aspect_embed(name, aspect))
+
+    async def render(self, feedback):
+        """Render a complete review at once, e.g. one served from the review cache"""
+        if feedback.get("triage"):
+            await self.handle("triage", feedback["triage"])
+        for experience in feedback.get("experiences", []):
+            await self.handle("experience", experience)
+        for project in feedback.get("projects", []):
+            await self.handle("project", project)
+        for name, aspect in feedback.get("formatting", {}).items():
+            if isinstance(aspect, dict):
+                await self.handle("formatting_aspect", (name, aspect))
+
+    async def render_changes(self, changes, previous_feedback, feedback):
+        """Post only what changed since an earlier review of the same resume"""
+        self.change_scores = feedback_scores(feedback)
+        await self.batcher.add(build_changes_summary_embed(changes, feedback_scores(previous_feedback), self.change_scores))
+        for change in changes["bullets"]:
+            bullet_embed = build_bullet_embed(change["bullet"])
+            bullet_embed.title = _score_change(change["before_score"], change["bullet"].get('score', 0))
+            bullet_embed.set_author(name=f"{change['kind'].title()}: {change['entry']}" + ("" if change["before"] else " (new bullet)"))
+            if change["before"]:
+                bullet_embed.insert_field_at(0, name="Before", value=f"> ~~{change['before']}~~", inline=False)
+            await self.batcher.add(bullet_embed)
+        if changes["removed"]:
+            removed = "\n".join(f"> ~~{bullet['content']}~~" for bullet in changes["removed"])
+            await self.batcher.add(discord.Embed(title="Removed bullets", description=removed[:4000], color=0xe5e7eb))
+        for change in changes["formatting"]:
+            aspect_embed = build_formatting_aspect_embed(change["name"], change["aspect"])
+            aspect_embed.title = _score_change(change["before_score"], change["aspect"].get('score', 0))
+            await self.batcher.add(aspect_embed)
+
+    async def finish(self, feedback):
+        """Close out every section and return the section and overall scores"""
+        if self.change_scores is not None:
+            await self.batcher.flush()
+            return self.change_scores
+        await self._advance_to(len(SECTION_ORDER))
+
+        formatting_score = self.average("formatting")
+        if self.counts["formatting"] > 0:
+            overall_score = feedback.get("formatting", {}).get("overall_score", formatting_score)
+            await self.batcher.add(build_score_embed("Formatting Score", overall_score))
+        await self.batcher.flush()
+
+        experiences_score = self.average("experiences")
+        projects_score = self.average("projects")
+        return {
+            "overall": (projects_score + experiences_score + formatting_score) / 3.0,
+            "experiences": experiences_score,
+            "projects": projects_score,
+            "formatting": formatting_score
+        }
+
+    async def _send_bullets(self, section, bullets):
+        if not isinstance(bullets, list):
+            logging.error("Expected 'bullets' to be a list.")
+            return
+        for bullet in bullets:
+            if not isinstance(bullet, dict):
+                logging.error("Bullet item is not a dictionary.")
+                continue
+            self.totals[section] += bullet.get('score', 0)
+            self.counts[section] += 1
+            await self.batcher.add(build_bullet_embed(bullet))
+
+    async def _advance_to(self, index):
+        # Close every section before the target one so scores always appear in order
+        while self.section_index < index:
+            if self.section_index >= 0:
+                section = SECTION_ORDER[self.section_index]
+                if section in SECTION_SCORE_TITLES:
+                    await self.batcher.add(build_score_embed(SECTION_SCORE_TITLES[section], self.average(section)))
+            self.section_index += 1
+            if self.section_index < len(SECTION_ORDER) and SECTION_ORDER[self.section_index] == "formatting":
+                await self.batcher.add(discord.Embed(title="**Formatting Feedback**\n", color=0xe5e7eb))
@@ -0,0 +1,134 @@
+import base64
+import io
+import math
+import fitz
+from PIL import Image, ImageOps
+
+# Anthropic scales images down past these limits anyway, so larger renders only cost upload time
+MAX_LONG_EDGE = 1568
+MAX_PIXELS = 1_150_000
+PIXELS_PER_TOKEN = 750
+
+MEDIA_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+# Pixels darker than this count as content when trimming margins
+CONTENT_THRESHOLD = 245
+# Whitespace kept around the content when trimming, in points
+TRIM_PADDING = 6
+
+class ImageSettings:
+    """How resume pages are rendered and encoded for the vision model"""
+    def __init__(self, image_format="webp", quality=100, grayscale=True, trim_margins=True, max_long_edge=MAX_LONG_EDGE, max_pixels=MAX_PIXELS):
+        if image_format not in MEDIA_TYPES:
+            raise ValueError(f"Unsupported image format {image_format!r}, expected one of {', '.join(MEDIA_TYPES)}")
+        self.image_format = image_format
+        self.quality = quality
+        self.grayscale = grayscale
+        self.trim_margins = trim_margins
+        self.max_long_edge = max_long_edge
+        self.max_pixels = max_pixels
+
+    def to_dict(self):
+        return dict(vars(self))
+
+class PageImage:
+    """An encoded page render and what it costs to send"""
+    def __init__(self, data, media_type, width, height, margins=None):
+        self.data = data
+        self.media_type = media_type
+        self.width = width
+        self.height = height
+        # Page margins in inches that were trimmed off the render, if any
+        self.margins = margins
+
+    @property
+    def base64(self):
+        return base64.b64encode(self.data).decode('utf-8')
+
+    @property
+    def size_bytes(self):
+        return len(self.data)
+
+    @property
+    def estimated_tokens(self):
+        return math.ceil(self.width * self.height / PIXELS_PER_TOKEN)
+
+    def describe_margins(self):
+        if not self.margins:
+            return None
+        return ", ".join(f"{side} {inches:.2f}in" for side, inches in self.margins.items())
+
+    def to_dict(self):
+        return {
+            "data": self.base64,
+            "media_type": self.media_type,
+            "width": self.width,
+            "height": self.height,
+            "margins": self.margins
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(base64.b64decode(data["data"]), data["media_type"], data["width"], data["height"], data.get("margins"))
+
+    def __repr__(self):
+        return f"<PageImage {self.width}x{self.height} {self.media_type} {self.size_bytes} bytes ~{self.estimated_tokens} tokens>"
+
+def _fit_scale(width, height, settings):
+    # Largest scale that stays within both the long edge and the pixel budget
+    return min(settings.max_long_edge / max(width, height), math.sqrt(settings.max_pixels / (width * height)))
+
+def _content_rect(page):
+    """Bounding box of everything drawn on the page in page coordinates, or None if it's blank"""
+    probe = page.get_pixmap(colorspace=fitz.csGRAY, alpha=False)
+    image = Image.frombytes("L", (probe.width, probe.height), probe.samples)
+    bbox = ImageOps.invert(image).point(lambda v: 255 if v > 255 - CONTENT_THRESHOLD else 0).getbbox()
+    if bbox is None:
+        return None
+    # The probe is rendered at 72 DPI, so one pixel is one point
+    page_rect = page.rect
+    return fitz.Rect(page_rect.x0 + bbox[0], page_rect.y0 + bbox[1], page_rect.x0 + bbox[2], page_rect.y0 + bbox[3])
+
+def _encode(image, settings):
+    buffered = io.BytesIO()
+    if settings.image_format == "png":
+        image.save(buffered, format="PNG", optimize=True)
+    elif settings.image_format == "jpeg":
+        image.save(buffered, format="JPEG", quality=settings.quality, optimize=True)
+    else:
+        image.save(buffered, format="WEBP", quality=settings.quality, lossless=settings.quality >= 100)
+    return buffered.getvalue()
+
+def render_page(page, settings):
+    """Render a PDF page within the model's pixel budget, optionally trimmed and in grayscale"""
+    clip = page.rect
+    margins = None
+    if settings.trim_margins:
+        content = _content_rect(page)
+        if content is not None and not content.is_empty:
+            # Margins are measured to the content itself, the padding only keeps the render from touching it
+            clip = fitz.Rect(content.x0 - TRIM_PADDING, content.y0 - TRIM_PADDING, content.x1 + TRIM_PADDING, content.y1 + TRIM_PADDING) & page.rect
+            margins = {
+                "left": (content.x0 - page.rect.x0) / 72,
+                "right": (page.rect.x1 - content.x1) / 72,
+                "top": (content.y0 - page.rect.y0) / 72,
+                "bottom": (page.rect.y1 - content.y1) / 72,
+            }
+
+    # Spend the whole pixel budget on the content that's left, which keeps small text legible
+    scale = _fit_scale(clip.width, clip.height, settings)
+    # Round the size down so pixel rounding can't push the render over the budget
+    width = max(1, int(clip.width * scale))
+    height = max(1, int(clip.height * scale))
+    matrix = fitz.Matrix(width / clip.width, height / clip.height)
+    colorspace = fitz.csGRAY if settings.grayscale else fitz.csRGB
+    pixmap = page.get_pixmap(matrix=matrix, clip=clip, colorspace=colorspace, alpha=False)
+    image = Image.frombytes("L" if settings.grayscale else "RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    if image.size != (width, height):
+        # MuPDF rounds the pixmap outwards, drop the extra edge pixel instead of resampling
+        image = image.crop((0, 0, width, height))
+    return PageImage(_encode(image, settings), MEDIA_TYPES[settings.image_format], width, height, margins)
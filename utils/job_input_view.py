@@ -9,6 +9,8 @@ class JobInputView(View):
         self.bot = bot
         self.message = message
         self.job_details = None
+        # Set when the user only wants a quick review from the fast model
+        self.quick = False
 
         yes_button = Button(label="Yes", style=discord.ButtonStyle.success)
         yes_button.callback = self.yes_button_callback
@@ -18,6 +20,10 @@ class JobInputView(View):
         no_button.callback = self.no_button_callback
         self.add_item(no_button)
 
+        quick_button = Button(label="Quick review", style=discord.ButtonStyle.secondary)
+        quick_button.callback = self.quick_button_callback
+        self.add_item(quick_button)
+
     async def yes_button_callback(self, interaction: discord.Interaction):
         interaction.data['custom_id'] = 'yes'
         
@@ -59,4 +65,10 @@ class JobInputView(View):
     async def no_button_callback(self, interaction: discord.Interaction):
         interaction.data['custom_id'] = 'no'
         await interaction.response.send_message("No problem! I'll just provide general resume formatting feedback.", ephemeral=True)
-        self.stop()
\ No newline at end of file
+        self.stop()
+
+    async def quick_button_callback(self, interaction: discord.Interaction):
+        interaction.data['custom_id'] = 'quick'
+        self.quick = True
+        await interaction.response.send_message("Got it! I'll give you a quick general review of your resume.", ephemeral=True)
+        self.stop()
@@ -0,0 +1,57 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class JSONFileStore:
+    """An ordered dict of entries kept in a JSON file, for the persistent caches.
+
+    Every save writes a temporary file of its own in the same directory and moves it over the
+    file in one step, so a crash or another process can't leave half a file behind. Saves run
+    one at a time, in the order they were asked for, on a thread of the store's own, so the
+    last snapshot saved is the one left on disk.
+    """
+    def __init__(self, storage_file, name="cache"):
+        self.storage_file = storage_file
+        # What is stored, for log messages
+        self.name = name
+        self._executor = None
+
+    def load(self):
+        if not os.path.exists(self.storage_file):
+            return OrderedDict()
+        try:
+            with open(self.storage_file, 'r') as f:
+                entries = OrderedDict(json.load(f))
+            logger.info(f"Loaded {len(entries)} entries of the {self.name} from {self.storage_file}")
+            return entries
+        except (json.JSONDecodeError, TypeError, ValueError) as e:
+            logger.error(f"Error decoding {self.name} {self.storage_file}. Starting empty: {e}")
+            return OrderedDict()
+
+    def write(self, entries):
+        """Replace the file with entries, a list of (key, entry)"""
+        tmp_file = None
+        try:
+            directory = os.path.dirname(self.storage_file) or "."
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=directory, prefix=os.path.basename(self.storage_file) + ".", suffix=".tmp", delete=False) as f:
+                tmp_file = f.name
+                json.dump(entries, f)
+            os.replace(tmp_file, self.storage_file)
+        except OSError as e:
+            logger.error(f"Error saving {self.name}: {e}")
+            if tmp_file is not None and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    async def save(self, entries):
+        """Write a snapshot of entries without blocking the event loop"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="json-store")
+        snapshot = list(entries.items())
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.write, snapshot)
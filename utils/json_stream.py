@@ -0,0 +1,98 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+WILDCARD = "*"
+
+class IncrementalJSONParser:
+    """Scans a JSON document as it streams in and returns objects and arrays at the
+    watched paths as soon as they are complete.
+
+    Paths are tuples of object keys and array indexes, e.g. ("experiences", 0).
+    A "*" in a watched path matches any key or index. Anything before the first "{"
+    (such as a markdown code fence) is skipped.
+    """
+    def __init__(self, watch):
+        self.watch = [tuple(path) for path in watch]
+        self.buffer = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._started = False
+        self.done = False
+
+    def _matches(self, path):
+        for pattern in self.watch:
+            if len(pattern) == len(path) and all(p == WILDCARD or p == k for p, k in zip(pattern, path)):
+                return True
+        return False
+
+    def _child_path(self):
+        return tuple(frame["key"] for frame in self._stack)
+
+    def feed(self, chunk: str) -> list:
+        """Add more text and return a list of (path, value) for newly completed values"""
+        self.buffer += chunk
+        completed = []
+        buffer = self.buffer
+
+        while self._pos < len(buffer) and not self.done:
+            i = self._pos
+            char = buffer[i]
+            self._pos += 1
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._open(i, "object", ())
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if frame["type"] == "object" and frame["expect_key"]:
+                        frame["key"] = json.loads(buffer[self._string_start:i + 1])
+                        frame["expect_key"] = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                self._open(i, "object" if char == "{" else "array", self._child_path())
+            elif char in "}]":
+                frame = self._stack.pop()
+                if frame["watched"]:
+                    try:
+                        completed.append((frame["path"], json.loads(buffer[frame["start"]:i + 1])))
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Could not decode streamed value at {frame['path']}: {e}")
+                if not self._stack:
+                    self.done = True
+            elif char == ",":
+                frame = self._stack[-1]
+                if frame["type"] == "array":
+                    frame["key"] += 1
+                else:
+                    frame["expect_key"] = True
+
+        return completed
+
+    def _open(self, start, kind, path):
+        self._stack.append({
+            "type": kind,
+            "path": path,
+            "start": start,
+            "watched": self._matches(path),
+            # Arrays track the index of the current element, objects the current key
+            "key": 0 if kind == "array" else None,
+            "expect_key": kind == "object",
+        })
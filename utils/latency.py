@@ -0,0 +1,98 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+class LatencyHistogram:
+    """Streaming histogram with logarithmic buckets, in the spirit of HdrHistogram.
+
+    Every bucket is `precision` wider than the one before it, so percentiles are accurate to
+    within that relative error however many values are recorded, in a few hundred buckets.
+    """
+    def __init__(self, precision=0.01, min_value=1e-4):
+        self.min_value = min_value
+        self._log_base = math.log1p(precision)
+        self._buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        index = 0 if value <= self.min_value else int(math.log(value / self.min_value) / self._log_base) + 1
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q):
+        """Value below which q percent of the recorded values fall, or None if nothing was recorded"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * q / 100))
+        if rank >= self.count:
+            return self.max
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                if index == 0:
+                    return self.min
+                # The middle of the bucket, kept within what was actually recorded
+                value = self.min_value * math.exp((index - 0.5) * self._log_base)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+class StageMetrics:
+    """Latency histograms by name (review stages, API requests and Discord sends) and event counters"""
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        # Values can be recorded from executor threads as well as the event loop
+        self._lock = threading.Lock()
+
+    def record(self, name, value):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.record(value)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def record_review(self, timings):
+        """Record every stage timing of a finished review"""
+        for stage, seconds in timings.items():
+            self.record(stage, seconds)
+
+    @contextmanager
+    def timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def report(self):
+        """Count, sum, p50, p95 and p99 of each histogram"""
+        with self._lock:
+            return {
+                name: {
+                    "count": histogram.count,
+                    "sum": histogram.total,
+                    "p50": histogram.percentile(50),
+                    "p95": histogram.percentile(95),
+                    "p99": histogram.percentile(99)
+                }
+                for name, histogram in self._histograms.items()
+            }
+
+# Shared by the whole bot, since the last restart
+stage_metrics = StageMetrics()
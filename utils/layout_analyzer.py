@@ -0,0 +1,196 @@
+import numpy as np
+
+POINTS_PER_INCH = 72
+
+# Formatting aspects scored here instead of by the model
+LOCAL_ASPECTS = ["margins", "font_size", "line_spacing", "section_spacing", "alignment", "page_utilization"]
+
+# Lines whose tops are closer than this (in multiples of the body size) share a row, e.g. a title and its date
+ROW_TOLERANCE = 0.5
+# Rows at least this much larger than the body text are treated as section headings
+HEADING_SIZE_DELTA = 1.5
+# Left and right edges within this many points of each other count as aligned
+ALIGNMENT_TOLERANCE = 3.0
+# Sizes that cover less than this share of the text (bullet glyphs, separators) don't count as font sizes
+MIN_SIZE_SHARE = 0.02
+
+def _line_arrays(spans):
+    """Per-line boxes and sizes for the first page, as NumPy arrays"""
+    rows = [
+        (span.get("line", index), *span["bbox"], span["size"], len(span["text"].strip()))
+        for index, span in enumerate(spans)
+        if span.get("page", 0) == 0 and span["text"].strip()
+    ]
+    if not rows:
+        return None
+    data = np.array(rows, dtype=float)
+    data = data[np.argsort(data[:, 0], kind="stable")]
+    _, starts = np.unique(data[:, 0], return_index=True)
+    return {
+        "x0": np.minimum.reduceat(data[:, 1], starts),
+        "y0": np.minimum.reduceat(data[:, 2], starts),
+        "x1": np.maximum.reduceat(data[:, 3], starts),
+        "y1": np.maximum.reduceat(data[:, 4], starts),
+        "size": np.maximum.reduceat(data[:, 5], starts),
+        "span_sizes": data[:, 5],
+        "span_chars": data[:, 6],
+    }
+
+def _edge_clusters(edges):
+    """Snap edges to ALIGNMENT_TOLERANCE bins and return (bin per edge, lines per bin)"""
+    bins = np.round(edges / ALIGNMENT_TOLERANCE).astype(int)
+    _, inverse, counts = np.unique(bins, return_inverse=True, return_counts=True)
+    return inverse, counts
+
+def measure_layout(spans, page_width, page_height):
+    """Measure margins, spacing, alignment, fill and font sizes of the first page.
+
+    Returns plain floats so the result can be cached as JSON, or None if the page has no text.
+    """
+    lines = _line_arrays(spans)
+    if lines is None:
+        return None
+    x0, y0, x1, y1, size = lines["x0"], lines["y0"], lines["x1"], lines["y1"], lines["size"]
+
+    # Body size is the size most of the characters are set in
+    rounded_sizes = np.round(lines["span_sizes"] * 2) / 2
+    size_values, size_index = np.unique(rounded_sizes, return_inverse=True)
+    size_chars = np.bincount(size_index, weights=lines["span_chars"])
+    size_share = size_chars / size_chars.sum()
+    body_size = float(size_values[np.argmax(size_chars)])
+    used_sizes = size_values[size_share >= MIN_SIZE_SHARE]
+
+    # Group lines into rows and measure the distance from one row's top to the next
+    order = np.argsort(y0, kind="stable")
+    tops = y0[order]
+    new_row = np.r_[True, np.diff(tops) > ROW_TOLERANCE * body_size]
+    row_id = np.cumsum(new_row) - 1
+    row_tops = tops[new_row]
+    row_bottoms = np.maximum.reduceat(y1[order], np.flatnonzero(new_row))
+    row_sizes = np.maximum.reduceat(size[order], np.flatnonzero(new_row))
+    pitches = np.diff(row_tops) / body_size
+
+    # Gaps above headings are section spacing, the rest is line spacing
+    is_heading = row_sizes[1:] >= body_size + HEADING_SIZE_DELTA
+    line_pitches = pitches[~is_heading]
+    section_gaps = (row_tops[1:] - row_bottoms[:-1])[is_heading] / body_size
+    pitch_histogram, pitch_edges = np.histogram(line_pitches, bins=np.arange(0.5, 3.25, 0.25)) if len(line_pitches) else (np.zeros(0), np.zeros(1))
+
+    # A line is aligned if its left edge is shared with another line, or it is flush with the right edge
+    left_bins, left_counts = _edge_clusters(x0)
+    right_bins, right_counts = _edge_clusters(x1)
+    right_edge_bin = np.argmax(right_counts)
+    aligned = (left_counts[left_bins] >= 2) | (right_bins == right_edge_bin)
+
+    content_top = float(y0.min())
+    content_bottom = float(y1.max())
+    usable_height = page_height - 2 * content_top
+
+    return {
+        "page_width": float(page_width),
+        "page_height": float(page_height),
+        "margin_left": float(x0.min()) / POINTS_PER_INCH,
+        "margin_right": float(page_width - x1.max()) / POINTS_PER_INCH,
+        "margin_top": content_top / POINTS_PER_INCH,
+        "margin_bottom": float(page_height - content_bottom) / POINTS_PER_INCH,
+        "body_size": body_size,
+        "min_size": float(used_sizes.min()),
+        "size_count": int(len(used_sizes)),
+        "size_std": float(np.sqrt(np.average((lines["span_sizes"] - body_size) ** 2, weights=lines["span_chars"]))),
+        "line_pitch": float(np.median(line_pitches)) if len(line_pitches) else 0.0,
+        "line_pitch_spread": float(np.subtract(*np.percentile(line_pitches, [75, 25]))) if len(line_pitches) else 0.0,
+        "line_pitch_histogram": {f"{edge:.2f}": int(count) for edge, count in zip(pitch_edges[:-1], pitch_histogram) if count},
+        "section_gap": float(np.mean(section_gaps)) if len(section_gaps) else 0.0,
+        "section_gap_variation": float(np.std(section_gaps) / np.mean(section_gaps)) if len(section_gaps) > 1 and np.mean(section_gaps) > 0 else 0.0,
+        "section_count": int(len(section_gaps) + (row_sizes[0] >= body_size + HEADING_SIZE_DELTA)),
+        "left_edges": int(np.sum(left_counts >= 2)),
+        "aligned_ratio": float(aligned.mean()),
+        "row_count": int(row_id[-1] + 1),
+        "page_fill": min(1.0, (content_bottom - content_top) / usable_height) if usable_height > 0 else 1.0,
+    }
+
+def _band_score(value, low, high, falloff):
+    """10 inside [low, high], dropping linearly to 0 at `falloff` outside it"""
+    distance = max(low - value, value - high, 0)
+    return max(0.0, 10.0 * (1 - distance / falloff))
+
+def _aspect(score, ok_feedback, issue_feedback):
+    score = round(score, 1)
+    issue = score < 8
+    return {"issue": issue, "feedback": issue_feedback if issue else ok_feedback, "suggestions": [], "score": score}
+
+def score_layout(metrics, reference):
+    """Score the locally measured formatting aspects against the reference resume's metrics"""
+    m, ref = metrics, reference
+    aspects = {}
+
+    # Margins: at least the reference's (within 0.1in), at most an inch, left and right balanced
+    sides = [m["margin_left"], m["margin_right"], m["margin_top"]]
+    low = min(ref["margin_left"], ref["margin_right"], ref["margin_top"], 0.5) - 0.1
+    score = min(_band_score(side, low, 1.0, 0.4) for side in sides)
+    if abs(m["margin_left"] - m["margin_right"]) > 0.25:
+        score -= 3
+    measured = f"left {m['margin_left']:.2f}in, right {m['margin_right']:.2f}in, top {m['margin_top']:.2f}in"
+    aspects["margins"] = _aspect(
+        max(score, 0),
+        f"Margins are balanced: {measured}.",
+        f"Margins measured {measured}; aim for even margins between {max(low, 0.4):.1f} and 1.0in."
+    )
+
+    # Font size: readable body text, few distinct sizes and nothing tiny
+    score = _band_score(m["body_size"], min(ref["body_size"], 10) - 0.5, 12, 3)
+    score -= 1.5 * max(0, m["size_count"] - max(ref["size_count"], 4))
+    score -= 2 * max(0, 8 - m["min_size"])
+    measured = f"body text is {m['body_size']:g}pt with {m['size_count']} sizes in use (smallest {m['min_size']:g}pt)"
+    aspects["font_size"] = _aspect(
+        max(score, 0),
+        f"Font sizes are readable and consistent: {measured}.",
+        f"Font sizes need attention: {measured}. Keep body text at 10-12pt and limit the number of sizes."
+    )
+
+    # Line spacing: typical line pitch close to the reference and consistent
+    score = _band_score(m["line_pitch"], max(1.0, ref["line_pitch"] * 0.85), ref["line_pitch"] * 1.3, 0.5)
+    score -= 10 * max(0, m["line_pitch_spread"] - max(ref["line_pitch_spread"], 0.15))
+    measured = f"lines are spaced {m['line_pitch']:.2f}x the font size (spread {m['line_pitch_spread']:.2f}, reference {ref['line_pitch']:.2f}x)"
+    aspects["line_spacing"] = _aspect(
+        max(score, 0),
+        f"Line spacing is comfortable and consistent: {measured}.",
+        f"Line spacing needs attention: {measured}."
+    )
+
+    # Section spacing: consistent gaps before section headings, similar to the reference
+    if m["section_count"] < 2:
+        aspects["section_spacing"] = _aspect(
+            5,
+            "",
+            "Section headings could not be told apart from body text; use larger or bolder headings with consistent space above them."
+        )
+    else:
+        score = _band_score(m["section_gap"], ref["section_gap"] * 0.5, ref["section_gap"] * 2, ref["section_gap"] * 1.5)
+        score -= 15 * max(0, m["section_gap_variation"] - max(ref["section_gap_variation"], 0.2))
+        measured = f"the gap above headings averages {m['section_gap']:.2f}x the font size and varies by {m['section_gap_variation']:.0%}"
+        aspects["section_spacing"] = _aspect(
+            max(score, 0),
+            f"Sections are evenly separated: {measured}.",
+            f"Spacing between sections needs attention: {measured} (reference {ref['section_gap']:.2f}x)."
+        )
+
+    # Alignment: nearly every line shares an edge with other lines, and there are only a few indent levels
+    score = _band_score(m["aligned_ratio"], min(ref["aligned_ratio"], 0.95), 1, 0.3)
+    score -= 1.5 * max(0, m["left_edges"] - max(ref["left_edges"], 4))
+    measured = f"{m['aligned_ratio']:.0%} of lines are aligned, using {m['left_edges']} indent levels"
+    aspects["alignment"] = _aspect(
+        max(score, 0),
+        f"Text is cleanly aligned: {measured}.",
+        f"Alignment is inconsistent: {measured}. Line up dates on the right and keep indents to a few levels."
+    )
+
+    # Page utilization: the content should fill the page between its top and bottom margins
+    score = _band_score(m["page_fill"], min(ref["page_fill"], 0.9), 1, 0.5)
+    measured = f"content fills {m['page_fill']:.0%} of the page height (reference {ref['page_fill']:.0%})"
+    aspects["page_utilization"] = _aspect(
+        score,
+        f"The page is well used: {measured}.",
+        f"There is unused space on the page: {measured}."
+    )
+    return aspects
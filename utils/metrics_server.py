@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import os
+import sys
+from aiohttp import web
+from utils.latency import stage_metrics
+from utils.retry import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# How often the event loop is checked for lag, in seconds
+LOOP_LAG_INTERVAL = 1.0
+# Readiness reports degraded once the event loop falls this far behind
+MAX_LOOP_LAG = 0.5
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def process_rss_bytes():
+    """Resident memory of this process, or its peak where the current value isn't available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Bytes on macOS, kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def _format_value(value):
+    return "NaN" if value is None else repr(float(value))
+
+def _metric(lines, name, kind, help_text, samples):
+    """Append one metric in the Prometheus text format; samples are (labels, value)"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+        lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text else f"{name} {_format_value(value)}")
+
+def _summary(lines, name, help_text, histograms, label=None):
+    """Append histograms as a Prometheus summary with p50, p95 and p99 quantiles, labelled by
+    their key, or a single unlabelled histogram under the key None"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} summary")
+    for key, histogram in histograms.items():
+        labels = f'{label}="{key}"' if label else ""
+        for quantile, percentile in [("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")]:
+            quantile_labels = f'{labels},quantile="{quantile}"' if labels else f'quantile="{quantile}"'
+            lines.append(f'{name}{{{quantile_labels}}} {_format_value(histogram[percentile])}')
+        lines.append(f'{name}_sum{{{labels}}} {_format_value(histogram["sum"])}' if labels else f'{name}_sum {_format_value(histogram["sum"])}')
+        lines.append(f'{name}_count{{{labels}}} {histogram["count"]}' if labels else f'{name}_count {histogram["count"]}')
+
+class MetricsServer:
+    """Serves Prometheus metrics on /metrics, liveness on /healthz and readiness on /readyz.
+
+    Also watches event loop lag, since a blocked loop delays every review at once.
+    """
+    def __init__(self, bot, port, host="0.0.0.0", breaker=None):
+        self.bot = bot
+        self.port = port
+        self.host = host
+        self.breaker = breaker
+        self.loop_lag = 0.0
+        self._runner = None
+        self._lag_task = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.router.add_get("/healthz", self.handle_health)
+        app.router.add_get("/readyz", self.handle_ready)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._lag_task = asyncio.create_task(self._watch_loop_lag())
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _watch_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            # How much later than asked for the sleep ended
+            self.loop_lag = max(0.0, loop.time() - expected)
+            stage_metrics.record("event_loop_lag", self.loop_lag)
+
+    def _gateway_latency(self):
+        latency = self.bot.latency
+        # discord.py reports infinity until the first heartbeat is acknowledged
+        return latency if latency == latency and latency != float("inf") else None
+
+    def readiness(self):
+        """(status, checks): "ok", "degraded" when reviews will be slow or fail, or "starting" """
+        queue = self.bot.review_queue
+        breaker_state = self.breaker.state if self.breaker else CircuitBreaker.CLOSED
+        checks = {
+            "discord_ready": self.bot.is_ready(),
+            "anthropic": breaker_state,
+            "queue_depth": queue.depth,
+            "queue_full": queue.depth >= queue.max_size,
+            "event_loop_lag": round(self.loop_lag, 3),
+        }
+        if not checks["discord_ready"]:
+            return "starting", checks
+        if breaker_state != CircuitBreaker.CLOSED or checks["queue_full"] or self.loop_lag > MAX_LOOP_LAG:
+            return "degraded", checks
+        return "ok", checks
+
+    def render_metrics(self):
+        queue = self.bot.review_queue
+        report = stage_metrics.report()
+        counters = stage_metrics.counters()
+        status, _ = self.readiness()
+        lines = []
+        _metric(lines, "resume_bot_reviews_in_flight", "gauge", "Reviews being run by a worker", [({}, queue.in_flight)])
+        _metric(lines, "resume_bot_queue_depth", "gauge", "Reviews waiting for a worker", [({}, queue.depth)])
+        _metric(lines, "resume_bot_queue_capacity", "gauge", "Reviews allowed to wait for a worker", [({}, queue.max_size)])
+        _metric(lines, "resume_bot_anthropic_errors_total", "counter", "Failed Anthropic API request attempts", [({}, counters.get("anthropic_errors", 0))])
+        for outcome in ["completed", "failed"]:
+            _metric(lines, f"resume_bot_reviews_{outcome}_total", "counter", f"Reviews {outcome} since start", [({}, counters.get(f"reviews_{outcome}", 0))])
+        _metric(lines, "resume_bot_anthropic_degraded", "gauge", "1 while the Anthropic circuit breaker is not closed",
+                [({}, int(bool(self.breaker and self.breaker.is_degraded)))])
+        _metric(lines, "resume_bot_gateway_latency_seconds", "gauge", "Discord gateway heartbeat latency", [({}, self._gateway_latency())])
+        _metric(lines, "resume_bot_event_loop_lag_seconds", "gauge", "Latest event loop lag", [({}, self.loop_lag)])
+        _metric(lines, "resume_bot_process_resident_memory_bytes", "gauge", "Resident memory of the bot process", [({}, process_rss_bytes())])
+        _metric(lines, "resume_bot_ready", "gauge", "1 when the bot is ready and not degraded", [({}, int(status == "ok"))])
+        _summary(
+            lines, "resume_bot_latency_seconds", "Latency of review stages, Anthropic requests, Discord sends and event loop lag",
+            {name: histogram for name, histogram in report.items() if name != "tokens_per_second"}, label="name"
+        )
+        if "tokens_per_second" in report:
+            _summary(lines, "resume_bot_anthropic_output_tokens_per_second", "Output tokens per second of Anthropic requests",
+                     {None: report["tokens_per_second"]})
+        return "\n".join(lines) + "\n"
+
+    async def handle_metrics(self, request):
+        return web.Response(body=self.render_metrics().encode("utf-8"), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+    async def handle_health(self, request):
+        # Answering at all means the event loop is alive
+        return web.json_response({"status": "ok"})
+
+    async def handle_ready(self, request):
+        status, checks = self.readiness()
+        return web.json_response({"status": status, "checks": checks}, status=200 if status == "ok" else 503)
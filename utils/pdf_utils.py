@@ -1,80 +1,258 @@
-from pdf2image import convert_from_bytes
 import fitz
-from io import BytesIO
-import base64
 import logging
-import sys
-import os
-
-# Convert PDF to Image (Base64)
-def convert_pdf_to_image(file: bytes) -> str:
-    try:
-        # Check if we're on Heroku or similar platform
-        if 'DYNO' in os.environ:
-            # Heroku has Poppler installed via Aptfile
-            images = convert_from_bytes(file, first_page=1, last_page=1)
+import re
+from collections import Counter
+from functools import cached_property
+from utils.image_utils import ImageSettings, render_page
+from utils.layout_analyzer import measure_layout
+from utils.span_encoding import encode_spans
+
+class PDFRejectedError(ValueError):
+    """Raised for PDFs that are too big, too long or too expensive to process"""
+
+class ResumeDocument:
+    """Everything the review needs from a resume PDF, read in a single PyMuPDF pass.
+
+    The PDF is opened once to get the page count, the text, every text span and an
+    image of the first page, so nothing has to parse the file again afterwards.
+    """
+    def __init__(self, page_count, text, spans, image, page_size=None):
+        self.page_count = page_count
+        self.text = text
+        self.spans = spans
+        self.image = image
+        # (width, height) of the first page in points
+        self.page_size = page_size
+
+    @classmethod
+    def from_bytes(cls, file: bytes, image_settings=None, max_pages=None):
+        with fitz.open(stream=file, filetype="pdf") as doc:
+            page_count = len(doc)
+            logging.info(f"Detected {page_count} pages in the PDF.")
+            if max_pages is not None and page_count > max_pages:
+                raise PDFRejectedError(f"PDF has {page_count} pages, the limit is {max_pages}")
+            text = ""
+            spans = []
+            line_index = 0
+            for page_index, page in enumerate(doc):
+                text += page.get_text()
+                page_dict = page.get_text("dict")
+                for block in page_dict.get("blocks", []):
+                    for line in block.get("lines", []):
+                        for span in line["spans"]:
+                            spans.append({
+                                "text": span["text"],
+                                "font": span["font"],
+                                "size": span["size"],
+                                "bbox": span["bbox"],
+                                "flags": span["flags"],
+                                "line": line_index,
+                                "page": page_index,
+                            })
+                        line_index += 1
+            image = render_page(doc[0], image_settings or ImageSettings()) if page_count else None
+            page_size = (doc[0].rect.width, doc[0].rect.height) if page_count else None
+        return cls(page_count, text, spans, image, page_size)
+
+    @property
+    def is_single_page(self):
+        return self.page_count == 1
+
+    @property
+    def extracted_data(self):
+        """Text and span formatting in the shape the review prompt expects"""
+        return {"text": self.text, "formatting": self.spans}
+
+    @property
+    def compact_formatting(self):
+        """Text lines with positions and fonts, encoded compactly for the prompt"""
+        return encode_spans(self.spans)
+
+    @cached_property
+    def sections(self):
+        """The resume split into sections with their entries and bullets, see parse_sections"""
+        return parse_sections(self.spans)
+
+    @property
+    def layout_metrics(self):
+        """Measurements of the first page's layout, see utils.layout_analyzer"""
+        if self.page_size is None:
+            return None
+        return measure_layout(self.spans, *self.page_size)
+
+# Section headings recognised by name, normalised to lowercase words
+SECTION_HEADINGS = {
+    "education": ["education", "academic background", "education and training"],
+    "experience": ["experience", "work experience", "professional experience", "relevant experience", "research experience",
+                   "employment", "employment history", "work history", "internships", "internship experience"],
+    "projects": ["projects", "personal projects", "technical projects", "academic projects", "selected projects",
+                 "project experience", "relevant projects"],
+    "leadership": ["leadership", "leadership experience", "leadership and involvement", "involvement", "campus involvement",
+                   "activities", "extracurriculars", "extracurricular activities", "volunteering", "volunteer experience"],
+    "skills": ["skills", "technical skills", "skills and interests", "technologies", "technical skills and interests"],
+}
+HEADING_KINDS = {heading: kind for kind, headings in SECTION_HEADINGS.items() for heading in headings}
+# Word exports Symbol font bullets as the private use character U+F0B7
+BULLET_GLYPHS = ("•", "·", "●", "▪", "■", "◦", "○", "➢", "►", "-", "–", "*", "\uf0b7")
+# PyMuPDF span flag for bold text
+BOLD_FLAG = 16
+
+class ResumeEntry:
+    """One experience, project or other entry: its header lines and its bullets"""
+    def __init__(self, header=None, bullets=None):
+        self.header = header or []
+        self.bullets = bullets or []
+
+    @property
+    def title(self):
+        return self.header[0] if self.header else None
+
+class ResumeSection:
+    """A section of the resume, e.g. Experience, with the rows of text under its heading"""
+    def __init__(self, kind, heading=None):
+        # One of SECTION_HEADINGS, "header" for the name and contact block or "other"
+        self.kind = kind
+        self.heading = heading
+        self.rows = []
+        self.entries = []
+
+    @property
+    def text(self):
+        return "\n".join(row["text"] for row in self.rows)
+
+    @property
+    def bullet_count(self):
+        return sum(len(entry.bullets) for entry in self.entries)
+
+def _normalise_heading(text):
+    text = text.lower().replace("&", " and ")
+    return " ".join(re.sub(r"[^a-z ]", " ", text).split())
+
+def _text_rows(spans):
+    """Group spans into lines and lines into visual rows, in reading order"""
+    lines = {}
+    for index, span in enumerate(spans):
+        key = (span.get("page", 0), span.get("line", index))
+        line = lines.get(key)
+        if line is None:
+            line = lines[key] = {"page": key[0], "text": "", "x0": span["bbox"][0], "y0": span["bbox"][1], "y1": span["bbox"][3], "size": 0, "chars": 0, "bold_chars": 0}
+        line["text"] += span["text"]
+        line["x0"] = min(line["x0"], span["bbox"][0])
+        line["y0"] = min(line["y0"], span["bbox"][1])
+        line["y1"] = max(line["y1"], span["bbox"][3])
+        chars = len(span["text"].strip())
+        if chars:
+            line["size"] = max(line["size"], span["size"])
+            line["chars"] += chars
+            if span.get("flags", 0) & BOLD_FLAG or "bold" in span["font"].lower():
+                line["bold_chars"] += chars
+    lines = [line for line in lines.values() if line["text"].strip()]
+    # Lines are compared by their middle, since a bullet glyph or another font can sit higher or lower
+    for line in lines:
+        line["middle"] = (line["y0"] + line["y1"]) / 2
+    lines.sort(key=lambda line: (line["page"], line["middle"], line["x0"]))
+
+    rows = []
+    for line in lines:
+        row = rows[-1] if rows else None
+        if row and row["page"] == line["page"] and line["middle"] - row["middle"] < 0.5 * max(line["size"], 1):
+            row["lines"].append(line)
+        else:
+            rows.append({"page": line["page"], "middle": line["middle"], "lines": [line]})
+    for row in rows:
+        row["lines"].sort(key=lambda line: line["x0"])
+        row["text"] = " | ".join(line["text"].strip() for line in row["lines"])
+        row["x0"] = row["lines"][0]["x0"]
+        row["size"] = max(line["size"] for line in row["lines"])
+        row["bold"] = all(line["bold_chars"] * 2 >= line["chars"] for line in row["lines"])
+    return rows
+
+def _heading_kind(row, body_size):
+    """Section kind if the row is a section heading, otherwise None"""
+    if len(row["lines"]) > 1 or row["text"].lstrip().startswith(BULLET_GLYPHS):
+        return None
+    name = _normalise_heading(row["text"])
+    if name in HEADING_KINDS and row["size"] >= body_size - 0.5:
+        return HEADING_KINDS[name]
+    # Unknown headings still have to look like headings: short, and larger or bold capitals
+    text = row["text"].strip()
+    looks_like_heading = row["size"] >= body_size + 1.5 or (text.isupper() and row["bold"])
+    if name and len(name.split()) <= 4 and looks_like_heading:
+        return "other"
+    return None
+
+def _split_entries(rows):
+    """Split a section's rows into entries; bullets start with a glyph, wrapped lines are indented past it"""
+    entries = []
+    bullet_x0 = None
+    for row in rows:
+        text = row["text"].strip()
+        first = row["lines"][0]["text"].strip()
+        glyph = next((glyph for glyph in BULLET_GLYPHS if first.startswith(glyph)), None)
+        if glyph:
+            # The glyph can be a line of its own, followed by the bullet's text
+            parts = [first[len(glyph):].strip()] + [line["text"].strip() for line in row["lines"][1:]]
+            bullet = " ".join(part for part in parts if part)
+            if not bullet:
+                continue
+            if not entries:
+                entries.append(ResumeEntry())
+            entries[-1].bullets.append(bullet)
+            bullet_x0 = row["x0"]
+        elif bullet_x0 is not None and row["x0"] > bullet_x0 + 1 and not row["bold"] and entries[-1].bullets:
+            # Continuation of a bullet that wrapped onto the next line
+            entries[-1].bullets[-1] += " " + text
+        else:
+            if not entries or entries[-1].bullets:
+                entries.append(ResumeEntry())
+                bullet_x0 = None
+            entries[-1].header.append(text)
+    return entries
+
+def parse_sections(spans):
+    """Split a resume into sections by finding headings from their size, weight, capitals and names.
+
+    Everything before the first heading is the "header" section (name and contact details).
+    """
+    size_chars = Counter()
+    for span in spans:
+        size_chars[round(span["size"] * 2) / 2] += len(span["text"].strip())
+    body_size = size_chars.most_common(1)[0][0] if size_chars else 0
+
+    sections = [ResumeSection("header")]
+    for row in _text_rows(spans):
+        kind = _heading_kind(row, body_size)
+        # The name at the top is usually large too, but it belongs to the header
+        if kind == "other" and len(sections) == 1:
+            kind = None
+        if kind:
+            sections.append(ResumeSection(kind, row["text"].strip()))
         else:
-            # Try to use default path
-            try:
-                images = convert_from_bytes(file, first_page=1, last_page=1)
-            except Exception as e:
-                logging.warning(f"Default Poppler path failed: {e}")
-                # Try platform-specific paths
-                if sys.platform == 'win32':
-                    # Windows - try common installation path
-                    poppler_path = os.path.join(os.getcwd(), 'poppler', 'bin')
-                    if not os.path.exists(poppler_path):
-                        poppler_path = r"C:\Program Files\poppler\Library\bin"
-                    images = convert_from_bytes(file, first_page=1, last_page=1, poppler_path=poppler_path)
-                elif sys.platform == 'darwin':
-                    # macOS - try Homebrew path
-                    images = convert_from_bytes(file, first_page=1, last_page=1, poppler_path="/usr/local/bin")
-                else:
-                    # Linux - try common paths
-                    images = convert_from_bytes(file, first_page=1, last_page=1)
-        
-        buffered = BytesIO()
-        images[0].save(buffered, format="PNG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-        logging.info("Converted PDF to Base64 image successfully")
-        return img_base64
-    except Exception as e:
-        logging.error(f"Error converting PDF to image: {e}")
-        # Return a placeholder image or raise the exception
-        raise
-
-def extract_text_and_formatting(file: bytes) -> dict:
-    with fitz.open(stream=file, filetype="pdf") as doc:
-        text = ""
-        formatting_info = []
-        for page in doc:
-            text += page.get_text()
-            page_dict = page.get_text("dict")
-            
-            # Log the entire structure of the page_dict
-            logging.info(f"Page dict structure: {page_dict}")
-
-            # Check if 'blocks' exists and is a list
-            if "blocks" in page_dict:
-                if isinstance(page_dict["blocks"], list):
-                    for block in page_dict["blocks"]:
-                        if "lines" in block:
-                            for line in block["lines"]:
-                                for span in line["spans"]:
-                                    formatting_info.append({
-                                        "text": span["text"],
-                                        "font": span["font"],
-                                        "size": span["size"],
-                                        "bbox": span["bbox"],
-                                    })
-                else:
-                    logging.error("'blocks' is not a list.")
-            else:
-                logging.warning("No valid 'blocks' found in page dict.")
-                
-    result = {"text": text, "formatting": formatting_info}
-    logging.info(f"Extracted data: {result}")
-    return result
+            sections[-1].rows.append(row)
+    for section in sections:
+        if section.kind not in ("header", "skills"):
+            section.entries = _split_entries(section.rows)
+    return [section for section in sections if section.rows or section.heading]
+
+def describe_entry(entry):
+    """Render an entry as its header line followed by its bullets"""
+    lines = ["- " + (" | ".join(entry.header) if entry.header else "(untitled)")]
+    lines.extend(f"  * {bullet}" for bullet in entry.bullets)
+    return "\n".join(lines)
+
+def describe_sections(sections, kinds=None):
+    """Render sections as compact text for a prompt, optionally only those of the given kinds"""
+    blocks = []
+    for section in sections:
+        if kinds is not None and section.kind not in kinds:
+            continue
+        lines = [f"## {section.heading or section.kind.title()}"]
+        if section.entries:
+            lines.extend(describe_entry(entry) for entry in section.entries)
+        else:
+            lines.extend(row["text"] for row in section.rows)
+        blocks.append("\n".join(lines))
+    return "\n".join(blocks)
 
 def analyze_font_consistency(formatting_info):
     font_set = set()
@@ -98,9 +276,3 @@ def analyze_font_consistency(formatting_info):
             "feedback": feedback,
             "score": 10
         }
-
-def check_single_page(file: bytes) -> bool:
-    with fitz.open(stream=file, filetype="pdf") as doc:
-        page_count = len(doc)
-        logging.info(f"Detected {page_count} pages in the PDF.")
-        return page_count == 1
\ No newline at end of file
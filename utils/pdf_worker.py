@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import PDF_WORKER_COUNT, PDF_WORKER_MEMORY_MB, PDF_TIMEOUT_SECONDS, PDF_MAX_BYTES, PDF_MAX_PAGES
+from config import IMAGE_FORMAT, IMAGE_QUALITY, IMAGE_GRAYSCALE, IMAGE_TRIM_MARGINS
+from utils.image_utils import ImageSettings
+from utils.pdf_utils import PDFRejectedError, ResumeDocument
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, workers run without a memory limit there
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+def _limit_worker_memory(memory_limit_bytes):
+    # Runs once in every worker process before it takes any jobs
+    if resource is not None and memory_limit_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+
+def _parse_document(file, image_settings, max_pages):
+    try:
+        return ResumeDocument.from_bytes(file, image_settings=image_settings, max_pages=max_pages)
+    except PDFRejectedError:
+        raise
+    except MemoryError:
+        raise PDFRejectedError("PDF needs too much memory to process")
+    except Exception as e:
+        # MuPDF errors can't be pickled back to the bot process
+        raise PDFRejectedError(f"Could not process PDF: {e}") from None
+
+class PDFWorkerPool:
+    """Parses and renders PDFs in separate worker processes.
+
+    Each worker runs with a memory limit and each PDF with a time limit, so a hostile
+    or pathological PDF can't stall or exhaust the bot process. Every worker is a
+    process of its own that parses one PDF at a time, so a worker that crashes or gets
+    stuck is killed and replaced without touching the PDFs the others are parsing.
+    """
+    def __init__(self, worker_count, memory_limit_mb, timeout_seconds, max_bytes, max_pages, image_settings):
+        self.worker_count = worker_count
+        self.memory_limit_mb = memory_limit_mb
+        self.timeout_seconds = timeout_seconds
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self.image_settings = image_settings
+        # Workers waiting for a PDF; None stands for one that is started on first use
+        self._idle = None
+        # Process id of each worker, so a stuck one can be killed
+        self._workers = {}
+        self.restarts = 0
+
+    def _idle_workers(self):
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self.worker_count):
+                self._idle.put_nowait(None)
+        return self._idle
+
+    async def _start_worker(self):
+        executor = ProcessPoolExecutor(
+            max_workers=1,
+            # Forking a process that runs an event loop and threads isn't safe
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_limit_worker_memory,
+            initargs=(self.memory_limit_mb * 1024 * 1024,)
+        )
+        # The worker's first job is telling us its process id
+        try:
+            self._workers[executor] = await asyncio.get_running_loop().run_in_executor(executor, os.getpid)
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        return executor
+
+    def _kill_worker(self, executor, reason):
+        logger.warning(f"Replacing PDF worker: {reason}")
+        pid = self._workers.pop(executor, None)
+        self.restarts += 1
+        # A stuck worker would keep its core busy forever, so kill it instead of waiting
+        if pid is not None:
+            try:
+                os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            except ProcessLookupError:
+                pass
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def check_size(self, size):
+        """Raise PDFRejectedError if a PDF of this many bytes shouldn't be processed"""
+        if size > self.max_bytes:
+            raise PDFRejectedError(f"PDF is {size} bytes, the limit is {self.max_bytes}")
+
+    async def parse(self, file: bytes) -> ResumeDocument:
+        self.check_size(len(file))
+        loop = asyncio.get_running_loop()
+        idle = self._idle_workers()
+        executor = await idle.get()
+        try:
+            if executor is None:
+                executor = await self._start_worker()
+            return await asyncio.wait_for(
+                loop.run_in_executor(executor, _parse_document, file, self.image_settings, self.max_pages),
+                self.timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            self._kill_worker(executor, f"a PDF took longer than {self.timeout_seconds}s")
+            executor = None
+            raise PDFRejectedError(f"PDF took longer than {self.timeout_seconds}s to process")
+        except BrokenProcessPool:
+            # The worker only had this PDF, so it's the one that crashed it
+            self._kill_worker(executor, "its process died")
+            executor = None
+            raise PDFRejectedError("PDF crashed the worker processing it")
+        finally:
+            idle.put_nowait(executor)
+
+    def shutdown(self):
+        for executor in self._workers:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._workers.clear()
+        self._idle = None
+
+# Create a singleton instance
+pdf_worker_pool = PDFWorkerPool(
+    worker_count=PDF_WORKER_COUNT,
+    memory_limit_mb=PDF_WORKER_MEMORY_MB,
+    timeout_seconds=PDF_TIMEOUT_SECONDS,
+    max_bytes=PDF_MAX_BYTES,
+    max_pages=PDF_MAX_PAGES,
+    image_settings=ImageSettings(
+        image_format=IMAGE_FORMAT,
+        quality=IMAGE_QUALITY,
+        grayscale=IMAGE_GRAYSCALE,
+        trim_margins=IMAGE_TRIM_MARGINS
+    )
+)
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import tiktoken
+from config import CACHE_DIR
+from utils.image_utils import PageImage
+from utils.pdf_utils import ResumeDocument
+from utils.pdf_worker import pdf_worker_pool
+from utils.span_encoding import encode_spans
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_RESUME_PATH = "resumes/jakes-resume.pdf"
+
+# Bump this whenever the shape or content of the cached artifacts changes
+ARTIFACT_VERSION = 7
+
+class ReferenceArtifacts:
+    """Everything a review needs from the reference (Jake's) resume"""
+    def __init__(self, file_hash, extracted_data, image, token_count, image_settings, layout_metrics):
+        self.file_hash = file_hash
+        self.extracted_data = extracted_data
+        self.formatting_text = encode_spans(extracted_data["formatting"])
+        self.image = image
+        self.token_count = token_count
+        self.image_settings = image_settings
+        self.layout_metrics = layout_metrics
+
+    def to_dict(self):
+        return {
+            "version": ARTIFACT_VERSION,
+            "file_hash": self.file_hash,
+            "extracted_data": self.extracted_data,
+            "image": self.image.to_dict(),
+            "token_count": self.token_count,
+            "image_settings": self.image_settings,
+            "layout_metrics": self.layout_metrics
+        }
+
+def _build_artifacts(resume_bytes, file_hash, image_settings):
+    logger.info("Building reference resume artifacts")
+    # Rendered the same way as user resumes so the model compares like with like
+    document = ResumeDocument.from_bytes(resume_bytes, image_settings=image_settings)
+    extracted_data = document.extracted_data
+    encoding = tiktoken.encoding_for_model("gpt-4o")
+    token_count = len(encoding.encode(encode_spans(extracted_data["formatting"])))
+    return ReferenceArtifacts(file_hash, extracted_data, document.image, token_count, image_settings.to_dict(), document.layout_metrics)
+
+def load_reference_artifacts(path=REFERENCE_RESUME_PATH, cache_dir=CACHE_DIR, image_settings=None):
+    """Load the reference artifacts from the on-disk cache, building them if the PDF changed"""
+    with open(path, "rb") as f:
+        resume_bytes = f.read()
+    file_hash = hashlib.sha256(resume_bytes).hexdigest()
+    image_settings = image_settings or pdf_worker_pool.image_settings
+    cache_file = os.path.join(cache_dir, f"reference-{file_hash[:16]}-v{ARTIFACT_VERSION}.json")
+
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, "r") as f:
+                cached = json.load(f)
+            if (cached.get("file_hash") == file_hash and cached.get("version") == ARTIFACT_VERSION
+                    and cached.get("image_settings") == image_settings.to_dict()):
+                logger.info(f"Loaded reference resume artifacts from {cache_file}")
+                return ReferenceArtifacts(file_hash, cached["extracted_data"], PageImage.from_dict(cached["image"]), cached["token_count"], cached["image_settings"], cached["layout_metrics"])
+        except (json.JSONDecodeError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable reference cache {cache_file}: {e}")
+
+    artifacts = _build_artifacts(resume_bytes, file_hash, image_settings)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(artifacts.to_dict(), f)
+        os.replace(tmp_file, cache_file)
+        logger.info(f"Saved reference resume artifacts to {cache_file}")
+    except OSError as e:
+        logger.warning(f"Could not write reference cache {cache_file}: {e}")
+    return artifacts
+
+_artifacts = None
+_artifacts_lock = threading.Lock()
+
+def get_reference_artifacts():
+    """Return the process-wide reference artifacts, loading them on first use"""
+    global _artifacts
+    if _artifacts is None:
+        with _artifacts_lock:
+            if _artifacts is None:
+                _artifacts = load_reference_artifacts()
+    return _artifacts
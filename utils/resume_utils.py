@@ -1,11 +1,24 @@
+import asyncio
+import difflib
+import functools
 import json
 import logging
 import os
+import time
 import tiktoken
 from pydantic import ValidationError
-from models import ResumeFeedback
-from utils.anthropic_utils import get_chat_completion
-from utils.pdf_utils import analyze_font_consistency, check_single_page, convert_pdf_to_image, extract_text_and_formatting
+from config import BULLET_CACHE_MAX_ENTRIES, BULLET_CACHE_TTL_HOURS, CACHE_DIR, REVIEW_FAN_OUT, REVIEW_SECTION_ATTEMPTS, SECTION_MODEL_TIERS, STRUCTURED_OUTPUT, TRIAGE_MODEL_TIER
+from models import FormattingAspect, FormattingFeedback, ResumeExperience, ResumeFeedback, ResumeProject, ResumeTriage
+from utils.analytics import analytics
+from utils.anthropic_utils import cache_breakpoint, get_chat_completion, stream_chat_completion
+from utils.bullet_cache import BulletCache, normalize_bullet
+from utils.json_stream import IncrementalJSONParser
+from utils.layout_analyzer import score_layout
+from utils.pdf_utils import ResumeDocument, ResumeEntry, analyze_font_consistency, describe_entry, describe_sections
+from utils.pdf_worker import pdf_worker_pool
+from utils.reference_cache import get_reference_artifacts
+from utils.review_context import ReviewCancelledError, ReviewContext
+from utils.span_encoding import FORMAT_DESCRIPTION
 
 # Configure logging for Heroku
 logging.basicConfig(
@@ -20,10 +33,134 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.info("Resume utils module initialized")
 
-def review_resume(resume_user: bytes, resume_jake: bytes, job_title: str = None, company: str = None, min_qual: str = None, pref_qual: str = None) -> dict:
-    logger.info("Starting resume review process")
-    logger.info(f"Job title: {job_title}, Company: {company}")
-    
+# Bump whenever the prompts or the feedback format change so cached reviews are not reused
+PROMPT_VERSION = 6
+
+class NotAResumeError(ValueError):
+    """Raised when triage finds that the uploaded PDF isn't a resume"""
+
+def section_model_tier(kind, context):
+    """Model tier for a section: quick reviews use the fast model, otherwise it's configured per section"""
+    return "fast" if context.quick else SECTION_MODEL_TIERS[kind]
+
+# Build the system prompt and messages for a review. This does all of the blocking
+# PDF parsing and rendering, so it should be run in an executor.
+def _image_block(image):
+    return {'type': 'image', 'source': {'data': image.base64, 'media_type': image.media_type, 'type': 'base64'}}
+
+def _image_intro(text, image):
+    # Renders are cropped to their content, so the page margins are described in words instead
+    margins = image.describe_margins()
+    if margins:
+        return f"{text} (cropped to its content; page margins: {margins}): "
+    return f"{text}: "
+
+def _formatting_schema(layout_aspects, is_single_page, additional_feedback, only=None):
+    """Schema lines for the formatting section; measured aspects without issues are left out,
+    and so is every aspect not in `only` if it is given"""
+    lines = []
+    for name in FormattingFeedback.__fields__:
+        if name == "overall_score" or (only is not None and name not in only):
+            continue
+        if name == "is_single_page":
+            lines.append(f"is_single_page: {{ issue: {not is_single_page}, feedback: {additional_feedback}, suggestions: [string, string], score: {10 if is_single_page else 0} }},")
+        elif name not in layout_aspects:
+            lines.append(f"{name}: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},")
+        elif layout_aspects[name]["issue"]:
+            lines.append(f"{name}: {{ feedback: string, suggestions: [string, string] }},")
+    return "\n".join(f"        {line}" for line in lines)
+
+def _json_schema(model):
+    """JSON schema of a pydantic model with its $refs inlined, so it can be nested in other schemas"""
+    schema = model.schema()
+    definitions = schema.pop("$defs", schema.pop("definitions", {}))
+    def inline(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return inline(definitions[node["$ref"].rsplit("/", 1)[-1]])
+            return {key: inline(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [inline(value) for value in node]
+        return node
+    return inline(schema)
+
+def _formatting_tool_schema(layout_aspects, only=None):
+    """JSON schema of the formatting aspects _formatting_schema asks for. Measured aspects are
+    scored locally, so only an explanation of their issue is asked for."""
+    aspect = _json_schema(FormattingAspect)
+    explanation = {
+        **aspect,
+        "properties": {key: aspect["properties"][key] for key in ["feedback", "suggestions"]},
+        "required": ["feedback"]
+    }
+    names = [
+        name for name in FormattingFeedback.__fields__
+        if name != "overall_score" and (only is None or name in only)
+        and (name == "is_single_page" or name not in layout_aspects or layout_aspects[name]["issue"])
+    ]
+    return {
+        "type": "object",
+        "properties": {
+            **{name: explanation if name in layout_aspects else aspect for name in names},
+            "overall_score": {"type": "number", "minimum": 0, "maximum": 10}
+        },
+        "required": names + ["overall_score"]
+    }
+
+def _feedback_tool(name, input_schema):
+    """A tool the model is made to call with its feedback, or None if structured output is off"""
+    if not STRUCTURED_OUTPUT:
+        return None
+    return {"name": name, "description": "Submit the review feedback.", "input_schema": input_schema}
+
+def _describe_measured_formatting(layout_aspects):
+    if not layout_aspects:
+        return ""
+    measured = "\n".join(f"    - {name} ({aspect['score']}/10): {aspect['feedback']}" for name, aspect in layout_aspects.items())
+    return f"""These formatting aspects were measured directly from the PDF, and their scores are final:
+{measured}
+    Only the measured aspects with issues are in the schema below. For those, explain the measured problem and suggest fixes."""
+
+# Feedback on single bullets, shared by every review so unchanged bullets aren't reviewed twice
+bullet_cache = BulletCache(
+    os.path.join(CACHE_DIR, "bullet_cache.json"),
+    max_entries=BULLET_CACHE_MAX_ENTRIES,
+    ttl_seconds=BULLET_CACHE_TTL_HOURS * 3600
+)
+
+# Leadership and involvement entries are reviewed as experiences
+EXPERIENCE_KINDS = ["experience", "leadership"]
+PROJECT_KINDS = ["projects"]
+
+def _resume_entries(sections):
+    """(kind, entry) for every entry with bullets, experiences first and then projects"""
+    for kinds, kind in [(EXPERIENCE_KINDS, "experience"), (PROJECT_KINDS, "project")]:
+        for section in sections:
+            if section.kind in kinds:
+                for entry in section.entries:
+                    if entry.bullets:
+                        yield kind, entry
+
+def _describe_extracted_entries(sections):
+    """The experience and project bullets found by the section parser, or None if it found none"""
+    # Only the entries with bullets, the same ones and in the same order as the fan-out requests,
+    # so the n-th entry in a response is the n-th from _resume_entries
+    described = {"experience": [], "project": []}
+    for kind, entry in _resume_entries(sections):
+        described[kind].append(describe_entry(entry))
+    if not any(described.values()):
+        return None
+    experiences = "\n".join(described["experience"]) or "(none found)"
+    projects = "\n".join(described["project"]) or "(none found)"
+    return f"""These experience and project entries were extracted from the resume, each entry's header line followed by its bullets.
+    Review exactly these entries and bullets, using each bullet's text verbatim as its content. Entries under leadership or involvement headings count as experiences.
+    Experiences:
+    {experiences}
+    Projects:
+    {projects}"""
+
+def _prompt_base(job_title: str = None, company: str = None, min_qual: str = None, pref_qual: str = None):
+    """Job details with defaults filled in, the reference artifacts and the two halves of the system prompt"""
     job_details = {
         "job_title": "Software Engineer" if job_title is None else job_title,
         "company": "Google" if company is None else company,
@@ -31,29 +168,8 @@ def review_resume(resume_user: bytes, resume_jake: bytes, job_title: str = None,
         "pref_qual": "Advanced Coursework: Completed coursework or have practical experience in advanced computer science topics such as distributed systems, machine learning, or security.\nTechnical Experience: Internships or co-op experience in a software development role, or significant contributions to open-source projects.\nCoding Competitions: Participation in coding competitions or technical challenges, such as competitive programming or hackathons.\nProject Experience: Demonstrated experience with complex software projects, either through internships, personal projects, or academic coursework.\nSoft Skills: Proven ability to take initiative, manage multiple tasks effectively, and adapt to new challenges in a fast-paced environment.\nLeadership and Impact: Experience in leadership roles, or demonstrated impact through technical or non-technical contributions." if pref_qual is None else pref_qual
     }
 
-    extracted_data_jake_resume = extract_text_and_formatting(resume_jake)
-
-    logger.debug(f"Extracted data: {extracted_data_jake_resume}")
-
-    if not isinstance(extracted_data_jake_resume, dict):
-        logger.error("Extracted Jake resume data is not a dictionary.")
-        raise ValueError("Extracted Jake resume data must be a dictionary.")
-
-    formatting_info_jake_resume = extracted_data_jake_resume["formatting"]
-
-    # Example of processing formatting_info
-    for index, item in enumerate(formatting_info_jake_resume):
-        # Ensure item is a dictionary
-        if isinstance(item, dict):
-            text = item.get("text")
-            font = item.get("font")
-            size = item.get("size")
-            bbox = item.get("bbox")
-            
-            # Log the extracted formatting information
-            logger.info(f"Formatting info [{index}]: text='{text}', font='{font}', size={size}, bbox={bbox}")
-        else:
-            logger.error(f"Formatting info item at index {index} is not a dictionary: {item}")
+    # Jake's resume never changes, so its text, spans, image and token count are precomputed
+    reference = get_reference_artifacts()
 
     # Add information from the PDFs
     dos_and_donts = """
@@ -129,12 +245,12 @@ def review_resume(resume_user: bytes, resume_jake: bytes, job_title: str = None,
        - If you run out of space, you can create 2 columns
     """
 
-    system_prompt = f"""
-    You are an expert resume reviewer for a {job_details["job_title"]} internship or new grad role at {job_details["company"]}. Your review should be highly detailed and focused on the following aspects:
+    # The system prompt is identical for every review so Anthropic can cache it. Anything
+    # job-specific belongs in the user prompt, after the cache breakpoints.
+    system_prompt_head = f"""
+    You are an expert resume reviewer for internship and new grad roles. The target role, company and job qualifications are given with each resume. Your review should be highly detailed and focused on the following aspects:
 
     Ensure the resume aligns with the job's qualifications.
-    - Minimum Qualifications: {job_details["min_qual"]}
-    - Preferred Qualifications: {job_details["pref_qual"]}
 
     Here are the key guidelines for resume writing:
 
@@ -145,30 +261,31 @@ def review_resume(resume_user: bytes, resume_jake: bytes, job_title: str = None,
     Resume sections should be in this order:
     {resume_sections}
 
-    Here are the extracted text elements of the default resume for comparison:
-    {json.dumps(extracted_data_jake_resume, indent=2)}
+    Here are the extracted text lines of the default resume for comparison. {FORMAT_DESCRIPTION}
+    """
+    system_prompt_tail = """
 
     Here are your guidelines for a great bullet point:
-    - It starts with a strong, relevant action verb that pertains to {job_details["job_title"]} or related technical roles.
-    - It is specific, technical, and directly related to {job_details["job_title"]} tasks or achievements.
-    - It talks about significant, measurable achievements within a {job_details["job_title"]} context.
+    - It starts with a strong, relevant action verb that pertains to the target role or related technical roles.
+    - It is specific, technical, and directly related to the target role's tasks or achievements.
+    - It talks about significant, measurable achievements within the target role's context.
     - It is concise and professional. No fluff or irrelevant details.
-    - If possible, it quantifies impact, especially in technical or {job_details["job_title"]}-related terms.
+    - If possible, it quantifies impact, especially in technical or role-related terms.
     - Two lines or less.
     - Does not have excessive white space.
-    - Avoids any mention of irrelevant skills, hobbies, or experiences that do not directly contribute to a {job_details["job_title"]} role.
+    - Avoids any mention of irrelevant skills, hobbies, or experiences that do not directly contribute to the target role.
 
     Here are your guidelines for giving feedback:
     - Be kind, but firm.
     - Be specific.
     - Be actionable.
-    - Ask questions like "how many...", "how much...", "what was the technical impact...", "how did this experience contribute to your {job_details["job_title"]} skills...".
-    - Be critical about the relevance of the content to a {job_details["job_title"]} role.
+    - Ask questions like "how many...", "how much...", "what was the technical impact...", "how did this experience contribute to your skills for the target role...".
+    - Be critical about the relevance of the content to the target role.
     - If the bullet point is NOT a 10/10, then the last sentence of your feedback MUST be an actionable improvement item focused on how to make the experience or achievement more relevant to software engineering.
 
     Here are your guidelines for rewriting bullet points:
-    - If the original bullet point is a 10/10 and highly relevant to {job_details["job_title"]}, do NOT suggest any rewrites.
-    - If the original bullet point is not a 10/10 or not relevant to {job_details["job_title"]}, suggest 1-2 rewrite options that make the content more technical, professional, and directly related to the field.
+    - If the original bullet point is a 10/10 and highly relevant to the target role, do NOT suggest any rewrites.
+    - If the original bullet point is not a 10/10 or not relevant to the target role, suggest 1-2 rewrite options that make the content more technical, professional, and directly related to the field.
     - Be 1000% certain that the rewrites address all of your feedback.
 
     Here are your guidelines for great formatting:
@@ -182,7 +299,7 @@ def review_resume(resume_user: bytes, resume_jake: bytes, job_title: str = None,
     Here are your guidelines for giving formatting feedback:
     - Compare the user's resume formatting to the default resume.
     - Identify specific formatting issues in the user's resume.
-    - Explain why each identified issue is problematic for a {job_details["job_title"]} resume.
+    - Explain why each identified issue is problematic for a resume targeting this role.
     - Be precise in describing the location and nature of formatting problems.
     - Acknowledge any formatting aspects that are well-executed.
 
@@ -190,16 +307,19 @@ def review_resume(resume_user: bytes, resume_jake: bytes, job_title: str = None,
     - If the formatting is a 10/10, do not suggest any improvements.
     - If the formatting is not a 10/10, provide 1-2 suggestions that are clear, specific, and actionable to address each formatting issue.
     - Explain how each improvement will enhance the resume's readability and professionalism.
-    - Prioritize formatting changes that will have the most impact for a {job_details["job_title"]} position.
+    - Prioritize formatting changes that will have the most impact for the target role.
     - If applicable, reference the default resume as an example of good formatting.
     - Suggest tools or techniques (e.g., specific word processor features) that can help implement the improvements.
     - Emphasize the importance of consistency throughout the resume.
     """
-    # Check if the resume is a single page
-    is_single_page_user_resume = check_single_page(resume_user )
+    return job_details, reference, system_prompt_head, system_prompt_tail
+
+def _formatting_prompt_parts(user_document: ResumeDocument, layout_aspects, only=None):
+    """The page count feedback, formatting schema and measured aspects for the formatting prompt"""
+    is_single_page_user_resume = user_document.is_single_page
 
     # Extract text and formatting information
-    extracted_data_user_resume = extract_text_and_formatting(resume_user)
+    extracted_data_user_resume = user_document.extracted_data
 
     logger.debug(f"Extracted data: {extracted_data_user_resume}")
 
@@ -235,18 +355,31 @@ def review_resume(resume_user: bytes, resume_jake: bytes, job_title: str = None,
         additional_feedback = "Your resume is appropriately formatted to fit on a single page."
 
 
-    logger.info("FONT CONSISTENCY: ", font_consistency_feedback['feedback'])
+    logger.info("FONT CONSISTENCY: %s", font_consistency_feedback['feedback'])
+
+    layout_aspects = layout_aspects or {}
+    formatting_schema = _formatting_schema(layout_aspects, is_single_page_user_resume, additional_feedback, only)
+    measured_formatting = _describe_measured_formatting(layout_aspects)
+    return additional_feedback, formatting_schema, measured_formatting
+
+def build_review_request(user_document: ResumeDocument, job_title: str = None, company: str = None, min_qual: str = None, pref_qual: str = None, layout_aspects=None) -> tuple[list, list]:
+    job_details, reference, system_prompt_head, system_prompt_tail = _prompt_base(job_title, company, min_qual, pref_qual)
+    system_prompt = system_prompt_head + reference.formatting_text + system_prompt_tail
+    additional_feedback, formatting_schema, measured_formatting = _formatting_prompt_parts(user_document, layout_aspects)
+    extracted_entries = _describe_extracted_entries(user_document.sections) or ""
 
     user_prompt = f"""
-    Please review this resume for the role of {job_title} at {company}. 
-    The first image is the user's resume, and the second image is the default resume for comparison.
+    Please review this resume for a {job_details["job_title"]} internship or new grad role at {job_details["company"]}.
+    The first image is the default resume for comparison, and the second image is the user's resume.
     The job's minimum qualifications are as follows:
-    {min_qual}
+    {job_details["min_qual"]}
     The job's preferred qualifications are as follows:
-    {pref_qual}
-    Here are the extracted text elements with their bounding box information:
-    {json.dumps(extracted_data_user_resume, indent=2)}
+    {job_details["pref_qual"]}
+    Here are the extracted text lines of this resume. {FORMAT_DESCRIPTION}
+    {user_document.compact_formatting}
     Additional feedback: {additional_feedback}
+    {measured_formatting}
+    {extracted_entries}
     Now, compare the formatting of this resume with the default resume data provided in the system prompt.
     Only return JSON that respects the following schema:
     experiences: [
@@ -277,65 +410,752 @@ def review_resume(resume_user: bytes, resume_jake: bytes, job_title: str = None,
         }}
     ],
     formatting: {{
-        font_consistency: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
-        font_choice: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
-        font_size: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
-        alignment: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
-        margins: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
-        line_spacing: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
-        section_spacing: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
-        headings: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
-        bullet_points: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
-        contact_information: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
-        overall_layout: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
-        page_utilization: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
-        is_single_page: {{ issue: {not is_single_page_user_resume}, feedback: {additional_feedback}, suggestions: [string, string], score: {10 if is_single_page_user_resume else 0} }},
-        consistency: {{ issue: boolean, feedback: string, suggestions: [string, string], score: number }},
+{formatting_schema}
         overall_score: number
     }}
     """
 
-    image_base64_user_resume = convert_pdf_to_image(resume_user)
-    image_base64_jake_resume = convert_pdf_to_image(resume_jake)
+    user_image = user_document.image
+    if user_image is None:
+        raise ValueError("PDF has no pages to render")
+    logger.info(f"User resume image: {user_image}")
     
+    # The default resume comes first so the static prefix (system prompt + reference image)
+    # can be served from Anthropic's prompt cache
+    system = [
+        cache_breakpoint({'type': 'text', 'text': system_prompt})
+    ]
     messages = [
         {
             'role': 'user',
             'content': [
-                {'type': 'text', 'text': f"Here is the user's resume: "},
-                {'type': 'image', 'source': {'data': image_base64_user_resume, 'media_type': 'image/png', 'type': 'base64'}},
-                {'type': 'text', 'text': f"Here is the default resume: "},
-                {'type': 'image', 'source': {'data': image_base64_jake_resume, 'media_type': 'image/png', 'type': 'base64'}},  
-                {'type': 'text', 'text': user_prompt}       
+                {'type': 'text', 'text': _image_intro("Here is the default resume", reference.image)},
+                cache_breakpoint(_image_block(reference.image)),
+                {'type': 'text', 'text': _image_intro("Here is the user's resume", user_image)},
+                _image_block(user_image),
+                {'type': 'text', 'text': user_prompt}
             ]
         }
     ]
 
     encoding = tiktoken.encoding_for_model("gpt-4o")
-    num_tokens = len(encoding.encode(user_prompt)) + len(encoding.encode(system_prompt))
+    num_tokens = len(encoding.encode(user_prompt)) + len(encoding.encode(system_prompt_head)) + reference.token_count + len(encoding.encode(system_prompt_tail))
     logger.info(f"Number of tokens in user and system prompt: {num_tokens}")
-    
+    logger.info(f"Estimated image tokens: {reference.image.estimated_tokens + user_image.estimated_tokens}")
+
+    return system, messages
+
+BULLETS_SCHEMA = """bullets: [
+        {
+            content: string,
+            feedback: string,
+            rewrites: [string, string],
+            score: number
+        }
+    ],"""
+
+class SectionRequest:
+    """One of the concurrent requests of a fan-out review and the model its answer must validate as"""
+    def __init__(self, kind, model, max_tokens, system, messages, entry=None, cached=None, base=None, tool=None):
+        # "experience", "project" or "formatting"
+        self.kind = kind
+        self.model = model
+        # The tool the answer is submitted through when structured output is on
+        self.tool = tool
+        self.max_tokens = max_tokens
+        self.system = system
+        self.messages = messages
+        # For entries, the parsed entry and cached feedback for each of its bullets (None if not cached)
+        self.entry = entry
+        self.cached = cached
+        # For formatting, earlier feedback on the aspects that aren't requested again
+        self.base = base
+        # A result that is already known, so the request doesn't have to be sent
+        self.reuse = None
+
+# The model each kind of entry is validated as, and the schema lines for its name
+ENTRY_MODELS = {
+    "experience": (ResumeExperience, "company: string,\n    role: string"),
+    "project": (ResumeProject, "title: string"),
+}
+
+def _entry_prompt(kind, entry, schema, job_details):
+    if not entry.bullets:
+        return f"""
+    Here is the header line of a {kind} from a resume. Its bullets have already been reviewed.
+{describe_entry(entry)}
+    Only return JSON that respects the following schema, with an empty bullets list:
+    {{
+    bullets: [],
+    {schema}
+    }}
+    """
+    return f"""
+    Please review this {kind} from a resume for a {job_details["job_title"]} internship or new grad role at {job_details["company"]}.
+    The job's minimum qualifications are as follows:
+    {job_details["min_qual"]}
+    The job's preferred qualifications are as follows:
+    {job_details["pref_qual"]}
+    Here is the {kind}, its header line followed by its bullets:
+{describe_entry(entry)}
+    Review every bullet, using each bullet's text verbatim as its content.
+    Only return JSON that respects the following schema:
+    {{
+    {BULLETS_SCHEMA}
+    {schema}
+    }}
+    """
+
+def build_section_requests(user_document: ResumeDocument, job_title: str = None, company: str = None, min_qual: str = None, pref_qual: str = None, layout_aspects=None, cached_bullets=None, formatting_aspects=None, formatting_base=None) -> list[SectionRequest]:
+    """Split a review into one request per experience and project entry plus one for the formatting.
+
+    Every request shares the cached system prompt. Only the formatting request carries the images,
+    and each entry request only carries those of its bullets that aren't in cached_bullets, a dict
+    of (kind, bullet text) to feedback. If formatting_aspects is given, only those aspects are
+    requested and the rest are taken from formatting_base.
+    """
+    cached_bullets = cached_bullets or {}
+    job_details, reference, system_prompt_head, system_prompt_tail = _prompt_base(job_title, company, min_qual, pref_qual)
+    system = [
+        cache_breakpoint({'type': 'text', 'text': system_prompt_head + reference.formatting_text + system_prompt_tail})
+    ]
+    requests = []
+    for kind, entry in _resume_entries(user_document.sections):
+        model, schema = ENTRY_MODELS[kind]
+        cached = [cached_bullets.get((kind, bullet)) for bullet in entry.bullets]
+        uncached = ResumeEntry(entry.header, [bullet for bullet, feedback in zip(entry.bullets, cached) if feedback is None])
+        prompt = _entry_prompt(kind, uncached, schema, job_details)
+        max_tokens = 2048 if uncached.bullets else 256
+        tool = _feedback_tool(f"submit_{kind}_feedback", _json_schema(model))
+        requests.append(SectionRequest(kind, model, max_tokens, system, [{'role': 'user', 'content': prompt}], entry, cached, tool=tool))
+
+    user_image = user_document.image
+    if user_image is None:
+        raise ValueError("PDF has no pages to render")
+    additional_feedback, formatting_schema, measured_formatting = _formatting_prompt_parts(user_document, layout_aspects, formatting_aspects)
+    formatting_prompt = f"""
+    Please review the formatting of this resume for a {job_details["job_title"]} internship or new grad role at {job_details["company"]}.
+    The first image is the default resume for comparison, and the second image is the user's resume.
+    Here are the extracted text lines of this resume. {FORMAT_DESCRIPTION}
+    {user_document.compact_formatting}
+    Additional feedback: {additional_feedback}
+    {measured_formatting}
+    Now, compare the formatting of this resume with the default resume data provided in the system prompt.
+    Only return JSON that respects the following schema:
+    {{
+{formatting_schema}
+        overall_score: number
+    }}
+    """
+    messages = [
+        {
+            'role': 'user',
+            'content': [
+                {'type': 'text', 'text': _image_intro("Here is the default resume", reference.image)},
+                cache_breakpoint(_image_block(reference.image)),
+                {'type': 'text', 'text': _image_intro("Here is the user's resume", user_image)},
+                _image_block(user_image),
+                {'type': 'text', 'text': formatting_prompt}
+            ]
+        }
+    ]
+    tool = _feedback_tool("submit_formatting_feedback", _formatting_tool_schema(layout_aspects or {}, formatting_aspects))
+    requests.append(SectionRequest("formatting", FormattingFeedback, 4096, system, messages, base=formatting_base, tool=tool))
+    logger.info(f"Fan-out review: {', '.join(request.kind for request in requests)}")
+    return requests
+
+# Paths in the streamed feedback JSON that are rendered as soon as they are complete
+STREAM_WATCH_PATHS = [("experiences", "*"), ("projects", "*"), ("formatting", "*")]
+
+def _merge_measured_aspect(measured, value=None):
+    """Keep the measured score and issue, with the model's explanation of an issue if it wrote one"""
+    aspect = dict(measured)
+    if measured["issue"] and value and value.get("feedback"):
+        aspect["feedback"] = value["feedback"]
+        aspect["suggestions"] = value.get("suggestions", [])
+    return aspect
+
+def _streamed_event(path, value, layout_aspects=None):
+    """Turn a completed value from the stream into a (kind, payload) review event"""
     try:
-        completion = get_chat_completion(max_tokens=8192, messages=messages, system=system_prompt, temperature=0.25)
-        logger.info(f"Result structure: {completion}")
-        
-        # The completion should be a JSON string directly from the API
+        if path[0] == "experiences":
+            return "experience", ResumeExperience(**value).dict()
+        if path[0] == "projects":
+            return "project", ResumeProject(**value).dict()
+        if path[0] == "formatting" and isinstance(value, dict):
+            if layout_aspects and path[1] in layout_aspects:
+                value = _merge_measured_aspect(layout_aspects[path[1]], value)
+            return "formatting_aspect", (path[1], FormattingAspect(**value).dict())
+    except (TypeError, ValidationError) as e:
+        logger.warning(f"Skipping invalid streamed value at {path}: {e}")
+    return None
+
+def _parse_json_object(completion):
+    # The completion should be a JSON object, possibly wrapped in a markdown code fence
+    try:
+        return json.loads(completion[completion.find("{"):completion.rfind("}") + 1])
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse JSON from completion: {e}")
+        logger.error(f"Raw completion: {completion}")
+        raise ValueError(f"Invalid JSON response from API: {e}")
+
+def _merge_formatting(formatting, layout_aspects):
+    if isinstance(formatting, dict):
+        for name, measured in layout_aspects.items():
+            formatting[name] = _merge_measured_aspect(measured, formatting.get(name))
+    return formatting
+
+def _bullet_scope(kind, context):
+    # Feedback from the fast model isn't reused for detailed reviews and vice versa
+    return BulletCache.make_scope(kind, context.job_kwargs.get("job_title"), f"{PROMPT_VERSION}:{section_model_tier(kind, context)}")
+
+def _lookup_cached_bullets(sections, context, near_duplicates=True):
+    """Cached feedback by (kind, bullet text) for the resume's bullets, and how many were exact and near hits"""
+    cached_bullets = {}
+    stats = {"hits": 0, "near_hits": 0, "misses": 0}
+    for kind, entry in _resume_entries(sections):
+        scope = _bullet_scope(kind, context)
+        for bullet in entry.bullets:
+            # Near duplicates only come from the same user's earlier reviews
+            found = bullet_cache.get(scope, bullet, near_duplicates=near_duplicates, owner=str(context.user_id))
+            if found is None:
+                stats["misses"] += 1
+                continue
+            feedback, exact = found
+            stats["hits" if exact else "near_hits"] += 1
+            # Near duplicates keep their feedback, but show the bullet as it is on this resume
+            cached_bullets[(kind, bullet)] = {**feedback, "content": bullet}
+    return cached_bullets, stats
+
+def _merge_cached_bullets(request, result):
+    """Put the cached bullets back in between the model's feedback on the new ones"""
+    new_bullets = result.get("bullets") or []
+    if len(new_bullets) != request.cached.count(None):
+        raise ValueError(f"Expected feedback on {request.cached.count(None)} bullets, got {len(new_bullets)}")
+    new_bullets = iter(new_bullets)
+    result["bullets"] = [next(new_bullets) if cached is None else cached for cached in request.cached]
+    return result
+
+async def _request_section(request, layout_aspects, context):
+    """Run one fan-out request, retrying only this section if its answer doesn't validate"""
+    if request.reuse is not None:
+        return request.reuse
+    for attempt in range(REVIEW_SECTION_ATTEMPTS):
+        context.raise_if_cancelled()
+        completion = await get_chat_completion(
+            max_tokens=request.max_tokens, messages=request.messages, system=request.system, temperature=0.25,
+            model=section_model_tier(request.kind, context), tool=request.tool
+        )
         try:
-            result = json.loads(completion)
+            with context.timed("parse_feedback"):
+                result = _parse_json_object(completion)
+                if request.kind == "formatting":
+                    return request.model(**_merge_formatting({**(request.base or {}), **result}, layout_aspects))
+                section = request.model(**_merge_cached_bullets(request, result))
+        except (TypeError, ValueError) as e:
+            # ValidationError is a ValueError too
+            logger.warning(f"Review {context.review_id}: invalid {request.kind} feedback (attempt {attempt + 1} of {REVIEW_SECTION_ATTEMPTS}): {e}")
+            if attempt + 1 >= REVIEW_SECTION_ATTEMPTS:
+                raise
+            continue
+        scope = _bullet_scope(request.kind, context)
+        for text, cached, bullet in zip(request.entry.bullets, request.cached, section.bullets):
+            if cached is None:
+                bullet_cache.put(scope, text, bullet.dict(), owner=str(context.user_id))
+        return section
+
+def _cancel_section_tasks(tasks):
+    for task in tasks:
+        if task.done() and not task.cancelled():
+            # Retrieve failures of sections that were never awaited so they aren't logged as unhandled
+            task.exception()
+        else:
+            task.cancel()
+
+async def _fan_out_review_stream(user_document, layout_aspects, context):
+    """Review each entry and the formatting in concurrent requests, yielding events in section order"""
+    loop = asyncio.get_running_loop()
+    with context.timed("prepare"):
+        # Only bullets that are new or changed since an earlier review go to the model
+        cached_bullets, bullet_stats = _lookup_cached_bullets(user_document.sections, context)
+        logger.info(f"Review {context.review_id} bullet cache: {bullet_stats}")
+        requests = await loop.run_in_executor(
+            None,
+            functools.partial(build_section_requests, user_document, layout_aspects=layout_aspects, cached_bullets=cached_bullets, **context.job_kwargs)
+        )
+    context.raise_if_cancelled()
+
+    # Requests are built experiences first, then projects, then formatting, which is the order
+    # the renderer needs; they all run at once, so the review takes as long as the slowest one
+    tasks = [asyncio.create_task(_request_section(request, layout_aspects, context)) for request in requests]
+    feedback = {"experiences": [], "projects": [], "formatting": None}
+    try:
+        with context.timed("model"):
+            for request, task in zip(requests, tasks):
+                section = await task
+                context.raise_if_cancelled()
+                if "first_feedback" not in context.timings:
+                    context.timings["first_feedback"] = time.monotonic() - context.created_at
+                if request.kind == "formatting":
+                    feedback["formatting"] = section.dict()
+                    for name, aspect in feedback["formatting"].items():
+                        if isinstance(aspect, dict):
+                            yield "formatting_aspect", (name, aspect)
+                else:
+                    feedback[f"{request.kind}s"].append(section.dict())
+                    yield request.kind, section.dict()
+    finally:
+        _cancel_section_tasks(tasks)
+
+    analytics.track_bullet_cache(**bullet_stats)
+    await bullet_cache.save()
+    resume_feedback = ResumeFeedback(**feedback)
+    logger.info("Resume reviewed and feedback generated successfully")
+    yield "feedback", {**resume_feedback.dict(), "outline": resume_outline(user_document)}
+
+def _review_tool_schema(layout_aspects):
+    """JSON schema of the whole review, as asked for by build_review_request"""
+    return {
+        "type": "object",
+        "properties": {
+            "experiences": {"type": "array", "items": _json_schema(ResumeExperience)},
+            "projects": {"type": "array", "items": _json_schema(ResumeProject)},
+            "formatting": _formatting_tool_schema(layout_aspects)
+        },
+        "required": ["experiences", "projects", "formatting"]
+    }
+
+async def _single_review_stream(user_document, layout_aspects, context):
+    """Review the whole resume in one streamed request"""
+    # Building the prompt counts tokens, which is blocking, so keep it off the event loop
+    loop = asyncio.get_running_loop()
+    with context.timed("prepare"):
+        system, messages = await loop.run_in_executor(
+            None,
+            functools.partial(build_review_request, user_document, layout_aspects=layout_aspects, **context.job_kwargs)
+        )
+    context.raise_if_cancelled()
+
+    tool = _feedback_tool("submit_resume_feedback", _review_tool_schema(layout_aspects))
+    parser = IncrementalJSONParser(STREAM_WATCH_PATHS)
+    # Sections that validated as they streamed in, kept in case the whole response doesn't
+    salvaged = {"experience": {}, "project": {}, "formatting": {}}
+    # Entry positions and aspect names already shown. After an entry that doesn't validate nothing
+    # more is shown, since it's requested again and has to be shown before what follows it.
+    shown = {"experience": set(), "project": set(), "formatting": set()}
+    holding = False
+    with context.timed("model"):
+        # The whole review is one request, so it runs on the formatting tier, which sees the images
+        model = section_model_tier("formatting", context)
+        async for text in stream_chat_completion(max_tokens=8192, messages=messages, system=system, temperature=0.25, model=model, tool=tool):
+            context.raise_if_cancelled()
+            for path, value in parser.feed(text):
+                event = _streamed_event(path, value, layout_aspects)
+                if event is None:
+                    holding = holding or path[0] in ("experiences", "projects")
+                    continue
+                if event[0] == "formatting_aspect":
+                    salvaged["formatting"][event[1][0]] = event[1][1]
+                else:
+                    salvaged[event[0]][path[1]] = event[1]
+                if holding:
+                    continue
+                if "first_feedback" not in context.timings:
+                    context.timings["first_feedback"] = time.monotonic() - context.created_at
+                if event[0] != "formatting_aspect":
+                    shown[event[0]].add(path[1])
+                    yield event
+                    continue
+                # Measured aspects without issues are shown once the formatting feedback has started
+                for name, measured in layout_aspects.items():
+                    if not measured["issue"] and name not in shown["formatting"]:
+                        shown["formatting"].add(name)
+                        yield "formatting_aspect", (name, measured)
+                if event[1][0] not in shown["formatting"]:
+                    shown["formatting"].add(event[1][0])
+                    yield event
+
+    completion = parser.buffer.strip()
+    logger.info(f"Result structure: {completion}")
+    result = None
+    try:
+        with context.timed("parse_feedback"):
+            result = _parse_json_object(completion)
             logger.info(f"Parsed result: {result}")
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON from completion: {e}")
-            logger.error(f"Raw completion: {completion}")
-            raise ValueError(f"Invalid JSON response from API: {e}")
-        
-        resume_feedback = ResumeFeedback(**result)
-        logger.info("Resume reviewed and feedback generated successfully")
-        resume_feedback_model = resume_feedback.dict()
-        logger.info(resume_feedback_model)
-        return resume_feedback.dict()
+            _merge_formatting(result.get("formatting"), layout_aspects)
+            resume_feedback_model = ResumeFeedback(**result).dict()
+        # Measured aspects the model had nothing to add to
+        for event in _unshown_events(resume_feedback_model, shown):
+            yield event
+    except (TypeError, ValueError) as e:
+        # Truncated at max_tokens or partly invalid: keep what validated and ask for the rest
+        logger.warning(f"Review {context.review_id}: response didn't validate as a whole, salvaging its valid sections: {e}")
+        formatting = (result or {}).get("formatting") if isinstance(result, dict) else None
+        overall_score = formatting.get("overall_score") if isinstance(formatting, dict) else None
+        async for event in _complete_salvaged_review(user_document, layout_aspects, context, salvaged, overall_score, shown):
+            if event[0] == "feedback":
+                resume_feedback_model = event[1]
+            else:
+                yield event
+    logger.info("Resume reviewed and feedback generated successfully")
+    logger.info(resume_feedback_model)
+    yield "feedback", {**resume_feedback_model, "outline": resume_outline(user_document)}
+
+def _section_events(kind, position, section, shown):
+    """Events for the parts of a section that haven't been shown yet, marking them as shown"""
+    if kind != "formatting":
+        if position not in shown[kind]:
+            shown[kind].add(position)
+            yield kind, section
+        return
+    for name in FormattingFeedback.__fields__:
+        if name != "overall_score" and name not in shown["formatting"]:
+            shown["formatting"].add(name)
+            yield "formatting_aspect", (name, section[name])
+
+def _unshown_events(feedback, shown):
+    """Events for the parts of a review that haven't been shown yet, in the order they are rendered"""
+    for kind in ["experience", "project"]:
+        for position, section in enumerate(feedback[f"{kind}s"]):
+            yield from _section_events(kind, position, section, shown)
+    yield from _section_events("formatting", None, feedback["formatting"], shown)
+
+async def _complete_salvaged_review(user_document, layout_aspects, context, salvaged, overall_score=None, shown=None):
+    """Request only the sections missing from a review whose single response was cut off or
+    partly invalid, yielding the events of sections not in `shown` in order and then
+    ("feedback", dict) for the whole review"""
+    shown = shown or {"experience": set(), "project": set(), "formatting": set()}
+    if not _describe_extracted_entries(user_document.sections):
+        # Without the parsed entries there's no telling which ones the model skipped
+        raise ValueError("Review response was incomplete and no entries were extracted to request again")
+    formatting_base = {**layout_aspects, **salvaged["formatting"]}
+    missing_aspects = [name for name in FormattingFeedback.__fields__ if name != "overall_score" and name not in formatting_base]
+    loop = asyncio.get_running_loop()
+    with context.timed("prepare"):
+        requests = await loop.run_in_executor(
+            None,
+            functools.partial(
+                build_section_requests, user_document, layout_aspects=layout_aspects,
+                formatting_aspects=missing_aspects, formatting_base=formatting_base, **context.job_kwargs
+            )
+        )
+    # Entries were reviewed in the order they were extracted, so the n-th salvaged one is the n-th entry
+    positions = {"experience": 0, "project": 0}
+    for request in requests:
+        if request.kind == "formatting":
+            if not missing_aspects and isinstance(overall_score, (int, float)):
+                request.reuse = FormattingFeedback(**formatting_base, overall_score=overall_score)
+            continue
+        section = salvaged[request.kind].get(positions[request.kind])
+        positions[request.kind] += 1
+        if section is not None:
+            request.reuse = request.model(**section)
+    logger.info(f"Review {context.review_id}: requesting {sum(request.reuse is None for request in requests)} of {len(requests)} sections again")
+
+    tasks = [asyncio.create_task(_request_section(request, layout_aspects, context)) for request in requests]
+    feedback = {"experiences": [], "projects": [], "formatting": None}
+    try:
+        with context.timed("model"):
+            for request, task in zip(requests, tasks):
+                section = (await task).dict()
+                context.raise_if_cancelled()
+                if request.kind == "formatting":
+                    feedback["formatting"] = section
+                    position = None
+                else:
+                    position = len(feedback[f"{request.kind}s"])
+                    feedback[f"{request.kind}s"].append(section)
+                for event in _section_events(request.kind, position, section, shown):
+                    yield event
+    finally:
+        _cancel_section_tasks(tasks)
+    yield "feedback", ResumeFeedback(**feedback).dict()
+
+async def _parse_and_measure(resume_user, context):
+    """Parse the resume and score its layout aspects locally"""
+    # Parse the resume once, in a worker process, for its page count, text, formatting and image
+    with context.timed("parse"):
+        user_document = await pdf_worker_pool.parse(resume_user)
+    context.raise_if_cancelled()
+
+    # Layout aspects are scored locally against the reference, the model only explains issues
+    reference = get_reference_artifacts()
+    with context.timed("layout"):
+        layout_metrics = user_document.layout_metrics
+        layout_aspects = score_layout(layout_metrics, reference.layout_metrics) if layout_metrics else {}
+    return user_document, layout_aspects
+
+TRIAGE_SYSTEM_PROMPT = """You triage documents uploaded to a resume review bot. Decide whether the document is a resume and give it a quick overall score from 0 to 10, where 10 is a polished resume ready to send to recruiters. Answer with a JSON object in this format and nothing else:
+{
+  "is_resume": boolean,
+  "reason": string,
+  "overall_score": number,
+  "summary": string
+}"""
+
+async def triage_resume(user_document, context):
+    """Check with the fast model that the document is a resume and get a quick overall score"""
+    sections = describe_sections(user_document.sections)
+    message = f"Extracted sections:\n{sections}\n\nFull text:\n{user_document.text[:6000]}"
+    if context.job_kwargs.get("job_title"):
+        message = f"The candidate is applying to be a {context.job_kwargs['job_title']}.\n\n{message}"
+    with context.timed("triage"):
+        completion = await get_chat_completion(
+            max_tokens=512, messages=[{"role": "user", "content": message}], system=TRIAGE_SYSTEM_PROMPT,
+            temperature=0, model=TRIAGE_MODEL_TIER, tool=_feedback_tool("submit_triage", _json_schema(ResumeTriage))
+        )
+    return ResumeTriage(**_parse_json_object(completion))
+
+async def review_resume_stream(resume_user: bytes, context: ReviewContext):
+    """Review a resume, yielding a ("triage", dict) event with a quick score, then ("experience" |
+    "project" | "formatting_aspect", payload) events as each part of the feedback is generated,
+    followed by a final ("feedback", dict) event. Raises NotAResumeError if triage rejects the PDF.
+    If triage itself fails the review goes ahead without it, on the detailed model."""
+    logger.info(f"Starting resume review process for {context}")
+    logger.info(f"Job title: {context.job_kwargs.get('job_title')}, Company: {context.job_kwargs.get('company')}")
+    user_document, layout_aspects = await _parse_and_measure(resume_user, context)
+
+    try:
+        triage = (await triage_resume(user_document, context)).dict()
+    except ReviewCancelledError:
+        raise
+    except Exception as e:
+        # Triage only routes the review, so a failed one isn't worth failing the review for
+        logger.warning(f"Review {context.review_id} triage failed, reviewing on the detailed model without it: {e}")
+        triage = None
+        context.model_tier = "detailed"
+    logger.info(f"Review {context.review_id} triage: {triage}")
+    context.raise_if_cancelled()
+    if triage is not None:
+        if not triage["is_resume"]:
+            raise NotAResumeError(triage["reason"])
+        yield "triage", triage
+
+    # Fanning out needs the entries from the section parser, otherwise the model finds them itself
+    if REVIEW_FAN_OUT and _describe_extracted_entries(user_document.sections):
+        events = _fan_out_review_stream(user_document, layout_aspects, context)
+    else:
+        events = _single_review_stream(user_document, layout_aspects, context)
+    try:
+        async for kind, payload in events:
+            if kind == "feedback":
+                payload = {**payload, "triage": triage}
+            yield kind, payload
+    except ReviewCancelledError:
+        logger.info(f"Review {context.review_id} cancelled: {context.cancel_reason}")
+        raise
     except ValidationError as e:
         logger.error(f"Validation error: {str(e)}")
         raise
     except Exception as e:
         logger.error(f"Error processing resume: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+    finally:
+        await events.aclose()
+
+async def review_resume(resume_user: bytes, context: ReviewContext, on_event=None) -> dict:
+    """Review a resume and return the validated feedback. If given, the on_event coroutine
+    function is awaited with (kind, payload) for each part of the feedback as it streams in."""
+    async for kind, payload in review_resume_stream(resume_user, context):
+        if kind == "feedback":
+            return payload
+        if on_event:
+            await on_event(kind, payload)
+    raise ValueError("Review stream ended without feedback")
+
+
+# Formatting aspects the model looks at again when that part of the resume's fingerprint changes
+FINGERPRINT_ASPECTS = {
+    "fonts": ["font_consistency", "font_choice", "font_size", "consistency"],
+    "headings": ["headings", "overall_layout", "consistency"],
+    "contact": ["contact_information"],
+    "bullets": ["bullet_points", "overall_layout"],
+    "pages": ["is_single_page", "overall_layout"],
+}
+# Rewritten bullets are told apart from new ones by how similar they are to a removed bullet
+REWRITE_SIMILARITY = 0.5
+
+def _formatting_fingerprint(user_document):
+    sections = user_document.sections
+    return {
+        "fonts": sorted({f"{span['font']} {round(span['size'] * 2) / 2:g}" for span in user_document.spans if span["text"].strip()}),
+        "headings": [section.heading for section in sections if section.heading],
+        "contact": next((section.text for section in sections if section.kind == "header"), ""),
+        "bullets": sum(len(entry.bullets) for _, entry in _resume_entries(sections)),
+        "pages": user_document.page_count,
+    }
+
+def resume_outline(user_document):
+    """The reviewed entries and a formatting fingerprint, kept with the feedback so a revision can be diffed against it"""
+    return {
+        "entries": [{"kind": kind, "header": entry.header, "bullets": entry.bullets} for kind, entry in _resume_entries(user_document.sections)],
+        "fingerprint": _formatting_fingerprint(user_document),
+    }
+
+def _entry_name(kind, entry_feedback):
+    if kind == "experience":
+        return f"{entry_feedback.get('company', 'Unknown')} - {entry_feedback.get('role', 'Unknown')}"
+    return entry_feedback.get("title", "Unknown")
+
+def _previous_entries(previous_feedback):
+    """(kind, outline entry, entry feedback) for each entry of an earlier review, or None if it can't be diffed"""
+    outline = previous_feedback.get("outline")
+    if not outline or not outline["entries"]:
+        return None
+    feedback_entries = {"experience": previous_feedback["experiences"], "project": previous_feedback["projects"]}
+    if sum(len(entries) for entries in feedback_entries.values()) != len(outline["entries"]):
+        return None
+    positions = {"experience": 0, "project": 0}
+    entries = []
+    for entry in outline["entries"]:
+        kind = entry["kind"]
+        entry_feedback = feedback_entries[kind][positions[kind]]
+        positions[kind] += 1
+        if len(entry_feedback["bullets"]) != len(entry["bullets"]):
+            return None
+        entries.append((kind, entry, entry_feedback))
+    return entries
+
+def _match_bullets(sections, previous_entries):
+    """Match the revised resume's bullets to the earlier ones.
+
+    Returns a dict of (kind, bullet) to (earlier bullet text, earlier feedback), where the earlier
+    text is None for new bullets, and a list of (kind, entry name, bullet text, earlier feedback) for removed bullets.
+    """
+    unmatched = [
+        (kind, normalize_bullet(text), text, bullet_feedback, _entry_name(kind, entry_feedback))
+        for kind, entry, entry_feedback in previous_entries
+        for text, bullet_feedback in zip(entry["bullets"], entry_feedback["bullets"])
+    ]
+    bullets = [(kind, bullet) for kind, entry in _resume_entries(sections) for bullet in entry.bullets]
+    matches = {}
+    # Unchanged bullets first, so a rewrite can't claim a bullet that is still there
+    for kind, bullet in bullets:
+        normalized = normalize_bullet(bullet)
+        for candidate in unmatched:
+            if candidate[0] == kind and candidate[1] == normalized:
+                unmatched.remove(candidate)
+                matches[(kind, bullet)] = (candidate[2], candidate[3])
+                break
+    for kind, bullet in bullets:
+        if (kind, bullet) in matches:
+            continue
+        normalized = normalize_bullet(bullet)
+        best, best_ratio = None, REWRITE_SIMILARITY
+        for candidate in unmatched:
+            ratio = difflib.SequenceMatcher(None, candidate[1], normalized).ratio() if candidate[0] == kind else 0
+            if ratio >= best_ratio:
+                best, best_ratio = candidate, ratio
+        if best is None:
+            matches[(kind, bullet)] = (None, None)
+        else:
+            unmatched.remove(best)
+            matches[(kind, bullet)] = (best[2], best[3])
+    removed = [(kind, name, text, bullet_feedback) for kind, _, text, bullet_feedback, name in unmatched]
+    return matches, removed
+
+def _affected_formatting(previous_feedback, user_document, layout_aspects):
+    """Formatting aspects the model has to review again after a revision"""
+    previous_fingerprint = previous_feedback["outline"]["fingerprint"]
+    fingerprint = _formatting_fingerprint(user_document)
+    affected = {
+        aspect
+        for part, aspects in FINGERPRINT_ASPECTS.items() if previous_fingerprint.get(part) != fingerprint[part]
+        for aspect in aspects
+    }
+    for name, measured in layout_aspects.items():
+        previous = previous_feedback["formatting"].get(name) or {}
+        # Measured aspects are rescored locally; the model only explains new or changed issues
+        if measured["issue"] and previous.get("score") != measured["score"]:
+            affected.add(name)
+        else:
+            affected.discard(name)
+    return affected
+
+async def review_resume_changes(resume_user: bytes, context: ReviewContext, previous_feedback: dict):
+    """Review a revised resume against the feedback on an earlier version of it.
+
+    Unchanged bullets and formatting aspects keep their earlier feedback; only new and rewritten
+    bullets and the formatting aspects the changes affect are reviewed again. Returns
+    (feedback, changes), or None if the resumes can't be compared and need a full review.
+    """
+    previous_entries = _previous_entries(previous_feedback)
+    if previous_entries is None:
+        return None
+    logger.info(f"Starting incremental review for {context}")
+    user_document, layout_aspects = await _parse_and_measure(resume_user, context)
+    if not _describe_extracted_entries(user_document.sections):
+        return None
+
+    loop = asyncio.get_running_loop()
+    with context.timed("prepare"):
+        matches, removed = _match_bullets(user_document.sections, previous_entries)
+        # New bullets may still have been reviewed for someone else, but rewrites must be looked at again
+        cached_bullets, bullet_stats = _lookup_cached_bullets(user_document.sections, context, near_duplicates=False)
+        for (kind, bullet), (before, bullet_feedback) in matches.items():
+            if before is not None and normalize_bullet(before) == normalize_bullet(bullet):
+                cached_bullets[(kind, bullet)] = {**bullet_feedback, "content": bullet}
+        affected = _affected_formatting(previous_feedback, user_document, layout_aspects)
+        logger.info(f"Review {context.review_id} formatting aspects to review again: {sorted(affected)}")
+        requests = await loop.run_in_executor(
+            None,
+            functools.partial(
+                build_section_requests, user_document, layout_aspects=layout_aspects, cached_bullets=cached_bullets,
+                formatting_aspects=affected, formatting_base=previous_feedback["formatting"], **context.job_kwargs
+            )
+        )
+
+    # Entries whose header and bullets are all unchanged don't need a request at all
+    previous_names = {
+        (kind, tuple(entry["header"])): {key: value for key, value in entry_feedback.items() if key != "bullets"}
+        for kind, entry, entry_feedback in previous_entries
+    }
+    for request in requests:
+        if request.kind == "formatting":
+            if not affected:
+                request.reuse = FormattingFeedback(**_merge_formatting(dict(previous_feedback["formatting"]), layout_aspects))
+        elif None not in request.cached and (request.kind, tuple(request.entry.header)) in previous_names:
+            request.reuse = request.model(bullets=request.cached, **previous_names[(request.kind, tuple(request.entry.header))])
+    logger.info(f"Review {context.review_id}: {sum(request.reuse is None for request in requests)} of {len(requests)} sections need the model")
+
+    tasks = [asyncio.create_task(_request_section(request, layout_aspects, context)) for request in requests]
+    try:
+        with context.timed("model"):
+            results = [await task for task in tasks]
+    finally:
+        _cancel_section_tasks(tasks)
+    context.raise_if_cancelled()
+
+    feedback = {"experiences": [], "projects": [], "formatting": None}
+    changes = {"bullets": [], "removed": [], "formatting": []}
+    for request, result in zip(requests, results):
+        result = result.dict()
+        if request.kind == "formatting":
+            feedback["formatting"] = result
+            for name, aspect in result.items():
+                previous = previous_feedback["formatting"].get(name)
+                if isinstance(aspect, dict) and (name in affected or not previous or previous.get("score") != aspect["score"]):
+                    changes["formatting"].append({"name": name, "before_score": (previous or {}).get("score"), "aspect": aspect})
+            continue
+        feedback[f"{request.kind}s"].append(result)
+        for text, bullet in zip(request.entry.bullets, result["bullets"]):
+            before, before_feedback = matches[(request.kind, text)]
+            if before is not None and normalize_bullet(before) == normalize_bullet(text):
+                continue
+            changes["bullets"].append({
+                "kind": request.kind,
+                "entry": _entry_name(request.kind, result),
+                "before": before,
+                "before_score": before_feedback["score"] if before_feedback else None,
+                "bullet": bullet
+            })
+    changes["removed"] = [
+        {"kind": kind, "entry": name, "content": text, "score": bullet_feedback["score"]}
+        for kind, name, text, bullet_feedback in removed
+    ]
+
+    analytics.track_bullet_cache(**bullet_stats)
+    await bullet_cache.save()
+    resume_feedback = ResumeFeedback(**feedback)
+    logger.info(f"Incremental review done: {len(changes['bullets'])} bullets and {len(changes['formatting'])} formatting aspects changed, {len(changes['removed'])} bullets removed")
+    return {**resume_feedback.dict(), "outline": resume_outline(user_document)}, changes
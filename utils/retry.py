@@ -0,0 +1,135 @@
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: timeouts, conflicts, rate limits, server errors and overloads
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds, or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class RetryPolicy:
+    """Decides whether and when a failed request should be retried"""
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=30.0, max_retry_after=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def is_retryable_status(self, status):
+        return status in RETRYABLE_STATUSES
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait after the given 0-based attempt failed.
+
+        Uses exponential backoff with full jitter, but never waits less than the
+        server's Retry-After (capped at max_retry_after).
+        """
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            return max(backoff, min(retry_after, self.max_retry_after))
+        return backoff
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend that is known to be failing"""
+    def __init__(self, message, retry_in):
+        super().__init__(message)
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """Stops calling a backend after repeated failures and probes it again after a cool-down.
+
+    closed: requests flow normally
+    open: requests fail fast until reset_timeout has passed
+    half_open: a single trial request decides whether to close or re-open
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._trial_started_at = None
+
+    @property
+    def state(self):
+        if self._state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    @property
+    def is_degraded(self):
+        return self.state != self.CLOSED
+
+    def retry_in(self):
+        """Seconds until an open breaker lets a trial request through"""
+        if self._state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (self.clock() - self.opened_at))
+
+    def allow_request(self):
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            # A trial that never reported back (e.g. it was cancelled) must not block forever
+            trial_expired = self._trial_in_flight and self.clock() - self._trial_started_at >= self.reset_timeout
+            if not self._trial_in_flight or trial_expired:
+                self._trial_in_flight = True
+                self._trial_started_at = self.clock()
+                return True
+        return False
+
+    def check(self):
+        """Raise CircuitOpenError if a request should not be sent right now"""
+        if not self.allow_request():
+            raise CircuitOpenError(f"{self.name} is degraded, not sending request", self.retry_in())
+
+    def record_success(self):
+        if self._state != self.CLOSED:
+            logger.info(f"Circuit breaker for {self.name} closed")
+        self._state = self.CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self._state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logger.warning(f"Circuit breaker for {self.name} opened after {self.consecutive_failures} consecutive failures")
+            self._state = self.OPEN
+            self.opened_at = self.clock()
+        self._trial_in_flight = False
+
+    def status(self):
+        """Summary of the breaker for status reports"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in": round(self.retry_in(), 1)
+        }
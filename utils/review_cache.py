@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from utils.json_store import JSONFileStore
+
+logger = logging.getLogger(__name__)
+
+class ReviewCache:
+    """Persistent cache of review results keyed by the resume, job details and prompt version.
+
+    Entries expire after ttl_seconds and the least recently used ones are evicted once
+    there are more than max_entries. Concurrent reviews of the same key are coalesced so
+    only one of them calls the backend. Lookups that find feedback, or join a review in
+    progress, count as hits; only reviews get_or_compute has to run count as misses.
+    """
+    def __init__(self, storage_file, max_entries=500, ttl_seconds=7 * 24 * 3600, clock=time.time):
+        self.storage_file = storage_file
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._store = JSONFileStore(storage_file, name="review cache")
+        self._entries = self._store.load()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(pdf_bytes, job_details, prompt_version):
+        digest = hashlib.sha256()
+        digest.update(pdf_bytes)
+        digest.update(json.dumps(job_details, sort_keys=True).encode('utf-8'))
+        digest.update(str(prompt_version).encode('utf-8'))
+        return digest.hexdigest()
+
+    async def save(self):
+        """Write the cache to disk without blocking the event loop"""
+        await self._store.save(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached feedback for a key, or None if it is missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.clock() - entry["created_at"] > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry["feedback"]
+
+    def put(self, key, feedback):
+        self._entries[key] = {"created_at": self.clock(), "feedback": feedback}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key, compute):
+        """Return (feedback, from_cache). Only one compute() runs per key at a time;
+        other callers for the same key wait for its result."""
+        feedback = self.get(key)
+        if feedback is not None:
+            return feedback, True
+
+        if key in self._inflight:
+            self.hits += 1
+            logger.info("Coalescing review with an identical one already in progress")
+            return await asyncio.shield(self._inflight[key]), True
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting on the shared result, don't warn about unretrieved errors
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            feedback = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._inflight[key]
+
+        future.set_result(feedback)
+        self.put(key, feedback)
+        await self.save()
+        return feedback, False
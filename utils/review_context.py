@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class ReviewCancelledError(Exception):
+    """Raised inside the review pipeline once its review has been cancelled"""
+
+class ReviewContext:
+    """Everything that belongs to a single resume review.
+
+    One context is created per PDF attachment and passed through the queue, the
+    review pipeline and the renderer, so concurrent reviews never share state.
+    """
+    def __init__(self, user_id, guild_id, channel_id, message_id, attachment_name=None, attachment_size=None, attachment_url=None, job_details=None, model_tier="detailed"):
+        self.review_id = uuid.uuid4().hex[:8]
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.attachment_name = attachment_name
+        self.attachment_size = attachment_size
+        self.attachment_url = attachment_url
+        self.job_details = job_details
+        # "fast" for quick reviews, which use the fast model for every section
+        self.model_tier = model_tier
+        self.created_at = time.monotonic()
+        self.timings = {}
+        self.cancel_reason = None
+        # Set on cancelling, to wake anything the review is waiting on
+        self._cancelled = asyncio.Event()
+
+    @classmethod
+    def from_message(cls, message, attachment, job_details=None, model_tier="detailed"):
+        return cls(
+            user_id=message.author.id,
+            guild_id=message.guild.id if message.guild else None,
+            channel_id=message.channel.id,
+            message_id=message.id,
+            attachment_name=attachment.filename,
+            attachment_size=attachment.size,
+            attachment_url=attachment.url,
+            job_details=job_details,
+            model_tier=model_tier
+        )
+
+    @property
+    def job_kwargs(self):
+        """Job details as keyword arguments for the review prompt"""
+        if not self.job_details:
+            return {}
+        return {
+            "job_title": self.job_details["job_title"],
+            "company": self.job_details["company"],
+            "min_qual": self.job_details["min_qual"],
+            "pref_qual": self.job_details["pref_qual"]
+        }
+
+    @property
+    def quick(self):
+        return self.model_tier == "fast"
+
+    @property
+    def history_key(self):
+        """Reviews by the same user in the same thread are revisions of one resume"""
+        return f"{self.channel_id}:{self.user_id}"
+
+    @contextmanager
+    def timed(self, stage):
+        """Record how long a stage of the review took, in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0) + time.perf_counter() - start
+
+    @property
+    def cancelled(self):
+        return self.cancel_reason is not None
+
+    def cancel(self, reason):
+        if not self.cancelled:
+            logger.info(f"Cancelling review {self.review_id}: {reason}")
+            self.cancel_reason = reason
+            self._cancelled.set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise ReviewCancelledError(self.cancel_reason)
+
+    async def wait_for(self, event):
+        """Wait until an asyncio.Event is set, raising ReviewCancelledError if the review is cancelled first"""
+        waiters = [asyncio.ensure_future(event.wait()), asyncio.ensure_future(self._cancelled.wait())]
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        self.raise_if_cancelled()
+
+    def __repr__(self):
+        return f"<ReviewContext {self.review_id} user={self.user_id} attachment={self.attachment_name!r}>"
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from collections import deque, defaultdict
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Raised when the review queue has no room for another job"""
+
+class UserQueueLimitError(QueueFullError):
+    """Raised when a user already has the maximum number of pending reviews"""
+
+class ReviewJob:
+    def __init__(self, user_id, run):
+        self.user_id = user_id
+        self.run = run  # Zero-argument coroutine function that performs the review
+        self.future = asyncio.get_running_loop().create_future()
+        self.submitted_at = time.monotonic()
+        # Set when a worker picks the job up
+        self.started_at = None
+
+    @property
+    def wait_seconds(self):
+        """How long the job waited for a worker, or None if it never got one"""
+        return None if self.started_at is None else self.started_at - self.submitted_at
+
+class ReviewQueue:
+    def __init__(self, worker_count=3, max_size=25, max_pending_per_user=2):
+        self.worker_count = worker_count
+        self.max_size = max_size
+        self.max_pending_per_user = max_pending_per_user
+        self._queue = None
+        self._waiting = deque()
+        self._pending_by_user = defaultdict(int)
+        self._workers = []
+        self.in_flight = 0
+
+    def start(self):
+        """Start the worker tasks. Must be called from a running event loop."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.worker_count)]
+        logger.info(f"Started review queue with {self.worker_count} workers (max size {self.max_size})")
+
+    async def stop(self):
+        """Cancel the worker tasks and fail any jobs that never started"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        while self._waiting:
+            job = self._waiting.popleft()
+            if not job.future.done():
+                job.future.cancel()
+
+    @property
+    def depth(self):
+        """Number of jobs waiting for a worker"""
+        return len(self._waiting)
+
+    def check(self, user_id):
+        """Raise QueueFullError if a review from this user couldn't be accepted right now.
+        Lets the bot turn a review away before asking for job details; submit checks again."""
+        if len(self._waiting) >= self.max_size:
+            raise QueueFullError(f"Review queue is full ({self.max_size} jobs waiting)")
+        if self._pending_by_user.get(user_id, 0) >= self.max_pending_per_user:
+            raise UserQueueLimitError(f"User {user_id} already has {self.max_pending_per_user} pending reviews")
+
+    def submit(self, user_id, run):
+        """Queue a review, raising QueueFullError if it cannot be accepted"""
+        if self._queue is None:
+            raise RuntimeError("Review queue has not been started")
+        self.check(user_id)
+
+        job = ReviewJob(user_id, run)
+        self._pending_by_user[user_id] += 1
+        self._waiting.append(job)
+        self._queue.put_nowait(job)
+        logger.info(f"Queued review for user {user_id} at position {len(self._waiting)}")
+        return job
+
+    def position(self, job):
+        """1-based position of a job in line for a worker, or 0 if it is (about to be) running"""
+        try:
+            index = self._waiting.index(job)
+        except ValueError:
+            return 0
+        idle_workers = max(0, len(self._workers) - self.in_flight)
+        return max(0, index + 1 - idle_workers)
+
+    async def _worker(self, index):
+        while True:
+            job = await self._queue.get()
+            try:
+                self._waiting.remove(job)
+            except ValueError:
+                pass
+            try:
+                # The submitter may have given up on the job while it was waiting
+                if job.future.done():
+                    continue
+                job.started_at = time.monotonic()
+                self.in_flight += 1
+                try:
+                    result = await job.run()
+                except asyncio.CancelledError:
+                    job.future.cancel()
+                    raise
+                except Exception as e:
+                    logger.error(f"Review worker {index} failed a job: {e}")
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                else:
+                    if not job.future.done():
+                        job.future.set_result(result)
+                finally:
+                    self.in_flight -= 1
+            finally:
+                self._pending_by_user[job.user_id] -= 1
+                if self._pending_by_user[job.user_id] <= 0:
+                    del self._pending_by_user[job.user_id]
+                self._queue.task_done()
@@ -0,0 +1,52 @@
+# Describes the encoding to the model, it's sent along with every encoded resume
+FORMAT_DESCRIPTION = (
+    "Each line is written as `top left-right text`, with positions in points from the top-left "
+    "corner of the page. [fN] marks where the font from the font table starts."
+)
+
+def _group_lines(spans):
+    lines = []
+    for index, span in enumerate(spans):
+        line = span.get("line", index)
+        if lines and lines[-1][0] == line:
+            lines[-1][1].append(span)
+        else:
+            lines.append((line, [span]))
+    return [line_spans for _, line_spans in lines]
+
+def _merge_runs(line_spans):
+    """Join neighbouring spans on a line that share a font and size"""
+    runs = []
+    for span in line_spans:
+        if not span["text"]:
+            continue
+        key = (span["font"], round(span["size"], 1))
+        if runs and runs[-1][0] == key:
+            runs[-1][1] += span["text"]
+        else:
+            runs.append([key, span["text"]])
+    return runs
+
+def encode_spans(spans):
+    """Encode PyMuPDF text spans as a font table followed by one row per text line.
+
+    Much smaller than a JSON list of spans: font names and sizes are written once,
+    coordinates are rounded to whole points and spans sharing a font are merged.
+    """
+    fonts = {}
+    rows = []
+    for line_spans in _group_lines(spans):
+        runs = _merge_runs(line_spans)
+        if not runs:
+            continue
+        text = ""
+        for key, run_text in runs:
+            font_id = fonts.setdefault(key, f"f{len(fonts)}")
+            text += f"[{font_id}]{run_text}"
+        top = min(span["bbox"][1] for span in line_spans)
+        left = min(span["bbox"][0] for span in line_spans)
+        right = max(span["bbox"][2] for span in line_spans)
+        rows.append(f"{round(top)} {round(left)}-{round(right)} {text}")
+
+    font_table = ", ".join(f"{font_id}={font} {size:g}pt" for (font, size), font_id in fonts.items())
+    return "\n".join([f"Fonts: {font_table}"] + rows)